@@ -0,0 +1,149 @@
+"""Write-coalescing tracker for ``Profile.last_activity``.
+
+Requests only record activity when the known value is older than
+``ACTIVITY_WRITE_THRESHOLD`` seconds. Recorded timestamps are buffered in
+the cache under sequential slots and written with a single ``bulk_update``
+at most once every ``ACTIVITY_FLUSH_INTERVAL`` seconds, so a page view
+never runs ``Profile.save`` (and its image processing).
+
+Every authenticated request checks whether a flush is due, not only those
+that buffer a new timestamp, and the ``flush_last_activity --loop`` worker
+flushes when there is no traffic. The worker only sees the buffer through a
+shared cache (``CACHE_BACKEND`` ``file`` or ``redis``).
+
+A slot number is published (``incr``) before its value is written, so a
+flush only advances up to the first slot that is still empty. A slot that
+stays empty for ``SLOT_GAP_TIMEOUT`` seconds belonged to a request that died
+in between and is skipped. Slots are claimed with ``cache.add``: when a
+non-atomic ``incr`` (file backend) hands out the same number twice, the
+second writer takes the next number instead of overwriting the first.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from UsuarioApp.models import Profile
+
+
+SEQUENCE_KEY = "activity:sequence"
+FLUSHED_KEY = "activity:flushed"
+FLUSH_LOCK_KEY = "activity:flush-lock"
+GAP_KEY = "activity:gap"
+SLOT_GAP_TIMEOUT = 5
+SLOT_CLAIM_ATTEMPTS = 10
+
+
+def _slot_key(slot: int) -> str:
+    return f"activity:slot:{slot}"
+
+
+def _seen_key(profile_id: int) -> str:
+    return f"activity:profile:{profile_id}"
+
+
+def _next_slot() -> int:
+    cache.add(SEQUENCE_KEY, 0, None)
+    try:
+        return cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # La clave expiró entre add e incr: se reinicia la secuencia.
+        cache.set(SEQUENCE_KEY, 1, None)
+        return 1
+
+
+def _claim_slot(value) -> int:
+    for _ in range(SLOT_CLAIM_ATTEMPTS):
+        slot = _next_slot()
+        if cache.add(_slot_key(slot), value, None):
+            return slot
+    cache.set(_slot_key(slot), value, None)
+    return slot
+
+
+def _last_flushable_slot(start: int, end: int, values: dict) -> int:
+    """Return the last slot up to which the buffer can be flushed.
+
+    Stops before the first empty slot unless it has been empty for longer
+    than ``SLOT_GAP_TIMEOUT`` seconds.
+    """
+
+    flushed = start
+    for slot in range(start + 1, end + 1):
+        if _slot_key(slot) not in values:
+            gap = cache.get(GAP_KEY)
+            if gap is None or gap[0] != slot:
+                cache.set(GAP_KEY, (slot, time.time()), None)
+                break
+            if time.time() - gap[1] < SLOT_GAP_TIMEOUT:
+                break
+        flushed = slot
+    return flushed
+
+
+def record_activity(profile: Profile, when=None) -> bool:
+    """Buffer the activity of ``profile`` if its stored value is stale.
+
+    Returns ``True`` when a new timestamp was buffered. ``profile.last_activity``
+    is updated in memory so the rest of the request sees the new value. Either
+    way the pending buffer is flushed when the flush interval has elapsed.
+    """
+
+    when = when or timezone.now()
+    threshold = timedelta(seconds=settings.ACTIVITY_WRITE_THRESHOLD)
+    last_seen = cache.get(_seen_key(profile.pk)) or profile.last_activity
+    buffered = not last_seen or when - last_seen >= threshold
+    if buffered:
+        cache.set(_seen_key(profile.pk), when, settings.ACTIVITY_WRITE_THRESHOLD)
+        _claim_slot((profile.pk, when))
+        profile.last_activity = when
+
+    flush_activity_if_due()
+    return buffered
+
+
+def flush_activity_if_due() -> int:
+    """Run :func:`flush_activity` if none ran in the last flush interval."""
+
+    if cache.add(FLUSH_LOCK_KEY, True, settings.ACTIVITY_FLUSH_INTERVAL):
+        return flush_activity()
+    return 0
+
+
+def flush_activity() -> int:
+    """Write the buffered timestamps with ``bulk_update``.
+
+    Returns the number of profiles updated. Only ``last_activity`` is
+    written; ``Profile.save`` is never called.
+    """
+
+    start = cache.get(FLUSHED_KEY, 0)
+    end = cache.get(SEQUENCE_KEY, 0)
+    if end < start:
+        # La secuencia se reinició (caché vaciada): se empieza de nuevo.
+        start = 0
+    values = cache.get_many([_slot_key(slot) for slot in range(start + 1, end + 1)])
+    end = _last_flushable_slot(start, end, values)
+    keys = [_slot_key(slot) for slot in range(start + 1, end + 1)]
+    if not keys:
+        return 0
+
+    latest: dict[int, object] = {}
+    for key in keys:
+        if key not in values:
+            continue
+        profile_id, when = values[key]
+        if profile_id not in latest or when > latest[profile_id]:
+            latest[profile_id] = when
+
+    Profile.objects.bulk_update(
+        [Profile(pk=profile_id, last_activity=when) for profile_id, when in latest.items()],
+        ["last_activity"],
+        batch_size=500,
+    )
+    cache.delete_many(keys)
+    cache.set(FLUSHED_KEY, end, None)
+    return len(latest)
@@ -0,0 +1,134 @@
+"""Per-branch grouping and pagination of the user list, computed in SQL.
+
+A user is listed under its current branch, under every branch where it has
+a staff assignment, or under "Sin sucursal" when it has neither. Those
+memberships are a ``UNION`` of three queries; the summary counters are
+aggregates over it and ``ROW_NUMBER() OVER (PARTITION BY branch_id)`` picks
+the requested page of every branch, so only the listed users are loaded.
+"""
+
+from __future__ import annotations
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Coalesce, Concat, Lower, NullIf, Trim
+
+
+def _members(users, branch, recent_since, rank, **filters):
+    return (
+        User.objects.filter(pk__in=users.values("pk"), **filters)
+        .order_by()
+        .values(
+            user_id=F("pk"),
+            branch_id=branch,
+            # Mismo orden que ``get_full_name() or username`` en minúsculas.
+            sort_name=Lower(
+                Coalesce(
+                    NullIf(
+                        Trim(Concat("first_name", Value(" "), "last_name")), Value("")
+                    ),
+                    "username",
+                )
+            ),
+            active=Case(When(is_active=True, then=1), default=0),
+            recent=Case(When(date_joined__gte=recent_since, then=1), default=0),
+            rank=rank,
+        )
+    )
+
+
+def branch_memberships(users, recent_since, rank=None):
+    """Return the ``(user, branch)`` memberships of ``users`` as a union queryset.
+
+    ``rank`` orders the users of each branch before their name, e.g. the
+    relevance of a search (see ``UsuarioApp.search.search_rank``).
+    """
+
+    if rank is None:
+        rank = Value(0.0, output_field=FloatField())
+
+    current = _members(
+        users,
+        F("profile__current_branch_id"),
+        recent_since,
+        rank,
+        profile__current_branch__isnull=False,
+    )
+    staff = _members(
+        users,
+        F("profile__sucursal_staff__sucursal_id"),
+        recent_since,
+        rank,
+        profile__sucursal_staff__isnull=False,
+    )
+    unassigned = _members(
+        users,
+        Value(None, output_field=IntegerField()),
+        recent_since,
+        rank,
+        profile__current_branch__isnull=True,
+        profile__sucursal_staff__isnull=True,
+    )
+    return current.union(staff, unassigned)
+
+
+def _fetch(sql: str, params) -> list[tuple]:
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def summarize_memberships(memberships) -> dict[int | None, dict[str, int]]:
+    """Return the user counters of every branch in a single grouped query."""
+
+    sql, params = memberships.query.sql_with_params()
+    rows = _fetch(
+        "SELECT branch_id, COUNT(*), SUM(active), SUM(recent) "
+        f"FROM ({sql}) members GROUP BY branch_id",
+        params,
+    )
+    return {
+        branch_id: {
+            "total_users": total,
+            "active_users": active,
+            "inactive_users": total - active,
+            "recent_users": recent,
+        }
+        for branch_id, total, active, recent in rows
+    }
+
+
+def page_memberships(memberships, windows) -> dict[int | None, list[int]]:
+    """Return the user ids of one page per branch, in listing order.
+
+    ``windows`` maps each branch id to the ``(first, last)`` 1-based positions
+    of its page.
+    """
+
+    if not windows:
+        return {}
+
+    conditions = []
+    window_params = []
+    for branch_id, (first, last) in windows.items():
+        if branch_id is None:
+            conditions.append("(branch_id IS NULL AND position BETWEEN %s AND %s)")
+            window_params += [first, last]
+        else:
+            conditions.append("(branch_id = %s AND position BETWEEN %s AND %s)")
+            window_params += [branch_id, first, last]
+
+    sql, params = memberships.query.sql_with_params()
+    rows = _fetch(
+        "SELECT branch_id, user_id FROM ("
+        "SELECT branch_id, user_id, ROW_NUMBER() OVER ("
+        "PARTITION BY branch_id ORDER BY rank DESC, sort_name, user_id DESC"
+        f") AS position FROM ({sql}) members"
+        f") ranked WHERE {' OR '.join(conditions)} ORDER BY position",
+        (*params, *window_params),
+    )
+    pages: dict[int | None, list[int]] = {}
+    for branch_id, user_id in rows:
+        pages.setdefault(branch_id, []).append(user_id)
+    return pages
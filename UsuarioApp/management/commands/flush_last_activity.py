@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from UsuarioApp.activity import flush_activity
+
+
+class Command(BaseCommand):
+    help = "Guarda en la base de datos la última actividad acumulada en caché."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Repite el guardado cada --sleep segundos.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=30.0,
+            help="Segundos entre guardados en modo --loop.",
+        )
+
+    def handle(self, *args, **options):
+        if settings.CACHE_BACKEND == "locmem":
+            raise CommandError(
+                "CACHE_BACKEND=locmem guarda la actividad en la memoria de cada "
+                "proceso web y este comando no puede leerla. Usa una caché "
+                "compartida (CACHE_BACKEND=file o redis)."
+            )
+        while True:
+            updated = flush_activity()
+            if updated:
+                self.stdout.write(f"Actividad actualizada para {updated} perfiles.")
+            if not options["loop"]:
+                return
+            time.sleep(options["sleep"])
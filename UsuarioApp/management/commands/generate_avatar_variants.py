@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from UsuarioApp.models import Profile
+from utils.customer_img import (
+    DEFAULT_PROFILE_IMAGE,
+    delete_image_files,
+    generate_image_variants,
+    image_content_hash,
+)
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP de los avatares que aún no las tienen."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenera también los avatares que ya tienen miniaturas.",
+        )
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(image="").exclude(image=DEFAULT_PROFILE_IMAGE)
+        if not options["all"]:
+            profiles = profiles.filter(image_variants={})
+
+        generated = 0
+        for profile in profiles.only("pk", "image", "image_variants").iterator():
+            if not default_storage.exists(profile.image.name):
+                continue
+            with default_storage.open(profile.image.name, "rb") as image_file:
+                content_hash = image_content_hash(image_file)
+            variants = generate_image_variants(profile.image.name)
+            Profile.objects.filter(pk=profile.pk).update(
+                image_hash=content_hash, image_variants=variants
+            )
+            # Las miniaturas anteriores quedan con otro nombre: se eliminan
+            # para no dejar archivos huérfanos con cada --all.
+            previous = set((profile.image_variants or {}).values())
+            delete_image_files(previous - set(variants.values()))
+            generated += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas generadas para {generated} perfiles."))
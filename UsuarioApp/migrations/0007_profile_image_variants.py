@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("UsuarioApp", "0006_profile_blocked"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="image_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="Hash de la imagen",
+            ),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Rutas de las miniaturas WebP por tamaño en píxeles.",
+                verbose_name="Miniaturas de la imagen",
+            ),
+        ),
+    ]
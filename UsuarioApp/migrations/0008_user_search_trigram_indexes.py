@@ -0,0 +1,81 @@
+import warnings
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, transaction
+
+
+SEARCH_COLUMNS = ("username", "first_name", "last_name")
+
+
+def ensure_pg_trgm(connection) -> bool:
+    """Return whether pg_trgm is installed, creating it when the role may.
+
+    The extension ships with ``postgresql-contrib`` and ``CREATE EXTENSION``
+    needs a privileged role; ``postgres-init/01-enable-pg-trgm.sql`` provisions
+    it as the superuser when the database is initialised.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone():
+            return True
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if not cursor.fetchone():
+            return False
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return False
+    return True
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index the user search columns with pg_trgm so ``icontains`` avoids seq scans.
+
+    The expressions match the SQL Django emits for ``icontains`` on
+    PostgreSQL (``UPPER(column::text) LIKE UPPER(...)``). The indexes are
+    skipped when ``USER_SEARCH_TRIGRAM`` is off or pg_trgm cannot be created;
+    the search then keeps the plain ``icontains`` filter.
+    """
+
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql" or not settings.USER_SEARCH_TRIGRAM:
+        return
+
+    if not ensure_pg_trgm(connection):
+        warnings.warn(
+            "pg_trgm is not available or cannot be created by this role; "
+            "skipping the user search trigram indexes. Install the extension "
+            "and re-run this migration (or set USER_SEARCH_TRIGRAM=False).",
+            RuntimeWarning,
+        )
+        return
+
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "auth_user_{column}_trgm" ON "auth_user" '
+            f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops);'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "auth_user_{column}_trgm";')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("UsuarioApp", "0007_profile_image_variants"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -10,7 +10,12 @@ from django.utils import timezone
 from sucursalApp.models import Sucursal
 import uuid
 import os
-from utils.customer_img import resize_image, crop_image, handle_old_image
+from utils.customer_img import (
+    AVATAR_VARIANT_SIZES,
+    delete_image_files,
+    generate_image_variants,
+    image_content_hash,
+)
 
 
 RESTRICTED_PERMISSION_CODE = "RESTRICTED"
@@ -38,6 +43,16 @@ class Position(models.Model):
 class Profile(models.Model):
     last_activity = models.DateTimeField(null=True, blank=True)
     image = models.ImageField(upload_to=profile_picture_path, default="profile.webp")
+    image_hash = models.CharField(
+        max_length=64, blank=True, editable=False, verbose_name="Hash de la imagen"
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Miniaturas de la imagen",
+        help_text="Rutas de las miniaturas WebP por tamaño en píxeles.",
+    )
     user_FK = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name="profile",
     )
@@ -120,14 +135,56 @@ class Profile(models.Model):
             self.last_activity = timezone.now()
             kwargs["update_fields"] = ["last_activity"]
 
+        # Solo una imagen recién subida se procesa; el resto de los guardados
+        # no abre ningún archivo.
+        if not (self.image and not self.image._committed):
+            super(Profile, self).save(*args, **kwargs)
+            return
+
+        content_hash = image_content_hash(self.image)
+        previous = None
         if self.pk:
-            handle_old_image(Profile, self.pk, self.image)
+            previous = (
+                Profile.objects.filter(pk=self.pk)
+                .values("image", "image_hash", "image_variants")
+                .first()
+            )
+        if previous and previous["image_hash"] == content_hash:
+            # La misma foto otra vez: se conservan el archivo y sus miniaturas.
+            self.image = previous["image"]
+            super(Profile, self).save(*args, **kwargs)
+            return
 
         super(Profile, self).save(*args, **kwargs)
+        self.image_hash = content_hash
+        self.image_variants = generate_image_variants(self.image.name)
+        Profile.objects.filter(pk=self.pk).update(
+            image_hash=self.image_hash, image_variants=self.image_variants
+        )
+        if previous:
+            delete_image_files(
+                [previous["image"], *(previous["image_variants"] or {}).values()]
+            )
+
+    def avatar_url(self, size: int = AVATAR_VARIANT_SIZES[-1]) -> str:
+        """URL of the smallest stored variant of at least ``size`` pixels."""
+        variants = self.image_variants or {}
+        for variant_size in sorted(int(key) for key in variants):
+            if variant_size >= size:
+                return self.image.storage.url(variants[str(variant_size)])
+        return self.image.url
+
+    @property
+    def avatar_small_url(self) -> str:
+        return self.avatar_url(48)
+
+    @property
+    def avatar_medium_url(self) -> str:
+        return self.avatar_url(96)
 
-        if self.image and os.path.exists(self.image.path):
-            resize_image(self.image.path, 300)
-            crop_image(self.image.path, 300)
+    @property
+    def avatar_large_url(self) -> str:
+        return self.avatar_url(300)
 
     def has_role(self, roles=None):
         """Check if the profile's position matches the given roles.
@@ -152,7 +209,9 @@ class Profile(models.Model):
         return code in roles
 
     def update_last_activity(self):
-        self.save(update_last_activity=True)
+        """Store the current time without going through ``save`` (no image work)."""
+        self.last_activity = timezone.now()
+        Profile.objects.filter(pk=self.pk).update(last_activity=self.last_activity)
 
     def _has_permission(self, code: str) -> bool:
         """Return True if the profile has the given permission code."""
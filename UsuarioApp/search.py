@@ -0,0 +1,70 @@
+"""User search shared by the user list.
+
+On PostgreSQL the ``icontains`` filters are served by the ``pg_trgm`` GIN
+indexes created in migration 0008, and matches are ranked by trigram word
+similarity. Other databases (SQLite in tests), ``USER_SEARCH_TRIGRAM =
+False`` or a database without the extension keep the plain ``icontains``
+filter without ranking.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+
+SEARCH_FIELDS = ("username", "first_name", "last_name")
+
+
+@lru_cache(maxsize=None)
+def pg_trgm_installed(using: str = "default") -> bool:
+    """Whether pg_trgm exists in ``using``; migration 0008 skips it when it can't."""
+
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def trigram_search_enabled(using: str = "default") -> bool:
+    return (
+        settings.USER_SEARCH_TRIGRAM
+        and connections[using].vendor == "postgresql"
+        and pg_trgm_installed(using)
+    )
+
+
+def search_filter(term: str) -> Q:
+    """Users whose username, first name or last name contain ``term``."""
+
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f"{field}__icontains": term})
+    return matches
+
+
+def search_rank(term: str, using: str = "default"):
+    """Relevance of a user for ``term``, or ``None`` when ranking is unavailable."""
+
+    if not term or not trigram_search_enabled(using):
+        return None
+
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    return Greatest(*(TrigramWordSimilarity(term, field) for field in SEARCH_FIELDS))
+
+
+def search_users(queryset, term: str):
+    """Filter ``queryset`` by ``term``, annotating ``search_rank`` when available."""
+
+    term = (term or "").strip()
+    if not term:
+        return queryset
+    queryset = queryset.filter(search_filter(term))
+    rank = search_rank(term, queryset.db)
+    if rank is not None:
+        queryset = queryset.annotate(search_rank=rank).order_by("-search_rank", "-id")
+    return queryset
@@ -1,10 +1,16 @@
 # UsuarioApp/signals.py
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 from .models import Position, Profile
+from core.principal import (
+    invalidate_branch_principals,
+    invalidate_principals,
+    invalidate_profile_principals,
+)
 from homeApp.models import Company
+from sucursalApp.models import Sucursal, SucursalStaff
 
 @receiver(post_save, sender=User)
 def create_profile_for_superuser(sender, instance, created, **kwargs):
@@ -28,4 +34,40 @@ def ensure_company_for_owner(sender, instance: Profile, created: bool, **kwargs)
             rut=f"{instance.pk:08d}-0",
             business_name=instance.user_FK.get_full_name() or instance.user_FK.username,
             tax_address="",
-        )
\ No newline at end of file
+        )
+
+
+# Roles, empresa y sucursales asignadas forman parte del principal; cada
+# cambio expira solo el de los usuarios afectados. Cargos y sucursales usan
+# pre_delete porque al borrarlos se anulan o eliminan las filas que indican
+# a quién afectan.
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_principal(sender, instance: Profile, raw=False, **kwargs):
+    if not raw:
+        invalidate_principals([instance.user_FK_id])
+
+
+@receiver(post_save, sender=SucursalStaff)
+@receiver(post_delete, sender=SucursalStaff)
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_member_principal(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_profile_principals([instance.profile_id])
+
+
+@receiver(post_save, sender=Position)
+@receiver(pre_delete, sender=Position)
+def invalidate_position_principals(sender, instance: Position, raw=False, **kwargs):
+    if not raw and instance.pk:
+        invalidate_principals(
+            Profile.objects.filter(position_FK=instance).values_list("user_FK_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Sucursal)
+@receiver(pre_delete, sender=Sucursal)
+def invalidate_sucursal_principals(sender, instance: Sucursal, raw=False, **kwargs):
+    if not raw:
+        invalidate_branch_principals(instance.pk)
@@ -1,8 +1,35 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from PIL import Image
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
+from django.utils import timezone
+
+from UsuarioApp.activity import (
+    FLUSH_LOCK_KEY,
+    SLOT_GAP_TIMEOUT,
+    _next_slot,
+    _slot_key,
+    flush_activity,
+    flush_activity_if_due,
+    record_activity,
+)
+from UsuarioApp.search import search_rank
 from UsuarioApp.models import Profile, Position, RESTRICTED_PERMISSION_CODE
+from homeApp.middleware import SESSION_REFRESHED_AT_KEY, refresh_session_expiry
 from homeApp.models import Company
 from sucursalApp.models import Sucursal, SucursalStaff
 
@@ -317,4 +344,278 @@ class UserUpdateViewTests(UserManagementTestMixin, TestCase):
         response = self.client.get(reverse("UserEdit", args=[target_user.pk]))
 
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(response.url, reverse("Home"))
\ No newline at end of file
+        self.assertEqual(response.url, reverse("Home"))
+
+class UserListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner_position = Position.objects.create(
+            user_position="Owner", permission_code="OWNER"
+        )
+        self.attendant_position = Position.objects.create(
+            user_position="Attendant", permission_code="ATTENDANT"
+        )
+        self.owner_user = User.objects.create_user(username="owner", password="testpass123")
+        owner_profile = Profile.objects.create(
+            user_FK=self.owner_user, position_FK=owner_position
+        )
+        self.company = owner_profile.company
+        owner_profile.company_rut = self.company.rut
+        owner_profile.save()
+        self.branch = Sucursal.objects.create(company=self.company, name="Centro")
+        self.other_branch = Sucursal.objects.create(company=self.company, name="Norte")
+
+    def _create_attendants(self, count: int, offset: int = 0) -> list[Profile]:
+        profiles = []
+        for number in range(offset, offset + count):
+            user = User.objects.create_user(
+                username=f"attendant{number:02d}",
+                first_name="Bombero",
+                last_name=f"{number:02d}",
+                password="testpass123",
+            )
+            profile = Profile.objects.create(
+                user_FK=user,
+                position_FK=self.attendant_position,
+                company_rut=self.company.rut,
+            )
+            SucursalStaff.objects.create(sucursal=self.branch, profile=profile)
+            profiles.append(profile)
+        return profiles
+
+    def _groups(self, **params):
+        response = self.client.get(reverse("User"), params)
+        return {group["branch"]["name"]: group for group in response.context["branch_groups"]}
+
+    def test_branch_groups_are_paginated_in_the_database(self):
+        profiles = self._create_attendants(11)
+        profiles[0].current_branch = self.other_branch
+        profiles[0].save()
+        User.objects.filter(pk=profiles[1].user_FK_id).update(is_active=False)
+        self.client.force_login(self.owner_user)
+
+        groups = self._groups(**{f"page_branch_{self.branch.pk}": 2})
+        centro = groups["Centro"]
+        self.assertEqual(
+            centro["summary"],
+            {"total_users": 11, "active_users": 10, "inactive_users": 1, "recent_users": 11},
+        )
+        self.assertEqual(centro["page_obj"].number, 2)
+        self.assertEqual(
+            [row["username"] for row in centro["users"]], ["attendant09", "attendant10"]
+        )
+        self.assertEqual(
+            [row["username"] for row in groups["Norte"]["users"]], ["attendant00"]
+        )
+        self.assertEqual(
+            [row["username"] for row in groups["Sin sucursal"]["users"]], ["owner"]
+        )
+
+        with CaptureQueriesContext(connection) as small:
+            self._groups()
+        self._create_attendants(20, offset=11)
+        self._groups()  # reload the principal expired by the staff changes
+        with CaptureQueriesContext(connection) as large:
+            self._groups()
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+    def test_search_filters_users_and_falls_back_without_postgres(self):
+        self._create_attendants(3)
+        User.objects.filter(username="attendant01").update(first_name="Carolina")
+        self.client.force_login(self.owner_user)
+
+        groups = self._groups(search="caro")
+        self.assertEqual(
+            [row["username"] for row in groups["Centro"]["users"]], ["attendant01"]
+        )
+        self.assertNotIn("Sin sucursal", groups)
+        self.assertIsNone(search_rank("caro"))
+
+
+class LastActivityTrackerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        position = Position.objects.create(
+            user_position="Activity", permission_code="ATTENDANT"
+        )
+        user = User.objects.create_user(username="activity_user", password="testpass123")
+        self.profile = Profile.objects.create(user_FK=user, position_FK=position)
+
+    def test_activity_is_throttled_and_flushed_in_bulk(self):
+        now = timezone.now()
+        with mock.patch.object(Profile, "save") as save:
+            with self.assertNumQueries(1):
+                self.assertTrue(record_activity(self.profile, now))
+            with self.assertNumQueries(0):
+                self.assertFalse(
+                    record_activity(self.profile, now + timedelta(seconds=10))
+                )
+            later = now + timedelta(minutes=5)
+            self.assertTrue(record_activity(self.profile, later))
+            self.assertEqual(flush_activity(), 1)
+            self.assertEqual(flush_activity(), 0)
+        save.assert_not_called()
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.last_activity, later)
+
+    def test_pending_activity_is_flushed_once_the_interval_elapses(self):
+        now = timezone.now()
+        record_activity(self.profile, now)
+        later = now + timedelta(minutes=5)
+        # Dentro del intervalo: queda en caché.
+        self.assertTrue(record_activity(self.profile, later))
+        self.assertEqual(flush_activity_if_due(), 0)
+
+        # Vencido el intervalo se guarda aunque no haya actividad nueva.
+        cache.delete(FLUSH_LOCK_KEY)
+        self.assertFalse(record_activity(self.profile, later))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.last_activity, later)
+
+    def test_flush_waits_for_slots_published_before_their_value(self):
+        other = Profile.objects.create(
+            user_FK=User.objects.create_user(username="other_user"),
+            position_FK=self.profile.position_FK,
+        )
+        now = timezone.now()
+        record_activity(self.profile, now)  # también toma el lock de flush
+
+        # Otro proceso publicó el slot pero aún no escribe su valor.
+        reserved = _next_slot()
+        self.assertTrue(record_activity(other, now))
+        self.assertEqual(flush_activity(), 0)
+        cache.set(_slot_key(reserved), (self.profile.pk, now), None)
+        self.assertEqual(flush_activity(), 2)
+        other.refresh_from_db()
+        self.assertEqual(other.last_activity, now)
+
+        # Un slot que nunca se escribe se salta pasado SLOT_GAP_TIMEOUT.
+        _next_slot()
+        later = now + timedelta(minutes=5)
+        self.assertTrue(record_activity(other, later))
+        self.assertEqual(flush_activity(), 0)
+        with mock.patch(
+            "UsuarioApp.activity.time.time",
+            return_value=time.time() + SLOT_GAP_TIMEOUT + 1,
+        ):
+            self.assertEqual(flush_activity(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.last_activity, later)
+
+    def test_flush_command_requires_a_shared_cache(self):
+        with override_settings(CACHE_BACKEND="locmem"):
+            with self.assertRaises(CommandError):
+                call_command("flush_last_activity")
+
+
+class SessionRefreshPolicyTests(TestCase):
+    def test_session_is_only_extended_when_close_to_expiring(self):
+        session = self.client.session
+        with override_settings(SESSION_COOKIE_AGE=1000, SESSION_REFRESH_THRESHOLD=900):
+            self.assertTrue(refresh_session_expiry(session, now=10_000))
+            session.save()
+            session.modified = False
+
+            self.assertFalse(refresh_session_expiry(session, now=10_050))
+            self.assertFalse(session.modified)
+
+            self.assertTrue(refresh_session_expiry(session, now=10_200))
+            self.assertTrue(session.modified)
+            self.assertEqual(session[SESSION_REFRESHED_AT_KEY], 10_200)
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.db",
+        SESSION_COOKIE_AGE=1000,
+        SESSION_REFRESH_THRESHOLD=900,
+    )
+    def test_requests_write_the_session_once_per_refresh(self):
+        position = Position.objects.create(
+            user_position="Sessions", permission_code="ATTENDANT"
+        )
+        user = User.objects.create_user(username="session_user", password="testpass123")
+        Profile.objects.create(user_FK=user, position_FK=position)
+        self.client.force_login(user)
+        url = reverse("profit_dashboard_data")
+
+        def session_writes(now, requests=5):
+            with mock.patch("homeApp.middleware.time.time", return_value=now):
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(requests):
+                        self.client.get(url)
+            return sum(
+                query["sql"].startswith('UPDATE "django_session"')
+                for query in queries.captured_queries
+            )
+
+        # La primera petición de la sesión guarda la marca de renovación.
+        self.assertEqual(session_writes(10_000), 1)
+        # Dentro del umbral ninguna petición escribe la sesión.
+        self.assertEqual(session_writes(10_050), 0)
+        # Fuera del umbral se escribe una sola vez y vuelve a quedar estable.
+        self.assertEqual(session_writes(10_200), 1)
+
+
+class ProfileImagePipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        position = Position.objects.create(
+            user_position="Avatar", permission_code="ATTENDANT"
+        )
+        user = User.objects.create_user(username="avatar_user", password="testpass123")
+        self.profile = Profile.objects.create(user_FK=user, position_FK=position)
+
+    def _upload(self, color: str) -> SimpleUploadedFile:
+        buffer = BytesIO()
+        Image.new("RGB", (640, 480), color).save(buffer, format="PNG")
+        return SimpleUploadedFile("avatar.png", buffer.getvalue(), content_type="image/png")
+
+    def test_variants_are_generated_once_per_new_image(self):
+        self.profile.image = self._upload("red")
+        self.profile.save()
+
+        self.assertEqual(sorted(self.profile.image_variants), ["300", "48", "96"])
+        with default_storage.open(self.profile.image_variants["48"]) as thumbnail:
+            with Image.open(thumbnail) as image:
+                self.assertEqual((image.format, image.size), ("WEBP", (48, 48)))
+        self.assertTrue(self.profile.avatar_small_url.endswith("_48.webp"))
+        self.assertTrue(self.profile.avatar_url(60).endswith("_96.webp"))
+
+        first_variants = dict(self.profile.image_variants)
+        with mock.patch("UsuarioApp.models.generate_image_variants") as generate:
+            self.profile.phone = "123"
+            self.profile.save()
+            self.profile.image = self._upload("red")
+            self.profile.save()
+        generate.assert_not_called()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_variants, first_variants)
+
+        self.profile.image = self._upload("blue")
+        self.profile.save()
+        self.assertNotEqual(self.profile.image_variants, first_variants)
+        self.assertFalse(default_storage.exists(first_variants["48"]))
+
+    def test_regenerating_variants_deletes_the_previous_files(self):
+        self.profile.image = self._upload("red")
+        self.profile.save()
+        previous = dict(self.profile.image_variants)
+
+        call_command("generate_avatar_variants", "--all", stdout=StringIO())
+        self.profile.refresh_from_db()
+        for size, name in self.profile.image_variants.items():
+            self.assertTrue(default_storage.exists(name))
+            if name != previous[size]:
+                self.assertFalse(default_storage.exists(previous[size]))
+        variant_files = [
+            name
+            for name in default_storage.listdir(os.path.dirname(previous["48"]))[1]
+            if name.endswith(".webp")
+        ]
+        self.assertEqual(len(variant_files), len(previous))
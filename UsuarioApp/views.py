@@ -23,9 +23,12 @@ from django.contrib import messages
 from django.urls import reverse_lazy
 from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
 from core.mixins import PermitsPositionMixin, RoleRequiredMixin
+from core.principal import request_principal
+from .listing import branch_memberships, page_memberships, summarize_memberships
+from .search import search_rank, search_users
 from .models import Profile
 from sucursalApp.forms import BranchStaffForm
-from sucursalApp.models import Sucursal, SucursalStaff, ServiceSession, Shift
+from sucursalApp.models import Sucursal, SucursalStaff, detach_attendants
 from homeApp.models import Company
 from django.contrib.auth.forms import SetPasswordForm
 
@@ -48,11 +51,13 @@ class UserListView(LoginRequiredMixin, ListView):
             return self.access_scope
 
         profile = getattr(self.request.user, "profile", None)
-        is_owner = bool(profile and profile.is_owner())
-        is_admin = bool(profile and profile.is_admin())
-        is_accountant = bool(profile and profile.is_accountant())
-        is_head_attendant = bool(profile and profile.is_head_ATTENDANT())
-        is_attendant = bool(profile and profile.is_ATTENDANT())
+        principal = request_principal(self.request)
+        role = principal.permission_code if profile else None
+        is_owner = role == "OWNER"
+        is_admin = role == "ADMINISTRATOR"
+        is_accountant = role == "ACCOUNTANT"
+        is_head_attendant = role == "HEAD_ATTENDANT"
+        is_attendant = role == "ATTENDANT"
 
         company_rut: str | None = None
         branches_qs = Sucursal.objects.none()
@@ -60,7 +65,11 @@ class UserListView(LoginRequiredMixin, ListView):
 
         if profile:
             if is_owner:
-                company = Company.objects.filter(profile=profile).first()
+                company = (
+                    Company.objects.filter(pk=principal.company_id).first()
+                    if principal.company_id
+                    else None
+                )
                 if company:
                     company_rut = company.rut
                     branches_qs = company.branches.all()
@@ -70,28 +79,11 @@ class UserListView(LoginRequiredMixin, ListView):
                         company__rut=company_rut
                     )
                 branch_ids = list(branches_qs.values_list("id", flat=True))
-            elif is_admin:
-                branch_ids = list(
-                    SucursalStaff.objects.filter(profile=profile)
-                    .values_list("sucursal_id", flat=True)
-                )
-                if profile.current_branch_id:
-                    branch_ids.append(profile.current_branch_id)
+            # Allow administrators, accountants and attendants (including head
+            # attendant) to view users limited to the branches they belong to.
+            elif is_admin or is_accountant or is_head_attendant or is_attendant:
+                branch_ids = sorted(principal.staff_branch_ids)
                 if branch_ids:
-                    branch_ids = list(dict.fromkeys(branch_ids))
-                    branches_qs = Sucursal.objects.filter(id__in=branch_ids)
-            # Allow accountants and attendants (including head attendant)
-            # to view users limited to the branches they belong to.
-            elif is_accountant or is_head_attendant or is_attendant:
-                branch_ids = list(
-                    SucursalStaff.objects.filter(profile=profile).values_list(
-                        "sucursal_id", flat=True
-                    )
-                )
-                if profile.current_branch_id:
-                    branch_ids.append(profile.current_branch_id)
-                if branch_ids:
-                    branch_ids = list(dict.fromkeys(branch_ids))
                     branches_qs = Sucursal.objects.filter(id__in=branch_ids)
 
         self.access_scope = {
@@ -117,14 +109,7 @@ class UserListView(LoginRequiredMixin, ListView):
             .exclude(profile__blocked=True)
             .order_by("-id")
         )
-        search_query = self.request.GET.get("search")
-
-        if search_query:
-            queryset = queryset.filter(
-                Q(username__icontains=search_query)
-                | Q(first_name__icontains=search_query)
-                | Q(last_name__icontains=search_query)
-            )
+        queryset = search_users(queryset, self.request.GET.get("search", ""))
 
         profile = access.get("profile")
         if not profile:
@@ -141,8 +126,12 @@ class UserListView(LoginRequiredMixin, ListView):
             if branch_ids:
                 queryset = queryset.filter(
                     Q(profile__current_branch_id__in=branch_ids)
-                    | Q(profile__sucursal_staff__sucursal_id__in=branch_ids)
-                ).distinct()
+                    | Q(
+                        profile__in=SucursalStaff.objects.filter(
+                            sucursal_id__in=branch_ids
+                        ).values("profile_id")
+                    )
+                )
             else:
                 queryset = queryset.filter(id=self.request.user.id)
         # Allow accountants and attendants to see users limited to their branches
@@ -151,13 +140,50 @@ class UserListView(LoginRequiredMixin, ListView):
             if branch_ids:
                 queryset = queryset.filter(
                     Q(profile__current_branch_id__in=branch_ids)
-                    | Q(profile__sucursal_staff__sucursal_id__in=branch_ids)
-                ).distinct()
+                    | Q(
+                        profile__in=SucursalStaff.objects.filter(
+                            sucursal_id__in=branch_ids
+                        ).values("profile_id")
+                    )
+                )
             else:
                 queryset = queryset.filter(id=self.request.user.id)
 
         return queryset
 
+    def get_paginate_by(self, queryset):
+        # ``paginate_by`` is the page size of every branch group, which are
+        # paginated in SQL by ``get_context_data``.
+        return None
+
+    @staticmethod
+    def _build_user_row(user: User, verified_user_ids: set[int]) -> dict[str, Any]:
+        try:
+            user_profile = user.profile
+        except Profile.DoesNotExist:
+            user_profile = None
+
+        avatar_url = static("img/profile.webp")
+        if user_profile and getattr(user_profile, "image", None):
+            avatar_url = user_profile.avatar_medium_url
+
+        position = user_profile.position_FK if user_profile else None
+        return {
+            "id": user.id,
+            "username": user.username,
+            "full_name": user.get_full_name() or user.username,
+            "email": user.email,
+            "profile_id": getattr(user_profile, "id", None),
+            "role": position.user_position if position else "Sin cargo",
+            "role_code": position.permission_code if position else None,
+            "is_active": user.is_active,
+            "is_verified": user.id in verified_user_ids,
+            "profile_image": avatar_url,
+            "last_login": user.last_login,
+            "last_activity": getattr(user_profile, "last_activity", None),
+            "date_joined": user.date_joined,
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -177,115 +203,66 @@ class UserListView(LoginRequiredMixin, ListView):
                 )
 
         base_queryset = getattr(self, "object_list", self.get_queryset())
-        filtered_users = list(
-            base_queryset.select_related(
-                "profile__position_FK",
-                "profile__current_branch",
-            ).prefetch_related("profile__sucursal_staff__sucursal")
-        )
-
-        user_ids = [user.id for user in filtered_users]
-        verified_user_ids = set(
-            EmailAddress.objects.filter(
-                user_id__in=user_ids, verified=True
-            ).values_list("user_id", flat=True)
-        )
-
         cutoff_date = timezone.now() - timezone.timedelta(days=7)
+        memberships = branch_memberships(
+            base_queryset,
+            cutoff_date,
+            rank=search_rank(self.request.GET.get("search", "").strip()),
+        )
+        summaries = summarize_memberships(memberships)
 
-        branch_groups_map: dict[int | None, list[dict[str, Any]]] = {}
-        missing_branch_ids: set[int] = set()
-
-        for user in filtered_users:
-            try:
-                user_profile = user.profile
-            except Profile.DoesNotExist:
-                user_profile = None
-
-            avatar_url = static("img/profile.webp")
-            if user_profile and getattr(user_profile, "image", None):
-                image_field = user_profile.image
-                if getattr(image_field, "url", None):
-                    avatar_url = image_field.url
-
-            branch_ids_for_user: set[int | None] = set()
-
-            if user_profile is not None:
-                if user_profile.current_branch_id:
-                    branch_ids_for_user.add(user_profile.current_branch_id)
-                staff_memberships = getattr(user_profile, "sucursal_staff", None)
-                if staff_memberships is not None:
-                    for membership in staff_memberships.all():
-                        if membership.sucursal_id:
-                            branch_ids_for_user.add(membership.sucursal_id)
-                            if membership.sucursal_id not in branch_lookup:
-                                missing_branch_ids.add(membership.sucursal_id)
-
-            if not branch_ids_for_user:
-                branch_ids_for_user.add(None)
-
-            role_code = (
-                user_profile.position_FK.permission_code
-                if user_profile and user_profile.position_FK
-                else None
-            )
-
-            row_entry = {
-                "id": user.id,
-                "username": user.username,
-                "full_name": user.get_full_name() or user.username,
-                "email": user.email,
-                "profile_id": getattr(user_profile, "id", None),
-                "role": (
-                    user_profile.position_FK.user_position
-                    if user_profile and user_profile.position_FK
-                    else "Sin cargo"
-                ),
-                "role_code": role_code,
-                "is_active": user.is_active,
-                "is_verified": user.id in verified_user_ids,
-                "profile_image": avatar_url,
-                "last_login": user.last_login,
-                "last_activity": getattr(user_profile, "last_activity", None),
-                "date_joined": user.date_joined,
-            }
-
-            for branch_id in branch_ids_for_user:
-                branch_groups_map.setdefault(branch_id, []).append(row_entry)
-
+        missing_branch_ids = {
+            branch_id
+            for branch_id in summaries
+            if branch_id is not None and branch_id not in branch_lookup
+        }
         if missing_branch_ids:
             for branch in Sucursal.objects.filter(id__in=missing_branch_ids):
                 branch_lookup.setdefault(branch.id, branch)
 
-        branch_groups: list[dict[str, Any]] = []
-        for branch_id, rows in branch_groups_map.items():
-            branch_obj = branch_lookup.get(branch_id)
-            branch_name = branch_obj.name if branch_obj else "Sin sucursal"
-            row_entries = sorted(
-                ({**row, "branch": branch_name} for row in rows),
-                key=lambda item: item["full_name"].lower(),
-            )
-            page_param = (
+        pages: dict[int | None, Page] = {}
+        page_params: dict[int | None, str] = {}
+        for branch_id, summary in summaries.items():
+            page_param = page_params[branch_id] = (
                 f"page_branch_{branch_id}"
                 if branch_id is not None
                 else "page_branch_general"
             )
-            paginator = Paginator(row_entries, self.paginate_by)
+            # Solo se pagina el número de filas; los usuarios de la página se
+            # leen después con una consulta por ventana.
+            paginator = Paginator(range(summary["total_users"]), self.paginate_by)
             try:
-                page_obj: Page = paginator.page(self.request.GET.get(page_param))
+                pages[branch_id] = paginator.page(self.request.GET.get(page_param))
             except (PageNotAnInteger, EmptyPage):
-                page_obj = paginator.page(1)
-
-            paginated_entries = list(page_obj.object_list)
+                pages[branch_id] = paginator.page(1)
+
+        page_user_ids = page_memberships(
+            memberships,
+            {
+                branch_id: (page_obj.start_index(), page_obj.end_index())
+                for branch_id, page_obj in pages.items()
+            },
+        )
+        users_by_id = User.objects.select_related("profile__position_FK").in_bulk(
+            {user_id for user_ids in page_user_ids.values() for user_id in user_ids}
+        )
+        verified_user_ids = set(
+            EmailAddress.objects.filter(
+                user_id__in=users_by_id, verified=True
+            ).values_list("user_id", flat=True)
+        )
 
-            total_users = len(row_entries)
-            active_users = sum(1 for item in row_entries if item["is_active"])
-            inactive_users = total_users - active_users
-            recent_users = sum(
-                1
-                for item in row_entries
-                if item.get("date_joined") and item["date_joined"] >= cutoff_date
-            )
+        branch_groups: list[dict[str, Any]] = []
+        for branch_id, page_obj in pages.items():
+            branch_obj = branch_lookup.get(branch_id)
+            branch_name = branch_obj.name if branch_obj else "Sin sucursal"
+            paginated_entries = [
+                {
+                    **self._build_user_row(users_by_id[user_id], verified_user_ids),
+                    "branch": branch_name,
+                }
+                for user_id in page_user_ids.get(branch_id, [])
+            ]
 
             branch_groups.append(
                 {
@@ -294,18 +271,13 @@ class UserListView(LoginRequiredMixin, ListView):
                         "name": branch_name,
                     },
                     "users": paginated_entries,
-                    "paginator": paginator,
+                    "paginator": page_obj.paginator,
                     "page_obj": page_obj,
-                    "page_param": page_param,
+                    "page_param": page_params[branch_id],
                     "anchor_id": (
                         f"pagtable-{branch_id}" if branch_id is not None else "pagtable"
                     ),
-                    "summary": {
-                        "total_users": total_users,
-                        "active_users": active_users,
-                        "inactive_users": inactive_users,
-                        "recent_users": recent_users,
-                    },
+                    "summary": summaries[branch_id],
                     "staff_form": staff_forms.get(branch_id),
                 }
             )
@@ -559,6 +531,9 @@ class UserManagementScopeMixin:
     def _get_branch_ids(self, profile: Profile | None) -> list[int]:
         if profile is None:
             return []
+        principal = request_principal(self.request)
+        if profile.pk == principal.profile_id:
+            return sorted(principal.staff_branch_ids)
         branch_ids = list(
             SucursalStaff.objects.filter(profile=profile).values_list(
                 "sucursal_id", flat=True
@@ -713,9 +688,8 @@ class UserUpdateView(
         except Profile.DoesNotExist:
             return static("img/profile.webp")
 
-        image_field = getattr(profile, "image", None)
-        if image_field and getattr(image_field, "url", None):
-            return image_field.url
+        if getattr(profile, "image", None):
+            return profile.avatar_large_url
         return static("img/profile.webp")
 
     def get(self, request, *args, **kwargs):
@@ -941,11 +915,4 @@ class UserDeactivateView(
     def _detach_firefighter_assignments(profile: Profile) -> None:
         """Remove an inactive firefighter from active assignments."""
 
-        for shift in Shift.objects.filter(attendants=profile).distinct():
-            shift.attendants.remove(profile)
-
-        active_sessions = ServiceSession.objects.filter(
-            attendants=profile, ended_at__isnull=True
-        ).distinct()
-        for session in active_sessions:
-            session.attendants.remove(profile)
\ No newline at end of file
+        detach_attendants([profile.pk])
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Shared cache helpers: namespaced, versioned keys and signal-driven invalidation.
+
+Every key lives in a namespace (``"dashboard"``, ``"principal"``...) and a
+scope: the whole namespace, one company or one branch. The key embeds the
+current version of its scope, so :func:`invalidate` expires every entry of a
+scope by bumping one counter, without having to know the keys.
+
+Models declare which scopes an instance affects with
+:func:`register_invalidation`; one pair of ``post_save``/``post_delete``
+receivers then bumps them. Results are cached with :func:`make_key` or the
+:func:`cached` / :func:`cached_queryset` decorators.
+"""
+
+from __future__ import annotations
+
+import functools
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+
+
+def bump(key: str) -> int:
+    """Atomically increment the counter stored at ``key``, creating it at 1."""
+
+    if cache.add(key, 1, None):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:  # expulsada entre add() e incr()
+        cache.set(key, 1, None)
+        return 1
+
+
+def _scope(company_id=None, branch_id=None) -> str:
+    if branch_id is not None:
+        return f"branch:{branch_id}"
+    if company_id is not None:
+        return f"company:{company_id}"
+    return "all"
+
+
+def version_key(namespace: str, company_id=None, branch_id=None) -> str:
+    """Cache key holding the version of a ``namespace`` scope."""
+
+    return f"{namespace}:{_scope(company_id, branch_id)}:version"
+
+
+def make_key(namespace: str, *parts, company_id=None, branch_id=None) -> str:
+    """Return a key for ``parts`` that expires when its scope is invalidated."""
+
+    version = cache.get(version_key(namespace, company_id, branch_id), 0)
+    suffix = ":".join(str(part) for part in parts)
+    return f"{namespace}:{_scope(company_id, branch_id)}:v{version}:{suffix}"
+
+
+def invalidate(namespace: str, company_id=None, branch_id=None) -> None:
+    """Expire every entry of ``namespace`` stored under the given scope."""
+
+    bump(version_key(namespace, company_id, branch_id))
+
+
+def invalidate_on_commit(namespace: str, company_id=None, branch_id=None) -> None:
+    """:func:`invalidate` now and again when the current transaction commits.
+
+    The second bump expires entries another request cached from data read
+    before the commit made the change visible.
+    """
+
+    invalidate(namespace, company_id, branch_id)
+    transaction.on_commit(lambda: invalidate(namespace, company_id, branch_id))
+
+
+def cached(namespace: str, timeout=None, scope=None):
+    """Cache the result of the decorated function per argument values.
+
+    ``scope(*args, **kwargs)`` returns the ``{"company_id": ..., "branch_id":
+    ...}`` of a call; without it entries live in the namespace-wide scope.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(
+                namespace,
+                func.__qualname__,
+                *args,
+                *(f"{name}={value}" for name, value in sorted(kwargs.items())),
+                **(scope(*args, **kwargs) if scope else {}),
+            )
+            result = cache.get(key)
+            if result is None:
+                result = func(*args, **kwargs)
+                cache.set(key, result, timeout)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def cached_queryset(namespace: str, timeout=None, scope=None):
+    """:func:`cached` for functions returning a queryset.
+
+    The queryset is evaluated and its rows cached as a list, so callers get
+    a list back.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def evaluate(*args, **kwargs):
+            result = func(*args, **kwargs)
+            return list(result) if isinstance(result, QuerySet) else result
+
+        return cached(namespace, timeout, scope)(evaluate)
+
+    return decorator
+
+
+# Modelo -> [(namespace, scopes)]; ``scopes(instance)`` devuelve pares
+# (company_id, branch_id) o None para invalidar todo el namespace.
+INVALIDATION_REGISTRY: dict[type, list] = defaultdict(list)
+
+
+def register_invalidation(model, namespace: str, scopes=None) -> None:
+    """Invalidate ``namespace`` whenever an instance of ``model`` is saved or deleted."""
+
+    if model not in INVALIDATION_REGISTRY:
+        uid = f"core.cache:{model._meta.label_lower}"
+        post_save.connect(_invalidate_registered, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_registered, sender=model, dispatch_uid=uid)
+    INVALIDATION_REGISTRY[model].append((namespace, scopes))
+
+
+def _invalidate_registered(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    for namespace, scopes in INVALIDATION_REGISTRY.get(sender, ()):
+        for company_id, branch_id in scopes(instance) if scopes else [(None, None)]:
+            invalidate_on_commit(namespace, company_id, branch_id)
@@ -0,0 +1,66 @@
+"""Work deferred to the end of the current transaction, coalesced by key.
+
+Signal receivers that fire once per row (for example during a cascade
+delete) add keys to a named batch with :func:`add_to_commit_batch`; the
+batch callback then runs once, on commit, with every key collected in the
+transaction. A batch belongs to the savepoint it was opened in, so rolling
+that savepoint back discards its keys together with the callback.
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+
+
+class CommitBatch:
+    def __init__(self, name: str, callback):
+        self.name = name
+        self.callback = callback
+        self.items: dict = {}
+        self.done = False
+
+    def add(self, key, value=None, merge=None) -> None:
+        if merge is not None and key in self.items:
+            value = merge(self.items[key], value)
+        self.items[key] = value
+
+    def __call__(self) -> None:
+        self.done = True
+        self.callback(self.items)
+
+
+def _open_batches(name: str, same_savepoint: bool = False):
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return
+    savepoint_ids = set(connection.savepoint_ids)
+    for savepoints, func, *_ in connection.run_on_commit:
+        if isinstance(func, CommitBatch) and func.name == name and not func.done:
+            if not same_savepoint or savepoints == savepoint_ids:
+                yield func
+
+
+def add_to_commit_batch(name: str, key, callback, value=None, merge=None) -> None:
+    """Add ``key`` to the ``name`` batch, which runs ``callback(items)`` on commit.
+
+    ``items`` maps every collected key to its ``value``; ``merge(old, new)``
+    combines the values of a repeated key (by default the last one wins).
+    Outside a transaction the callback runs immediately with this key alone.
+    """
+
+    batch = next(_open_batches(name, same_savepoint=True), None)
+    if batch is None:
+        batch = CommitBatch(name, callback)
+        batch.add(key, value, merge)
+        transaction.on_commit(batch)
+    else:
+        batch.add(key, value, merge)
+
+
+def pending_commit_keys(name: str) -> set:
+    """Keys collected so far in the ``name`` batches of the current transaction."""
+
+    keys = set()
+    for batch in _open_batches(name):
+        keys.update(batch.items)
+    return keys
@@ -1,25 +1,18 @@
 from __future__ import annotations
 
+from django.core.cache import cache
 from django.db.models import Q
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject, cached_property
 
 from sucursalApp.models import ServiceSession, SucursalStaff
+from sucursalApp.navigation import NAVIGATION_CACHE_TIMEOUT, navigation_cache_key
 
-def service_session_navigation(request):
-    """Expose navigation helpers for the service session entry point."""
 
-    default_link = reverse("service_session_start")
+def _compute_service_session_navigation(profile, branch_id):
+    """Resolve the navigation entry for ``profile`` hitting the database."""
 
-    user = getattr(request, "user", None)
-    if not getattr(user, "is_authenticated", False):
-        return {
-            "service_session_link": default_link,
-            "has_active_service_session": False,
-            "has_active_service_assigned": False,
-        }
-
-    profile = getattr(user, "profile", None)
-    branch_id = getattr(profile, "current_branch_id", None)
+    default_link = reverse("service_session_start")
 
     # Fallback: if the administrator does not have a current branch set,
     # try to use the first branch where they are configured as ADMINISTRATOR.
@@ -60,7 +53,7 @@ def service_session_navigation(request):
         }
 
     active_sessions = ServiceSession.objects.filter(
-        shift__sucursal_id=branch_id, ended_at__isnull=True
+        branch_id=branch_id, ended_at__isnull=True
     ).order_by("-started_at")
 
     latest_session_id = active_sessions.values_list("pk", flat=True).first()
@@ -80,7 +73,6 @@ def service_session_navigation(request):
             .prefetch_related("attendants")
             .first()
         )
-        profile = getattr(request.user, "profile", None)
         if profile and session:
             # assigned as attendant
             if session.attendants.filter(pk=getattr(profile, "pk", None)).exists():
@@ -97,4 +89,50 @@ def service_session_navigation(request):
         ),
         "has_active_service_session": True,
         "has_active_service_assigned": has_assigned,
-    }
\ No newline at end of file
+    }
+
+
+class ServiceSessionNavigation:
+    """Navigation state of a user, read from the cache on first access."""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def state(self) -> dict:
+        profile = getattr(self.user, "profile", None)
+        branch_id = getattr(profile, "current_branch_id", None)
+        key = navigation_cache_key(self.user.pk, branch_id)
+        state = cache.get(key)
+        if state is None:
+            state = _compute_service_session_navigation(profile, branch_id)
+            cache.set(key, state, NAVIGATION_CACHE_TIMEOUT)
+        return state
+
+
+def service_session_navigation(request):
+    """Expose navigation helpers for the service session entry point.
+
+    The values are lazy: templates that never use them cost nothing, and the
+    rest read a per-(user, branch) cache entry invalidated by
+    ``sucursalApp.signals`` when a service starts, closes or changes its
+    attendants.
+    """
+
+    user = getattr(request, "user", None)
+    if not getattr(user, "is_authenticated", False):
+        return {
+            "service_session_link": reverse("service_session_start"),
+            "has_active_service_session": False,
+            "has_active_service_assigned": False,
+        }
+
+    navigation = ServiceSessionNavigation(user)
+    return {
+        name: SimpleLazyObject(lambda name=name: navigation.state[name])
+        for name in (
+            "service_session_link",
+            "has_active_service_session",
+            "has_active_service_assigned",
+        )
+    }
@@ -1,6 +1,8 @@
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 
+from core.principal import request_principal
+
 
 class RoleRequiredMixin:
     """Generic mixin to require specific profile roles for a view."""
@@ -9,10 +11,9 @@ class RoleRequiredMixin:
     allowed_roles = None  # list or tuple of allowed permission codes
 
     def dispatch(self, request, *args, **kwargs):
-        user = request.user
-        profile = getattr(user, "profile", None)
+        principal = request_principal(request)
 
-        if profile and profile.has_role(self.allowed_roles):
+        if principal.has_role(self.allowed_roles):
             return super().dispatch(request, *args, **kwargs)
         return redirect(self.redirect_url)
 
@@ -0,0 +1,190 @@
+"""Request-scoped principal: who the user is and which branches they reach.
+
+``PrincipalMiddleware`` attaches a lazy ``request.principal``. The first
+access loads the profile and permission code, then the staff assignments and
+the owned company's branches with one separate query each, and caches the
+result per session. Every user has their own cache version: a change to
+staff assignments, profiles, positions, companies or branches only expires
+the principals of the users it affects (see ``UsuarioApp.signals``).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from django.db.models import Q
+
+from core.cache import invalidate_on_commit, make_key
+from sucursalApp.models import Sucursal, SucursalStaff
+from UsuarioApp.models import RESTRICTED_PERMISSION_CODE, Profile
+
+
+PRINCIPAL_CACHE_TIMEOUT = 60 * 60
+PRINCIPAL_NAMESPACE = "principal"
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int | None
+    profile_id: int | None = None
+    permission_code: str | None = None
+    company_id: int | None = None
+    current_branch_id: int | None = None
+    # Sucursales que gestiona: las de su empresa (dueños) o sus asignaciones
+    # de personal más la sucursal actual (resto de los cargos).
+    branch_ids: frozenset[int] = field(default_factory=frozenset)
+    # Asignaciones de personal (cualquier rol) más la sucursal actual.
+    staff_branch_ids: frozenset[int] = field(default_factory=frozenset)
+    admin_branch_ids: frozenset[int] = field(default_factory=frozenset)
+
+    def has_role(self, roles=None) -> bool:
+        """Same contract as :meth:`UsuarioApp.models.Profile.has_role`."""
+
+        if not self.profile_id or not self.permission_code:
+            return False
+        if roles is None:
+            return self.permission_code != RESTRICTED_PERMISSION_CODE
+        if isinstance(roles, str):
+            roles = [roles]
+        return self.permission_code in roles
+
+    @property
+    def is_owner(self) -> bool:
+        return self.permission_code == "OWNER"
+
+    @property
+    def is_admin(self) -> bool:
+        return self.permission_code == "ADMINISTRATOR"
+
+
+ANONYMOUS_PRINCIPAL = Principal(user_id=None)
+
+
+def load_principal(user_id: int) -> Principal:
+    """Build the principal of ``user_id``.
+
+    The profile row comes first; staff assignments and company branches are
+    read with their own queries so neither multiplies the rows of the other.
+    """
+
+    profile = (
+        Profile.objects.filter(user_FK_id=user_id)
+        .values("pk", "position_FK__permission_code", "current_branch_id", "company__pk")
+        .first()
+    )
+    if profile is None:
+        return Principal(user_id=user_id)
+
+    current_branch_id = profile["current_branch_id"]
+    staff_rows = SucursalStaff.objects.filter(profile_id=profile["pk"]).values_list(
+        "sucursal_id", "role"
+    )
+    staff_branch_ids = {current_branch_id}
+    admin_branch_ids = set()
+    for branch_id, role in staff_rows:
+        staff_branch_ids.add(branch_id)
+        if role == "ADMINISTRATOR":
+            admin_branch_ids.add(branch_id)
+    if profile["position_FK__permission_code"] == "ADMINISTRATOR":
+        admin_branch_ids.add(current_branch_id)
+    else:
+        admin_branch_ids.clear()
+
+    if profile["company__pk"] is not None:
+        branch_ids = set(
+            Sucursal.objects.filter(company_id=profile["company__pk"]).values_list(
+                "pk", flat=True
+            )
+        )
+    else:
+        branch_ids = staff_branch_ids
+
+    return Principal(
+        user_id=user_id,
+        profile_id=profile["pk"],
+        permission_code=profile["position_FK__permission_code"],
+        company_id=profile["company__pk"],
+        current_branch_id=current_branch_id,
+        branch_ids=frozenset(branch_ids - {None}),
+        staff_branch_ids=frozenset(staff_branch_ids - {None}),
+        admin_branch_ids=frozenset(admin_branch_ids - {None}),
+    )
+
+
+def _user_namespace(user_id) -> str:
+    return f"{PRINCIPAL_NAMESPACE}:user:{user_id}"
+
+
+def get_principal(request) -> Principal:
+    """Return the principal of ``request``, cached per session."""
+
+    user = getattr(request, "user", None)
+    if not getattr(user, "is_authenticated", False):
+        return ANONYMOUS_PRINCIPAL
+
+    session = getattr(request, "session", None)
+    session_key = getattr(session, "session_key", None)
+    if not session_key:
+        return load_principal(user.pk)
+
+    key = make_key(_user_namespace(user.pk), session_key)
+    principal = cache.get(key)
+    if principal is None:
+        principal = load_principal(user.pk)
+        cache.set(key, principal, PRINCIPAL_CACHE_TIMEOUT)
+    return principal
+
+
+def request_principal(request) -> Principal:
+    """``request.principal`` when the middleware ran, otherwise a fresh one."""
+
+    principal = getattr(request, "principal", None)
+    if principal is None:
+        principal = request.principal = get_principal(request)
+    return principal
+
+
+def invalidate_principals(user_ids: Iterable[int]) -> None:
+    """Expire the cached principals of ``user_ids``, now and again on commit."""
+
+    for user_id in set(user_ids) - {None}:
+        invalidate_on_commit(_user_namespace(user_id))
+
+
+def invalidate_profile_principals(profile_ids: Iterable[int]) -> None:
+    """:func:`invalidate_principals` for the users of ``profile_ids``."""
+
+    profile_ids = set(profile_ids) - {None}
+    if profile_ids:
+        invalidate_principals(
+            Profile.objects.filter(pk__in=profile_ids).values_list("user_FK_id", flat=True)
+        )
+
+
+def invalidate_branch_principals(branch_id: int) -> None:
+    """Expire the principals of the branch's owner, staff and current users."""
+
+    invalidate_principals(
+        Profile.objects.filter(
+            Q(company__branches=branch_id)
+            | Q(sucursal_staff__sucursal_id=branch_id)
+            | Q(current_branch_id=branch_id)
+        )
+        .values_list("user_FK_id", flat=True)
+        .distinct()
+    )
+
+
+class PrincipalMiddleware:
+    """Attach a lazily loaded ``request.principal``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: get_principal(request))
+        return self.get_response(request)
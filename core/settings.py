@@ -92,6 +92,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.principal.PrincipalMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
@@ -191,6 +192,13 @@ STATICFILES_DIRS = [
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Archivos de exportación (historial financiero): fuera de MEDIA_ROOT para que
+# nginx no los sirva; solo se descargan desde la vista con control de acceso.
+EXPORTS_ROOT = env("EXPORTS_ROOT", default=os.path.join(BASE_DIR, "private", "exports"))
+# Segundos tras los que una exportación en proceso se da por fallida (el
+# worker que la tomó murió); la siguiente solicitud crea un trabajo nuevo.
+EXPORT_JOB_TIMEOUT = env.int("EXPORT_JOB_TIMEOUT", default=60 * 30)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # -------------------------
@@ -227,6 +235,24 @@ ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS = 3
 ACCOUNT_LOGOUT_ON_GET = True
 
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 365
+# La sesión se vuelve a extender solo cuando le queda menos vida que esto;
+# con el valor por defecto se escribe como máximo una vez al día por sesión.
+SESSION_REFRESH_THRESHOLD = env.int(
+    "SESSION_REFRESH_THRESHOLD", default=SESSION_COOKIE_AGE - 60 * 60 * 24
+)
+
+# Perfil del backend de sesiones:
+# - "db": tabla django_session (por defecto).
+# - "cached_db": lee desde la caché y escribe en la tabla; requiere una caché
+#   compartida entre workers.
+# - "signed_cookies": sin tabla; no permite cerrar sesiones desde el servidor,
+#   por lo que preventconcurrentlogins deja de expulsar sesiones anteriores.
+SESSION_BACKEND = env("SESSION_BACKEND", default="db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_BACKEND]
 
 LOGIN_URL = "account_login"
 
@@ -246,6 +272,56 @@ AXES_RESET_ON_SUCCESS = True
 AXES_ENABLE_ACCESS_FAILURE_LOG = True
 AXES_LOCK_OUT_AT_FAILURE = True
 
+# -------------------------
+# CACHÉ
+# -------------------------
+
+# "locmem" (por defecto) sirve a un solo proceso. Con varios workers usar
+# "file" (CACHE_LOCATION: directorio compartido) o "redis" (CACHE_LOCATION:
+# redis://host:6379/0, requiere el paquete redis). Las claves y su
+# invalidación se manejan en core.cache.
+CACHE_BACKEND = env("CACHE_BACKEND", default="locmem")
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+            "redis": "django.core.cache.backends.redis.RedisCache",
+        }[CACHE_BACKEND],
+        "LOCATION": env(
+            "CACHE_LOCATION",
+            default={
+                "locmem": "bencidata",
+                "file": str(BASE_DIR / ".cache"),
+                "redis": "redis://127.0.0.1:6379/1",
+            }[CACHE_BACKEND],
+        ),
+        "KEY_PREFIX": env("CACHE_KEY_PREFIX", default="bencidata"),
+    }
+}
+
+# -------------------------
+# DASHBOARD
+# -------------------------
+
+DASHBOARD_CACHE_TIMEOUT = env.int("DASHBOARD_CACHE_TIMEOUT", default=60 * 60 * 24)
+
+# -------------------------
+# ACTIVIDAD DE USUARIOS
+# -------------------------
+
+# Segundos mínimos entre dos registros de actividad del mismo perfil y entre
+# dos escrituras por lotes de la actividad acumulada en caché. El servicio
+# activity_worker (flush_last_activity --loop) guarda la actividad pendiente
+# cuando no hay tráfico; requiere una caché compartida (file o redis) y solo
+# se inicia con el perfil "shared-cache" de docker compose.
+ACTIVITY_WRITE_THRESHOLD = env.int("ACTIVITY_WRITE_THRESHOLD", default=60)
+ACTIVITY_FLUSH_INTERVAL = env.int("ACTIVITY_FLUSH_INTERVAL", default=30)
+
+# Búsqueda de usuarios con índices pg_trgm y ranking por similitud (solo
+# PostgreSQL). Desactivar si la extensión pg_trgm no está disponible.
+USER_SEARCH_TRIGRAM = env.bool("USER_SEARCH_TRIGRAM", default=True)
+
 # -------------------------
 # LOGGING
 # -------------------------
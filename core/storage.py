@@ -0,0 +1,31 @@
+"""File storage for artifacts that must not be served from ``MEDIA_URL``."""
+
+from __future__ import annotations
+
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class PrivateExportStorage(FileSystemStorage):
+    """Filesystem storage rooted at ``EXPORTS_ROOT``, outside ``MEDIA_ROOT``.
+
+    nginx serves ``/media/`` without authentication; export files live here
+    instead and are only reachable through the download view, which checks
+    the branch. The location is read from the settings on every access so
+    ``override_settings`` applies in tests.
+    """
+
+    @property
+    def base_location(self):
+        return settings.EXPORTS_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError("Private export files have no public URL.")
@@ -15,6 +15,12 @@ fi
 echo "✅ Base de datos lista, corriendo migraciones..."
 python manage.py migrate --noinput
 
+echo "📊 Completando resúmenes diarios de ganancia..."
+python manage.py rebuild_daily_profits --missing
+
+echo "🖼️ Generando miniaturas de avatares pendientes..."
+python manage.py generate_avatar_variants
+
 echo "📦 Recogiendo archivos estáticos..."
 python manage.py collectstatic --noinput || echo "⚠️ collectstatic falló (ambiente dev), continuando..."
 
@@ -0,0 +1,287 @@
+"""Builders for the fuel and profit dashboards shown on the home page."""
+
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, ExtractYear, TruncWeek, TruncYear
+
+from core.cache import invalidate, version_key
+from sucursalApp.models import (
+    BranchDailyBreakdown,
+    BranchDailyProfit,
+    FuelInventory,
+    Sucursal,
+)
+
+
+# Ventana y formato de cada granularidad, relativas al último día con datos
+# de cada sucursal: 7 días, 12 semanas y los últimos 4 años calendario.
+PROFIT_GRANULARITIES = {
+    "day": {"days": 6, "trunc": None, "format": "%d %b"},
+    "week": {"days": 7 * 11, "trunc": TruncWeek, "format": "%d %b"},
+    "year": {"years": 3, "trunc": TruncYear, "format": "%Y"},
+}
+
+
+def build_fuel_dashboard(branches) -> list[dict]:
+    """Return the tank gauges of ``branches`` using a single inventory query."""
+
+    inventories_by_branch = defaultdict(list)
+    for inventory in FuelInventory.objects.filter(
+        sucursal__in=[branch.pk for branch in branches]
+    ):
+        percentage = Decimal("0")
+        if inventory.capacity:
+            percentage = (
+                inventory.liters / inventory.capacity * Decimal("100")
+            ).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+            percentage = min(percentage, Decimal("100"))
+
+        inventories_by_branch[inventory.sucursal_id].append(
+            {
+                "fuel_type": inventory.fuel_type,
+                "liters": inventory.liters,
+                "capacity": inventory.capacity,
+                "percentage": percentage,
+            }
+        )
+
+    return [
+        {
+            "branch_name": branch.name,
+            "city": branch.city,
+            "inventories": inventories_by_branch[branch.pk],
+        }
+        for branch in branches
+    ]
+
+
+def _windowed(queryset, branch_ids, granularity: str):
+    """Restrict ``queryset`` to each branch's window and annotate its period.
+
+    The window bounds depend on the last rollup day of every branch, so they
+    are computed in SQL from a correlated subquery instead of per branch.
+    """
+
+    config = PROFIT_GRANULARITIES[granularity]
+    last_day = Subquery(
+        BranchDailyProfit.objects.filter(sucursal=OuterRef("sucursal"))
+        .order_by("-day")
+        .values("day")[:1]
+    )
+    queryset = queryset.filter(sucursal_id__in=branch_ids).alias(branch_last_day=last_day)
+    if "years" in config:
+        queryset = queryset.filter(
+            day__year__gte=ExtractYear("branch_last_day") - config["years"]
+        )
+    else:
+        queryset = queryset.filter(
+            day__gte=Cast(
+                F("branch_last_day") - timedelta(days=config["days"]), DateField()
+            )
+        )
+
+    trunc = config["trunc"]
+    period = trunc("day", output_field=DateField()) if trunc else F("day")
+    return queryset.annotate(period=period)
+
+
+def build_profit_series(branch_ids, granularity: str) -> dict[int, dict]:
+    """Return the profit chart series of ``granularity`` keyed by branch id.
+
+    Runs two grouped queries for all branches: one for the net profit per
+    (branch, period) and one for the fuel/product breakdown.
+    """
+
+    date_format = PROFIT_GRANULARITIES[granularity]["format"]
+    series: dict[int, dict] = {}
+
+    totals = (
+        _windowed(BranchDailyProfit.objects.all(), branch_ids, granularity)
+        .values("sucursal_id", "period")
+        .annotate(net=Sum(BranchDailyProfit.net_profit_expression()))
+        .order_by("sucursal_id", "period")
+    )
+    for row in totals:
+        branch_series = series.setdefault(
+            row["sucursal_id"],
+            {"labels": [], "total": [], "fuels": {}, "products": {}},
+        )
+        label = row["period"].strftime(date_format)
+        branch_series["labels"].append(label)
+        branch_series["total"].append({"label": label, "value": float(row["net"] or 0)})
+
+    breakdown = (
+        _windowed(BranchDailyBreakdown.objects.all(), branch_ids, granularity)
+        .values("sucursal_id", "kind", "label", "period")
+        .annotate(amount=Sum("amount"))
+        .order_by("sucursal_id", "kind", "label", "period")
+    )
+    for row in breakdown:
+        branch_series = series.get(row["sucursal_id"])
+        if branch_series is None:
+            continue
+        group = "fuels" if row["kind"] == BranchDailyBreakdown.KIND_FUEL else "products"
+        branch_series[group].setdefault(row["label"], []).append(
+            {
+                "label": row["period"].strftime(date_format),
+                "value": float(row["amount"] or 0),
+            }
+        )
+
+    return series
+
+
+def build_profit_dashboard(
+    branches, granularities=None, series_fn=build_profit_series
+) -> list[dict]:
+    """Return the profit charts of every branch with closed services.
+
+    The query count is fixed (two per granularity) regardless of how many
+    branches are in scope.
+    """
+
+    branch_ids = [branch.pk for branch in branches]
+    if not branch_ids:
+        return []
+
+    series_by_granularity = {
+        granularity: series_fn(branch_ids, granularity)
+        for granularity in granularities or PROFIT_GRANULARITIES
+    }
+
+    profit_dashboard = []
+    for branch in branches:
+        if not all(branch.pk in series for series in series_by_granularity.values()):
+            continue
+        profit_dashboard.append(
+            {
+                "branch_id": branch.pk,
+                "branch_name": branch.name,
+                "city": branch.city,
+                "series": {
+                    granularity: series[branch.pk]
+                    for granularity, series in series_by_granularity.items()
+                },
+            }
+        )
+    return profit_dashboard
+
+
+DASHBOARD_NAMESPACE = "dashboard"
+
+
+def _branch_version_key(branch_id: int) -> str:
+    return version_key(DASHBOARD_NAMESPACE, branch_id=branch_id)
+
+
+def dashboard_cache_key(branch_ids, name: str) -> str:
+    """Return the cache key of the ``name`` dashboard for a set of branches.
+
+    The key embeds the current version of every branch, so bumping one
+    version invalidates every scope (company or branch set) that includes it.
+    """
+
+    branch_ids = sorted(set(branch_ids))
+    versions = cache.get_many([_branch_version_key(pk) for pk in branch_ids])
+    scope = ",".join(
+        f"{pk}:{versions.get(_branch_version_key(pk), 0)}" for pk in branch_ids
+    )
+    digest = hashlib.sha256(scope.encode()).hexdigest()
+    return f"{DASHBOARD_NAMESPACE}:{name}:{digest}"
+
+
+def profit_dashboard_etag(branch_ids, granularities) -> str:
+    """Return an ETag for the profit series of ``branch_ids``, read from the data.
+
+    The cache versions restart with an empty cache, so they can repeat for
+    different data; the row count and latest ``updated_at`` of the rollups
+    (plus the branches themselves, whose names are in the payload) cannot.
+    Breakdowns are rewritten together with their ``BranchDailyProfit`` row.
+    """
+
+    branch_ids = sorted(set(branch_ids))
+    state = Sucursal.objects.filter(pk__in=branch_ids).aggregate(
+        rows=Count("daily_profits"),
+        rows_updated_at=Max("daily_profits__updated_at"),
+        branches_updated_at=Max("updated_at"),
+    )
+    scope = "|".join(
+        [
+            ",".join(map(str, branch_ids)),
+            ",".join(granularities),
+            str(state["rows"]),
+            str(state["rows_updated_at"]),
+            str(state["branches_updated_at"]),
+        ]
+    )
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _cached(branch_ids, name: str, builder):
+    key = dashboard_cache_key(branch_ids, name)
+    payload = cache.get(key)
+    if payload is None:
+        payload = builder()
+        cache.set(key, payload, settings.DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def get_fuel_dashboard(branches) -> list[dict]:
+    """Cached :func:`build_fuel_dashboard` for the scope of ``branches``."""
+
+    return _cached(
+        [branch.pk for branch in branches], "fuel", lambda: build_fuel_dashboard(branches)
+    )
+
+
+def get_profit_series(branch_ids, granularity: str) -> dict[int, dict]:
+    """Cached :func:`build_profit_series` for the scope of ``branch_ids``."""
+
+    return _cached(
+        branch_ids,
+        f"profit:{granularity}",
+        lambda: build_profit_series(branch_ids, granularity),
+    )
+
+
+def get_profit_dashboard(branches, granularities=None) -> list[dict]:
+    """:func:`build_profit_dashboard` reading every series from the cache."""
+
+    return build_profit_dashboard(branches, granularities, series_fn=get_profit_series)
+
+
+def prewarm_branch_dashboards(branch_id: int) -> None:
+    """Rebuild the cached dashboards that include ``branch_id``.
+
+    Covers the fuel gauges of the two scopes the home page uses (the whole
+    company of the branch and the branch alone) and the profit series of the
+    branch, which the charts request one branch at a time.
+    """
+
+    branch = Sucursal.objects.filter(pk=branch_id).first()
+    if branch is None:
+        return
+    get_fuel_dashboard(
+        list(Sucursal.objects.filter(company_id=branch.company_id).order_by("name"))
+    )
+    get_fuel_dashboard([branch])
+    for granularity in PROFIT_GRANULARITIES:
+        get_profit_series([branch.pk], granularity)
+
+
+def invalidate_branch_dashboard(branch_id: int | None) -> None:
+    """Expire every cached dashboard that includes ``branch_id``.
+
+    The next visit rebuilds the payloads; ``manage.py prewarm_dashboards``
+    rebuilds them ahead of time (for example after a deploy).
+    """
+
+    if not branch_id:
+        return
+    invalidate(DASHBOARD_NAMESPACE, branch_id=branch_id)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from homeApp.dashboard import prewarm_branch_dashboards
+from sucursalApp.models import Sucursal
+
+
+class Command(BaseCommand):
+    help = "Precalcula en caché los dashboards de inicio de las sucursales."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--branch",
+            type=int,
+            action="append",
+            dest="branches",
+            help="Sucursal a precalcular (se puede repetir). Por defecto, todas.",
+        )
+
+    def handle(self, *args, **options):
+        branch_ids = options["branches"] or list(
+            Sucursal.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        for branch_id in branch_ids:
+            prewarm_branch_dashboards(branch_id)
+        self.stdout.write(
+            self.style.SUCCESS(f"Dashboards precalculados para {len(branch_ids)} sucursales.")
+        )
@@ -1,9 +1,33 @@
+import time
+
 from django.utils.deprecation import MiddlewareMixin
-from django.utils.timezone import now
-from datetime import timedelta
 from django.conf import settings
 from django.urls import resolve
 
+from UsuarioApp.activity import record_activity
+
+
+SESSION_REFRESHED_AT_KEY = "_session_refreshed_at"
+
+
+def refresh_session_expiry(session, now=None) -> bool:
+    """Re-extend ``session`` only when its remaining lifetime is short.
+
+    Extending marks the session as modified, which costs a session write, so
+    it only happens once the remaining lifetime drops below
+    ``SESSION_REFRESH_THRESHOLD`` seconds. Returns whether it was extended.
+    """
+    now = now or time.time()
+    refreshed_at = session.get(SESSION_REFRESHED_AT_KEY)
+    if refreshed_at is not None:
+        remaining = settings.SESSION_COOKIE_AGE - (now - refreshed_at)
+        if remaining > settings.SESSION_REFRESH_THRESHOLD:
+            return False
+
+    session.set_expiry(settings.SESSION_COOKIE_AGE)
+    session[SESSION_REFRESHED_AT_KEY] = int(now)
+    return True
+
 
 class UpdateLastActivityMiddleware(MiddlewareMixin):
     def process_view(self, request, view_func, view_args, view_kwargs):
@@ -18,12 +42,13 @@ class UpdateLastActivityMiddleware(MiddlewareMixin):
                 # If the user profile does not exist, skip updating last activity
                 return None
 
-            # Update the last activity timestamp
-            profile.update_last_activity()
+            # Record the activity only when the stored value is stale; the
+            # tracker buffers it in the cache and writes it in batches once
+            # the flush interval has elapsed
+            record_activity(profile)
 
-            # Extend the session if the last activity is within the session age limit
-            session_age_limit = now() - timedelta(seconds=settings.SESSION_COOKIE_AGE)
-            if profile.last_activity and profile.last_activity > session_age_limit:
-                request.session.set_expiry(settings.SESSION_COOKIE_AGE)
+            # Extend the session only when its remaining lifetime is short,
+            # so most requests do not write the session
+            refresh_session_expiry(request.session)
 
         return None
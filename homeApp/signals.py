@@ -0,0 +1,127 @@
+# homeApp/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.commit import add_to_commit_batch
+from homeApp.dashboard import invalidate_branch_dashboard
+from sucursalApp.models import (
+    BranchDailyProfit,
+    FuelInventory,
+    ServiceSession,
+    ServiceSessionCreditSale,
+    ServiceSessionFirefighterPayment,
+    ServiceSessionFuelLoad,
+    ServiceSessionFuelSale,
+    ServiceSessionProductLoad,
+    ServiceSessionProductSale,
+    ServiceSessionProductSaleItem,
+    ServiceSessionTransbankVoucher,
+    ServiceSessionWithdrawal,
+    session_is_being_deleted,
+)
+
+CHANGED_DAYS_BATCH = "homeApp:changed-days"
+
+
+@receiver(post_save, sender=BranchDailyProfit)
+@receiver(post_delete, sender=BranchDailyProfit)
+@receiver(post_save, sender=FuelInventory)
+@receiver(post_delete, sender=FuelInventory)
+def invalidate_dashboard_for_branch(sender, instance, **kwargs):
+    """Los cierres de servicio y los cambios de estanque afectan al dashboard."""
+
+    if kwargs.get("raw"):
+        return
+    invalidate_branch_dashboard(instance.sucursal_id)
+
+
+@receiver(post_save, sender=ServiceSessionFuelLoad)
+def invalidate_dashboard_for_fuel_load(sender, instance, **kwargs):
+    """Una carga de combustible cambia el nivel de su estanque."""
+
+    if kwargs.get("raw"):
+        return
+    invalidate_branch_dashboard(
+        FuelInventory.objects.filter(pk=instance.inventory_id)
+        .values_list("sucursal_id", flat=True)
+        .first()
+    )
+
+
+def _refresh_changed_days(items) -> None:
+    for branch_id, day in items:
+        if day is not None:
+            BranchDailyProfit.refresh(branch_id, day)
+    for branch_id in {branch_id for branch_id, _ in items}:
+        invalidate_branch_dashboard(branch_id)
+
+
+def _schedule_refresh(branch_id, ended_at) -> None:
+    """Refresh the ``(branch, day)`` rollup once, after the transaction commits.
+
+    A cascade delete (or a batch of edits) fires one signal per record; they
+    all collapse into a single refresh per day, computed once the rows are
+    written or gone.
+    """
+
+    if not branch_id:
+        return
+    day = timezone.localdate(ended_at) if ended_at else None
+    add_to_commit_batch(CHANGED_DAYS_BATCH, (branch_id, day), _refresh_changed_days)
+
+
+@receiver(post_delete, sender=ServiceSession)
+def invalidate_dashboard_for_deleted_session(sender, instance, **kwargs):
+    """Eliminar un servicio cerrado recalcula el resumen diario de su día."""
+
+    _schedule_refresh(instance.branch_id, instance.ended_at)
+
+
+def _schedule_closed_session_refresh(sessions) -> None:
+    """Schedule the rollup refresh of the session in ``sessions``, if closed."""
+
+    session = sessions.values("pk", "branch_id", "ended_at").first()
+    if session is None or session["ended_at"] is None:
+        return  # los servicios abiertos aún no están en el resumen diario
+    if session_is_being_deleted(session["pk"]):
+        return  # lo cubre invalidate_dashboard_for_deleted_session
+    _schedule_refresh(session["branch_id"], session["ended_at"])
+
+
+@receiver(post_save, sender=ServiceSessionFuelSale)
+@receiver(post_delete, sender=ServiceSessionFuelSale)
+@receiver(post_save, sender=ServiceSessionFuelLoad)
+@receiver(post_delete, sender=ServiceSessionFuelLoad)
+@receiver(post_save, sender=ServiceSessionProductLoad)
+@receiver(post_delete, sender=ServiceSessionProductLoad)
+@receiver(post_save, sender=ServiceSessionProductSale)
+@receiver(post_delete, sender=ServiceSessionProductSale)
+@receiver(post_save, sender=ServiceSessionCreditSale)
+@receiver(post_delete, sender=ServiceSessionCreditSale)
+@receiver(post_save, sender=ServiceSessionWithdrawal)
+@receiver(post_delete, sender=ServiceSessionWithdrawal)
+@receiver(post_save, sender=ServiceSessionTransbankVoucher)
+@receiver(post_delete, sender=ServiceSessionTransbankVoucher)
+@receiver(post_save, sender=ServiceSessionFirefighterPayment)
+@receiver(post_delete, sender=ServiceSessionFirefighterPayment)
+def refresh_rollup_for_record(sender, instance, **kwargs):
+    """Cambiar un registro de un servicio cerrado recalcula su resumen diario."""
+
+    if kwargs.get("raw") or session_is_being_deleted(instance.service_session_id):
+        return
+    _schedule_closed_session_refresh(
+        ServiceSession.objects.filter(pk=instance.service_session_id)
+    )
+
+
+@receiver(post_save, sender=ServiceSessionProductSaleItem)
+@receiver(post_delete, sender=ServiceSessionProductSaleItem)
+def refresh_rollup_for_sale_item(sender, instance, **kwargs):
+    """Los productos vendidos fijan la venta por producto del resumen diario."""
+
+    if kwargs.get("raw"):
+        return
+    _schedule_closed_session_refresh(
+        ServiceSession.objects.filter(product_sales=instance.sale_id)
+    )
@@ -3,4 +3,9 @@ from homeApp import views
 
 urlpatterns = [
     path("", views.HomeView.as_view(), name="Home"),
+    path(
+        "dashboard/ganancias/",
+        views.ProfitDashboardDataView.as_view(),
+        name="profit_dashboard_data",
+    ),
 ]
@@ -1,92 +1,77 @@
-from collections import defaultdict
-from datetime import date
-from decimal import Decimal, ROUND_HALF_UP
 from functools import reduce
 from operator import or_
 
+from django.http import Http404, JsonResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
+from django.views import View
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.db.models import Q
-from django.db.models import (
-    DecimalField,
-    ExpressionWrapper,
-    F,
-    OuterRef,
-    Subquery,
-    Sum,
-    Value,
-)
-from django.db.models.functions import (
-    Coalesce,
-    TruncDay,
-    TruncWeek,
-    TruncYear,
-)
 from django.utils import timezone
+from UsuarioApp.activity import flush_activity_if_due
 from UsuarioApp.models import Profile
+from core.principal import request_principal
 from homeApp.models import Company
-from sucursalApp.models import (
-    ServiceSession,
-    ServiceSessionCreditSale,
-    ServiceSessionFirefighterPayment,
-    ServiceSessionFuelLoad,
-    ServiceSessionFuelSale,
-    ServiceSessionProductLoad,
-    ServiceSessionProductSaleItem,
-    ServiceSessionTransbankVoucher,
-    ServiceSessionWithdrawal,
-    Sucursal,
-    SucursalStaff,
+from homeApp.dashboard import (
+    PROFIT_GRANULARITIES,
+    get_fuel_dashboard,
+    get_profit_dashboard,
+    profit_dashboard_etag,
 )
+from sucursalApp.models import Sucursal
 
 
 # Create your views here.
 
 
-class HomeView(LoginRequiredMixin, ListView):
-    model = User
-    template_name = "pages/index.html"
+class DashboardScopeMixin:
+    """Resolve the company and branches the current user can see."""
 
     def _resolve_scope(self):
+        if hasattr(self, "_scope"):
+            return self._scope
+
         profile = getattr(self.request.user, "profile", None)
+        principal = request_principal(self.request)
         company = None
         branches: list[Sucursal] = []
         has_company_scope = False
 
-        if profile and profile.is_owner():
+        if profile and principal.is_owner:
             has_company_scope = True
-            company = Company.objects.filter(profile=profile).first()
-            if not company and profile.company_rut:
+            if principal.company_id:
+                company = Company.objects.filter(pk=principal.company_id).first()
+            elif profile.company_rut:
                 normalized_rut = Company.normalize_rut(profile.company_rut)
                 company = Company.objects.filter(rut=normalized_rut).first()
 
-        if profile and profile.current_branch and not has_company_scope:
+        if profile and principal.current_branch_id and not has_company_scope:
             branches = [profile.current_branch]
             company = company or profile.current_branch.company
         elif has_company_scope and company:
+            branches = list(company.branches.order_by("name"))
+        elif profile and principal.staff_branch_ids:
             branches = list(
-                company.branches.prefetch_related("fuel_inventories").order_by("name")
+                Sucursal.objects.filter(id__in=principal.staff_branch_ids)
+                .select_related("company")
+                .order_by("name")
             )
-        elif profile:
-            branch_ids = list(
-                SucursalStaff.objects.filter(profile=profile).values_list(
-                    "sucursal_id", flat=True
-                )
-            )
-            if profile.current_branch_id:
-                branch_ids.append(profile.current_branch_id)
+            if not company and branches:
+                company = branches[0].company
 
-            if branch_ids:
-                branch_ids = list(dict.fromkeys(branch_ids))
-                branches_qs = Sucursal.objects.filter(id__in=branch_ids).prefetch_related(
-                    "fuel_inventories"
-                )
-                branches = list(branches_qs.order_by("name"))
-                if not company and branches:
-                    company = branches[0].company
+        self._scope = (profile, company, branches, has_company_scope)
+        return self._scope
 
-        return profile, company, branches, has_company_scope
+
+class HomeView(LoginRequiredMixin, DashboardScopeMixin, ListView):
+    model = User
+    template_name = "pages/index.html"
 
     def _get_scoped_profiles(
         self,
@@ -139,7 +124,11 @@ class HomeView(LoginRequiredMixin, ListView):
             company, branches, has_company_scope
         )
 
-        # Agrega los usuarios activos al contexto, limitados al alcance del usuario
+        # Agrega los usuarios activos al contexto, limitados al alcance del usuario.
+        # La actividad acumulada en caché se guarda antes de contarla si ya
+        # venció el intervalo de guardado (a lo más ACTIVITY_FLUSH_INTERVAL de
+        # retraso frente a la ventana de 2 minutos).
+        flush_activity_if_due()
         recent_activity_cutoff = timezone.now() - timezone.timedelta(minutes=2)
         active_users = scoped_profiles.filter(
             last_activity__gte=recent_activity_cutoff
@@ -150,318 +139,49 @@ class HomeView(LoginRequiredMixin, ListView):
             profile and (profile.is_owner() or profile.is_admin())
         )
 
-        fuel_dashboard: list[dict] = []
-
-        if branches:
-            for branch in branches:
-                inventories = []
-                for inventory in branch.fuel_inventories.all():
-                    percentage = Decimal("0")
-                    if inventory.capacity:
-                        percentage = (
-                            inventory.liters
-                            / inventory.capacity
-                            * Decimal("100")
-                        ).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
-                        percentage = min(percentage, Decimal("100"))
-
-                    inventories.append(
-                        {
-                            "fuel_type": inventory.fuel_type,
-                            "liters": inventory.liters,
-                            "capacity": inventory.capacity,
-                            "percentage": percentage,
-                        }
-                    )
-
-                fuel_dashboard.append(
-                    {
-                        "branch_name": branch.name,
-                        "city": branch.city,
-                        "inventories": inventories,
-                    }
-                )
-
-        profit_dashboard: list[dict] = []
-        if branches:
-            decimal_zero = Decimal("0")
-            zero_value = Value(
-                decimal_zero,
-                output_field=DecimalField(max_digits=14, decimal_places=2),
-            )
+        context["company"] = company
+        context["fuel_dashboard"] = get_fuel_dashboard(branches)
+        # Los gráficos de ganancias se cargan aparte desde ProfitDashboardDataView.
+        context["profit_branches"] = branches
 
-            def sum_subquery(model, value_field: str, filter_field: str = "service_session"):
-                return Coalesce(
-                    Subquery(
-                        model.objects.filter(**{f"{filter_field}": OuterRef("pk")})
-                        .values(filter_field)
-                        .annotate(total=Sum(value_field))
-                        .values("total"),
-                        output_field=DecimalField(
-                            max_digits=14,
-                            decimal_places=2,
-                        ),
-                    ),
-                    zero_value,
-                )
-
-            annotated_sessions = ServiceSession.objects.filter(
-                shift__sucursal__in=branches, ended_at__isnull=False
-            ).annotate(
-                credit_total=sum_subquery(
-                    ServiceSessionCreditSale, "amount", "service_session"
-                ),
-                withdrawal_total=sum_subquery(
-                    ServiceSessionWithdrawal, "amount", "service_session"
-                ),
-                voucher_total=sum_subquery(
-                    ServiceSessionTransbankVoucher, "total_amount", "service_session"
-                ),
-                fuel_load_payment_total=sum_subquery(
-                    ServiceSessionFuelLoad, "payment_amount", "service_session"
-                ),
-                product_load_payment_total=sum_subquery(
-                    ServiceSessionProductLoad, "payment_amount", "service_session"
-                ),
-                firefighter_payments_total=sum_subquery(
-                    ServiceSessionFirefighterPayment, "amount", "service_session"
-                ),
-                product_sales_value=Coalesce(
-                    Subquery(
-                        ServiceSessionProductSaleItem.objects.filter(
-                            sale__service_session=OuterRef("pk")
-                        )
-                        .values("sale__service_session")
-                        .annotate(
-                            total=Sum(
-                                F("quantity") * F("product__value"),
-                                output_field=DecimalField(
-                                    max_digits=14,
-                                    decimal_places=2,
-                                ),
-                            )
-                        )
-                        .values("total"),
-                        output_field=DecimalField(
-                            max_digits=14,
-                            decimal_places=2,
-                        ),
-                    ),
-                    zero_value,
-                ),
-            )
+        return context
 
-            def build_series(queryset, trunc_fn, date_format: str, start_date=None, end_date=None):
-                filtered_queryset = queryset
-                if start_date:
-                    filtered_queryset = filtered_queryset.filter(
-                        ended_at__date__gte=start_date
-                    )
-
-                if end_date:
-                    filtered_queryset = filtered_queryset.filter(ended_at__date__lt=end_date)
-
-                session_ids = list(filtered_queryset.values_list("id", flat=True))
-
-                records = filtered_queryset.annotate(period=trunc_fn("ended_at")).values(
-                    "period",
-                    "initial_budget",
-                    "credit_total",
-                    "voucher_total",
-                    "withdrawal_total",
-                    "product_sales_value",
-                    "fuel_load_payment_total",
-                    "firefighter_payments_total",
-                    "product_load_payment_total",
-                )
-
-                grouped_totals: dict = {}
-                period_labels: dict = {}
-                fuel_totals: dict[str, dict] = defaultdict(lambda: defaultdict(lambda: decimal_zero))
-                product_totals: dict[str, dict] = defaultdict(
-                    lambda: defaultdict(lambda: decimal_zero)
-                )
-
-                for record in records:
-                    period = record["period"]
-                    if not period:
-                        continue
-
-                    period_labels.setdefault(period, period.strftime(date_format))
-                    totals = grouped_totals.setdefault(
-                        period,
-                        {
-                            "total_credit": decimal_zero,
-                            "total_voucher": decimal_zero,
-                            "total_withdrawal": decimal_zero,
-                            "total_product_sales": decimal_zero,
-                            "total_fuel_payment": decimal_zero,
-                            "total_firefighter_payment": decimal_zero,
-                            "total_product_load_payment": decimal_zero,
-                        },
-                    )
-                    totals["total_credit"] += record["credit_total"] or decimal_zero
-                    totals["total_voucher"] += record["voucher_total"] or decimal_zero
-                    totals["total_withdrawal"] += record["withdrawal_total"] or decimal_zero
-                    totals["total_product_sales"] += record["product_sales_value"] or decimal_zero
-                    totals["total_fuel_payment"] += record[
-                        "fuel_load_payment_total"
-                    ] or decimal_zero
-                    totals["total_firefighter_payment"] += record[
-                        "firefighter_payments_total"
-                    ] or decimal_zero
-                    totals["total_product_load_payment"] += record[
-                        "product_load_payment_total"
-                    ] or decimal_zero
-
-                fuel_records = (
-                    ServiceSessionFuelSale.objects.filter(
-                        service_session_id__in=session_ids
-                    )
-                    .annotate(period=trunc_fn("service_session__ended_at"))
-                    .values("period", "fuel_type")
-                    .annotate(total=Sum("liters_sold"))
-                )
-
-                for record in fuel_records:
-                    period = record["period"]
-                    fuel_type = record["fuel_type"] or "Combustible"
-                    if not period:
-                        continue
-
-                    period_labels.setdefault(period, period.strftime(date_format))
-                    fuel_totals[fuel_type][period] += record["total"] or decimal_zero
-
-                product_records = (
-                    ServiceSessionProductSaleItem.objects.filter(
-                        sale__service_session_id__in=session_ids
-                    )
-                    .annotate(period=trunc_fn("sale__service_session__ended_at"))
-                    .values("period", "product__product_type")
-                    .annotate(
-                        total=Sum(
-                            F("quantity") * F("product__value"),
-                            output_field=DecimalField(
-                                max_digits=14,
-                                decimal_places=2,
-                            ),
-                        )
-                    )
-                )
-
-                for record in product_records:
-                    period = record["period"]
-                    product_type = record["product__product_type"] or "Producto"
-                    if not period:
-                        continue
-
-                    period_labels.setdefault(period, period.strftime(date_format))
-                    product_totals[product_type][period] += record["total"] or decimal_zero
-
-                ordered_periods = [
-                    item[0] for item in sorted(period_labels.items(), key=lambda item: item[0])
-                ]
-                labels = [period_labels[period] for period in ordered_periods]
-
-                total_series = []
-                for period in ordered_periods:
-                    totals = grouped_totals.get(period)
-                    if not totals:
-                        continue
-
-                    total_profit = (
-                        + totals["total_credit"]
-                        + totals["total_voucher"]
-                        + totals["total_withdrawal"]
-                        + totals["total_product_sales"]
-                        - totals["total_fuel_payment"]
-                        - totals["total_firefighter_payment"]
-                        - totals["total_product_load_payment"]
-                    )
-
-                    total_series.append(
-                        {
-                            "label": period_labels[period],
-                            "value": float(total_profit or decimal_zero),
-                        }
-                    )
-
-                def build_grouped_series(grouped: dict[str, dict]):
-                    grouped_series: dict[str, list[dict]] = {}
-                    for entry, period_totals in grouped.items():
-                        grouped_series[entry] = [
-                            {
-                                "label": period_labels[period],
-                                "value": float(period_totals.get(period) or decimal_zero),
-                            }
-                            for period in ordered_periods
-                            if period in period_totals
-                        ]
-                    return grouped_series
-
-                return {
-                    "labels": labels,
-                    "total": total_series,
-                    "fuels": build_grouped_series(fuel_totals),
-                    "products": build_grouped_series(product_totals),
-                }
-
-            for branch in branches:
-                branch_sessions = annotated_sessions.filter(shift__sucursal=branch)
-                if not branch_sessions.exists():
-                    continue
-            for branch in branches:
-                branch_sessions = annotated_sessions.filter(shift__sucursal=branch)
-                if not branch_sessions.exists():
-                    continue
-
-                last_session = branch_sessions.order_by("-ended_at").values_list(
-                    "ended_at", flat=True
-                ).first()
-                if not last_session:
-                    continue
-
-                last_session_date = timezone.localtime(last_session).date()
-
-                start_of_week = last_session_date - timezone.timedelta(days=6)
-                start_of_week_range = last_session_date - timezone.timedelta(weeks=11)
-                start_of_year_range = date(last_session_date.year - 3, 1, 1)
-                end_of_range = last_session_date + timezone.timedelta(days=1)
-
-                profit_dashboard.append(
-                    {
-                        "branch_name": branch.name,
-                        "city": branch.city,
-                        "series": {
-                            "day": build_series(
-                                branch_sessions,
-                                TruncDay,
-                                "%d %b",
-                                start_of_week,
-                                end_of_range,
-                            ),
-                            "week": build_series(
-                                branch_sessions,
-                                TruncWeek,
-                                "%d %b",
-                                start_of_week_range,
-                                end_of_range,
-                            ),
-                            "year": build_series(
-                                branch_sessions,
-                                TruncYear,
-                                "%Y",
-                                start_of_year_range,
-                                end_of_range,
-                            ),
-                        },
-                    }
-                )
 
-        context["company"] = company
-        context["fuel_dashboard"] = fuel_dashboard
-        context["profit_dashboard"] = profit_dashboard
+class ProfitDashboardDataView(LoginRequiredMixin, DashboardScopeMixin, View):
+    """Series de ganancias del dashboard en JSON para los gráficos del inicio.
 
-        return context
+    Acepta ``branch`` y ``granularity`` para pedir una sola sucursal o un solo
+    intervalo. La respuesta lleva un ETag derivado de los resúmenes diarios de
+    cada sucursal, por lo que el navegador revalida sin recalcular las series.
+    """
 
+    max_age = 60
 
+    def get(self, request, *args, **kwargs):
+        _, _, branches, _ = self._resolve_scope()
+
+        branch_id = request.GET.get("branch")
+        if branch_id:
+            branches = [branch for branch in branches if str(branch.pk) == branch_id]
+            if not branches:
+                raise Http404("Sucursal no disponible.")
+
+        granularity = request.GET.get("granularity")
+        if granularity and granularity not in PROFIT_GRANULARITIES:
+            return JsonResponse({"error": "Intervalo no válido."}, status=400)
+        granularities = [granularity] if granularity else list(PROFIT_GRANULARITIES)
+
+        # El ETag sale de los resúmenes diarios (una consulta agregada), no de
+        # las versiones en caché, que se reinician junto con la caché.
+        etag = quote_etag(
+            profit_dashboard_etag([branch.pk for branch in branches], granularities)
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse(
+                {"branches": get_profit_dashboard(branches, granularities)}
+            )
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        patch_vary_headers(response, ("Cookie",))
+        return response
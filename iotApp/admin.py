@@ -1,3 +1,24 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DispenseEvent
+
+
+@admin.register(DispenseEvent)
+class DispenseEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "uid",
+        "litros",
+        "pistola",
+        "nozzle",
+        "firefighter",
+        "service_session",
+        "created_at",
+    )
+    list_filter = ("created_at",)
+    list_select_related = (
+        "nozzle__machine__island__sucursal",
+        "firefighter__user_FK",
+        "service_session__shift",
+    )
+    search_fields = ("uid", "pistola")
+    date_hierarchy = "created_at"
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("UsuarioApp", "0008_user_search_trigram_indexes"),
+        ("iotApp", "0003_alter_dispenseevent_pistola"),
+        ("sucursalApp", "0049_provision_machine_numerals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dispenseevent",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="dispense_events",
+                to="sucursalApp.sucursal",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dispenseevent",
+            index=models.Index(
+                fields=["branch", "created_at"], name="dispense_branch_created"
+            ),
+        ),
+    ]
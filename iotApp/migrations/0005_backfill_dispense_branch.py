@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_dispense_branch(apps, schema_editor):
+    """Take the branch of the service or, without one, of the nozzle."""
+
+    DispenseEvent = apps.get_model("iotApp", "DispenseEvent")
+    ServiceSession = apps.get_model("sucursalApp", "ServiceSession")
+    Nozzle = apps.get_model("sucursalApp", "Nozzle")
+
+    DispenseEvent.objects.filter(
+        branch__isnull=True, service_session__isnull=False
+    ).update(
+        branch_id=Subquery(
+            ServiceSession.objects.filter(pk=OuterRef("service_session_id")).values(
+                "branch_id"
+            )[:1]
+        )
+    )
+    DispenseEvent.objects.filter(branch__isnull=True, nozzle__isnull=False).update(
+        branch_id=Subquery(
+            Nozzle.objects.filter(pk=OuterRef("nozzle_id")).values(
+                "machine__island__sucursal_id"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("iotApp", "0004_session_branch"),
+        ("sucursalApp", "0051_backfill_session_branch"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dispense_branch, migrations.RunPython.noop),
+    ]
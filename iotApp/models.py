@@ -1,5 +1,7 @@
 from django.db import models
 
+from sucursalApp.models import Nozzle, session_branch_id
+
 # Create your models here.
 
 class DispenseEvent(models.Model):
@@ -36,10 +38,36 @@ class DispenseEvent(models.Model):
         blank=True,
         related_name="dispense_events",
     )
+    # Sucursal del servicio (o de la pistola), para filtrar sin unir tablas.
+    branch = models.ForeignKey(
+        "sucursalApp.Sucursal",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="dispense_events",
+    )
     timestamp_arduino = models.CharField(
         max_length=100, null=True, blank=True
     )  # lo que te mande el Arduino (epoch, ISO, etc.)
     created_at = models.DateTimeField(auto_now_add=True)  # cuándo lo recibió Django
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["branch", "created_at"], name="dispense_branch_created"),
+        ]
+
     def __str__(self):
         return f"{self.uid} - {self.litros} L - pistola {self.pistola}"
+
+    def save(self, *args, **kwargs):
+        if self.branch_id is None:
+            if self.service_session_id:
+                self.branch_id = session_branch_id(self.service_session_id)
+            elif self.nozzle_id:
+                self.branch_id = (
+                    Nozzle.objects.filter(pk=self.nozzle_id)
+                    .values_list("machine__island__sucursal_id", flat=True)
+                    .first()
+                )
+        super().save(*args, **kwargs)
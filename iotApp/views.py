@@ -47,6 +47,7 @@ def recibir_datos_proxy(request):
     fuel_numeral = None
     firefighter = None
     service_session = None
+    branch_id = None
     pistola_number = None
     pistola_str = None
 
@@ -70,7 +71,7 @@ def recibir_datos_proxy(request):
             branch_id = nozzle.machine.island.sucursal_id
             service_session = (
                 ServiceSession.objects.filter(
-                    shift__sucursal_id=branch_id, ended_at__isnull=True
+                    branch_id=branch_id, ended_at__isnull=True
                 )
                 .order_by("-started_at")
                 .first()
@@ -100,6 +101,7 @@ def recibir_datos_proxy(request):
         fuel_numeral=fuel_numeral,
         firefighter=firefighter,
         service_session=service_session,
+        branch_id=branch_id,
         pistola=pistola_str,
         timestamp_arduino=str(timestamp) if timestamp is not None else None,
     )
@@ -0,0 +1,2 @@
+-- Búsqueda de usuarios (UsuarioApp, migración 0008).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
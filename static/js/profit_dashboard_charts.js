@@ -1,8 +1,9 @@
 (function () {
-  const profitDataElement = document.getElementById("profit-dashboard-data");
-  if (!profitDataElement) return;
+  const container = document.getElementById("profit-dashboard");
+  if (!container) return;
 
-  const profitData = JSON.parse(profitDataElement.textContent);
+  const endpoint = container.dataset.url;
+  const countLabel = container.querySelector("[data-profit-count]");
 
   const formatCurrency = (value) => `$${Number(value).toLocaleString("es-CL")}`;
   const formatLiters = (value) => `${Number(value).toLocaleString("es-CL")} L`;
@@ -37,60 +38,74 @@
     });
   };
 
-  profitData.forEach((branch, index) => {
+  const fetchRange = (branchId, range) => {
+    const params = new URLSearchParams({ branch: branchId, granularity: range });
+    return fetch(`${endpoint}?${params}`, {
+      credentials: "same-origin",
+      headers: { Accept: "application/json" },
+    })
+      .then((response) => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+      })
+      .then((payload) => {
+        const branch = (payload.branches || [])[0];
+        return branch ? branch.series[range] : null;
+      });
+  };
+
+  const buildTotalDataset = (rangeData, labels) => [
+    {
+      label: "Ganancias",
+      data: resolveDataPoints(rangeData.total || [], labels),
+      borderColor: "#0ea5e9",
+      backgroundColor: "rgba(14, 165, 233, 0.1)",
+      tension: 0.25,
+      fill: true,
+      pointRadius: 3,
+      pointHoverRadius: 5,
+    },
+  ];
+
+  const removeCard = (card) => {
+    card.remove();
+    const remaining = container.querySelectorAll("[data-profit-branch]").length;
+    if (!remaining) {
+      container.remove();
+    } else if (countLabel) {
+      countLabel.textContent = `${remaining} sucursales`;
+    }
+  };
+
+  container.querySelectorAll("[data-profit-branch]").forEach((card) => {
+    const index = card.dataset.index;
+    const branchId = card.dataset.profitBranch;
     const canvas = document.getElementById(`profit-chart-${index}`);
     if (!canvas) return;
 
-    const ctx = canvas.getContext("2d");
-    const rangeSelector = document.querySelector(
+    const status = card.querySelector("[data-profit-status]");
+    const rangeSelector = card.querySelector(
       `select[data-branch-index="${index}"]`
     );
-    const viewSelector = document.querySelector(
+    const viewSelector = card.querySelector(
       `select[data-branch-view-index="${index}"]`
     );
 
-    const seriesByRange = branch.series || {};
-    const initialRange = seriesByRange.day || {};
-    const labels = initialRange.labels || [];
-    const datasets = [
-      {
-        label: "Ganancias",
-        data: resolveDataPoints(initialRange.total || [], labels),
-        borderColor: "#0ea5e9",
-        backgroundColor: "rgba(14, 165, 233, 0.1)",
-        tension: 0.25,
-        fill: true,
-        pointRadius: 3,
-        pointHoverRadius: 5,
-      },
-    ];
-
-    const chart = new Chart(ctx, {
-      type: "line",
-      data: {
-        labels,
-        datasets,
-      },
-      options: {
-        responsive: true,
-        maintainAspectRatio: false,
-        interaction: {
-          intersect: false,
-          mode: "index",
-        },
-        scales: {
-          y: {
-            beginAtZero: true,
-            ticks: {
-              callback: (value) => formatCurrency(value),
-            },
-          },
-        },
-      },
-    });
+    // Cada intervalo se pide una sola vez; el navegador revalida con ETag.
+    const seriesByRange = {};
+    const loadRange = (range) => {
+      if (!seriesByRange[range]) {
+        seriesByRange[range] = fetchRange(branchId, range).catch((error) => {
+          delete seriesByRange[range];
+          throw error;
+        });
+      }
+      return seriesByRange[range];
+    };
 
-    const updateChart = (range, view) => {
-      const rangeData = seriesByRange[range] || {};
+    let chart = null;
+
+    const renderChart = (rangeData, view) => {
       const labels = rangeData.labels || [];
 
       let datasets = [];
@@ -100,34 +115,65 @@
       } else if (view === "products") {
         datasets = buildDatasetsFromMap(rangeData.products, labels);
       } else {
-        datasets = [
-          {
-            label: "Ganancias",
-            data: resolveDataPoints(rangeData.total || [], labels),
-            borderColor: "#0ea5e9",
-            backgroundColor: "rgba(14, 165, 233, 0.1)",
-            tension: 0.25,
-            fill: true,
-            pointRadius: 3,
-            pointHoverRadius: 5,
+        datasets = buildTotalDataset(rangeData, labels);
+      }
+
+      const formatTick = view === "fuels" ? formatLiters : formatCurrency;
+
+      if (!chart) {
+        chart = new Chart(canvas.getContext("2d"), {
+          type: "line",
+          data: {
+            labels,
+            datasets,
+          },
+          options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: {
+              intersect: false,
+              mode: "index",
+            },
+            scales: {
+              y: {
+                beginAtZero: true,
+                ticks: {
+                  callback: (value) => formatTick(value),
+                },
+              },
+            },
           },
-        ];
+        });
+        return;
       }
 
-      chart.options.scales.y.ticks.callback =
-        view === "fuels" ? formatLiters : formatCurrency;
+      chart.options.scales.y.ticks.callback = formatTick;
 
       chart.data.labels = labels;
       chart.data.datasets = datasets;
       chart.update();
     };
+
     const handleUpdate = () => {
       const rangeValue = rangeSelector ? rangeSelector.value : "day";
       const viewValue = viewSelector ? viewSelector.value : "total";
-      updateChart(rangeValue, viewValue);
+      loadRange(rangeValue)
+        .then((rangeData) => {
+          if (!rangeData) {
+            removeCard(card);
+            return;
+          }
+          if (status) status.classList.add("hidden");
+          renderChart(rangeData, viewValue);
+        })
+        .catch(() => {
+          if (status) {
+            status.classList.remove("hidden");
+            status.textContent = "No se pudieron cargar las ganancias.";
+          }
+        });
     };
 
-
     if (rangeSelector) {
       rangeSelector.addEventListener("change", handleUpdate);
     }
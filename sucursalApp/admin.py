@@ -1,10 +1,17 @@
 from django.contrib import admin
+from django.db.models import DecimalField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 
 from .models import (
+    BranchCreditBalance,
+    BranchDailyBreakdown,
+    BranchDailyProfit,
     BranchProduct,
+    ExportJob,
     FuelInventory,
     Island,
     Machine,
+    MachineFuelInventoryNumeral,
     Nozzle,
     Shift,
     ServiceSession,
@@ -20,6 +27,19 @@ from .models import (
 )
 
 
+class SucursalListFilter(admin.RelatedFieldListFilter):
+    """Branch filter whose choices load the company in the same query."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ("name",)
+        branches = (
+            Sucursal.objects.complex_filter(field.get_limit_choices_to())
+            .select_related("company")
+            .order_by(*ordering)
+        )
+        return [(branch.pk, str(branch)) for branch in branches]
+
+
 class NozzleInline(admin.TabularInline):
     model = Nozzle
     extra = 1
@@ -44,6 +64,10 @@ class SucursalStaffInline(admin.TabularInline):
     model = SucursalStaff
     extra = 1
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.select_related("sucursal", "profile__user_FK")
+
 
 class FuelInventoryInline(admin.TabularInline):
     model = FuelInventory
@@ -78,27 +102,30 @@ class SucursalAdmin(admin.ModelAdmin):
         IslandInline,
     ]
 
-    @admin.display(description="Islas")
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("company").with_counts()
+
+    @admin.display(description="Islas", ordering="islands_total")
     def island_count(self, obj: Sucursal) -> int:
-        return obj.branch_islands.count()
+        return obj.islands_count
 
-    @admin.display(description="Máquinas")
+    @admin.display(description="Máquinas", ordering="machines_total")
     def machines_count(self, obj: Sucursal) -> int:
         return obj.machines_count
 
-    @admin.display(description="Pistolas")
+    @admin.display(description="Pistolas", ordering="nozzles_total")
     def nozzles_count(self, obj: Sucursal) -> int:
         return obj.nozzles_count
-    
-    @admin.display(description="Turnos")
+
+    @admin.display(description="Turnos", ordering="shifts_total")
     def shifts_count(self, obj: Sucursal) -> int:
         return obj.shifts_count
 
-    @admin.display(description="Inventarios de combustible")
+    @admin.display(description="Inventarios de combustible", ordering="fuel_inventories_total")
     def fuel_inventory_count(self, obj: Sucursal) -> int:
         return obj.fuel_inventories_count
 
-    @admin.display(description="Productos")
+    @admin.display(description="Productos", ordering="products_total")
     def products_count(self, obj: Sucursal) -> int:
         return obj.products_count
 
@@ -106,6 +133,7 @@ class SucursalAdmin(admin.ModelAdmin):
 class FuelInventoryAdmin(admin.ModelAdmin):
     list_display = ("code", "sucursal", "fuel_type", "capacity", "liters")
     list_filter = ("sucursal__company", "fuel_type")
+    list_select_related = ("sucursal__company",)
     search_fields = ("code", "sucursal__name", "fuel_type")
 
 
@@ -121,12 +149,14 @@ class BranchProductAdmin(admin.ModelAdmin):
         "value",
     )
     list_filter = ("sucursal__company", "arrival_date")
+    list_select_related = ("sucursal__company",)
     search_fields = ("product_type", "sucursal__name", "batch_number")
 
 @admin.register(Island)
 class IslandAdmin(admin.ModelAdmin):
     list_display = ("number", "sucursal", "description")
-    list_filter = ("sucursal",)
+    list_filter = (("sucursal", SucursalListFilter),)
+    list_select_related = ("sucursal__company",)
     search_fields = ("number", "sucursal__name")
     inlines = [MachineInline]
 
@@ -134,22 +164,75 @@ class IslandAdmin(admin.ModelAdmin):
 @admin.register(Machine)
 class MachineAdmin(admin.ModelAdmin):
     list_display = ("number", "island", "fuel_type", "numeral")
-    list_filter = ("island__sucursal", "fuel_type")
+    list_filter = (("island__sucursal", SucursalListFilter), "fuel_type")
+    list_select_related = ("island__sucursal",)
     search_fields = ("number", "island__sucursal__name")
     inlines = [NozzleInline]
 
+    def get_queryset(self, request):
+        # Numeral del primer slot del estanque principal (el FK o, si no hay,
+        # el primer estanque asociado), igual que ``Machine.numeral``.
+        linked_inventory = (
+            Machine.fuel_inventories.through.objects.filter(machine_id=OuterRef("pk"))
+            .order_by("fuelinventory_id")
+            .values("fuelinventory_id")[:1]
+        )
+        primary_numeral = (
+            MachineFuelInventoryNumeral.objects.filter(
+                machine_id=OuterRef("pk"),
+                fuel_inventory_id=OuterRef("primary_inventory_id"),
+            )
+            .order_by("slot", "pk")
+            .values("numeral")[:1]
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                primary_inventory_id=Coalesce(
+                    "fuel_inventory_id",
+                    Subquery(linked_inventory),
+                    output_field=IntegerField(),
+                )
+            )
+            .annotate(
+                primary_numeral=Coalesce(
+                    Subquery(primary_numeral),
+                    Value(0),
+                    output_field=DecimalField(max_digits=12, decimal_places=3),
+                )
+            )
+        )
+
+    @admin.display(description="Numeral", ordering="primary_numeral")
+    def numeral(self, obj: Machine):
+        return obj.primary_numeral
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.provision_numerals()
+
 
 @admin.register(Nozzle)
 class NozzleAdmin(admin.ModelAdmin):
     list_display = ("number", "machine", "fuel_numeral", "fuel_type")
-    list_filter = ("machine__island__sucursal", "fuel_type")
+    list_filter = (
+        ("machine__island__sucursal", SucursalListFilter),
+        "fuel_type",
+    )
+    list_select_related = (
+        "machine__island__sucursal",
+        "fuel_numeral__machine",
+        "fuel_numeral__fuel_inventory",
+    )
     search_fields = ("number", "machine__island__sucursal__name")
 
 
 @admin.register(Shift)
 class ShiftAdmin(admin.ModelAdmin):
     list_display = ("code", "sucursal", "description", "start_time", "end_time", "manager")
-    list_filter = ("sucursal",)
+    list_filter = (("sucursal", SucursalListFilter),)
+    list_select_related = ("sucursal__company", "manager__user_FK")
     search_fields = (
         "code",
         "description",
@@ -161,7 +244,12 @@ class ShiftAdmin(admin.ModelAdmin):
 @admin.register(ServiceSession)
 class ServiceSessionAdmin(admin.ModelAdmin):
     list_display = ("shift", "started_at", "initial_budget", "close_mode")
-    list_filter = ("shift__sucursal", "started_at", "close_mode")
+    list_filter = (
+        ("shift__sucursal", SucursalListFilter),
+        "started_at",
+        "close_mode",
+    )
+    list_select_related = ("shift__sucursal",)
     search_fields = ("shift__code", "shift__sucursal__name")
     date_hierarchy = "started_at"
     filter_horizontal = ("attendants",)
@@ -177,10 +265,11 @@ class ServiceSessionFuelLoadAdmin(admin.ModelAdmin):
         "date",
     )
     list_filter = (
-        "inventory__sucursal",
+        ("inventory__sucursal", SucursalListFilter),
         "inventory__fuel_type",
         "date",
     )
+    list_select_related = ("service_session__shift", "inventory__sucursal")
     search_fields = (
         "invoice_number",
         "driver_name",
@@ -195,10 +284,11 @@ class ServiceSessionProductLoadAdmin(admin.ModelAdmin):
         "date",
     )
     list_filter = (
-        "product__sucursal",
+        ("product__sucursal", SucursalListFilter),
         "product__product_type",
         "date",
     )
+    list_select_related = ("service_session__shift", "product__sucursal")
     search_fields = (
         "product__product_type",
         "product__batch_number",
@@ -218,9 +308,10 @@ class ServiceSessionProductSaleAdmin(admin.ModelAdmin):
         "responsible",
     )
     list_filter = (
-        "service_session__shift__sucursal",
+        ("service_session__shift__sucursal", SucursalListFilter),
         "sold_at",
     )
+    list_select_related = ("service_session__shift__sucursal", "responsible__user_FK")
     search_fields = (
         "service_session__shift__code",
         "responsible__user_FK__username",
@@ -242,10 +333,16 @@ class ServiceSessionCreditSaleAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = (
-        "service_session__shift__sucursal",
+        "status",
+        ("service_session__shift__sucursal", SucursalListFilter),
         "fuel_inventory__fuel_type",
         "created_at",
     )
+    list_select_related = (
+        "service_session__shift__sucursal",
+        "fuel_inventory__sucursal",
+        "responsible__user_FK",
+    )
     search_fields = (
         "invoice_number",
         "customer_name",
@@ -254,6 +351,26 @@ class ServiceSessionCreditSaleAdmin(admin.ModelAdmin):
     date_hierarchy = "created_at"
 
 
+@admin.register(BranchCreditBalance)
+class BranchCreditBalanceAdmin(admin.ModelAdmin):
+    list_display = (
+        "sucursal",
+        "pending_amount",
+        "pending_count",
+        "paid_amount",
+        "paid_count",
+        "updated_at",
+    )
+    list_select_related = ("sucursal__company",)
+    readonly_fields = (
+        "pending_amount",
+        "pending_count",
+        "paid_amount",
+        "paid_count",
+        "updated_at",
+    )
+
+
 @admin.register(ServiceSessionTransbankVoucher)
 class ServiceSessionTransbankVoucherAdmin(admin.ModelAdmin):
     list_display = (
@@ -262,7 +379,11 @@ class ServiceSessionTransbankVoucherAdmin(admin.ModelAdmin):
         "responsible",
         "registered_at",
     )
-    list_filter = ("service_session__shift__sucursal", "registered_at")
+    list_filter = (
+        ("service_session__shift__sucursal", SucursalListFilter),
+        "registered_at",
+    )
+    list_select_related = ("service_session__shift__sucursal", "responsible__user_FK")
     search_fields = (
         "service_session__shift__code",
         "responsible__user_FK__username",
@@ -280,11 +401,49 @@ class ServiceSessionFirefighterPaymentAdmin(admin.ModelAdmin):
         "amount",
         "registered_at",
     )
-    list_filter = ("service_session__shift__sucursal", "registered_at")
+    list_filter = (
+        ("service_session__shift__sucursal", SucursalListFilter),
+        "registered_at",
+    )
+    list_select_related = ("service_session__shift__sucursal", "firefighter__user_FK")
     search_fields = (
         "service_session__shift__code",
         "firefighter__user_FK__username",
         "firefighter__user_FK__first_name",
         "firefighter__user_FK__last_name",
     )
-    date_hierarchy = "registered_at"
\ No newline at end of file
+    date_hierarchy = "registered_at"
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "sucursal",
+        "kind",
+        "export_format",
+        "status",
+        "progress",
+        "total_rows",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "kind", "export_format")
+    list_select_related = ("sucursal__company",)
+    readonly_fields = ("cache_key", "started_at", "finished_at", "created_at")
+
+
+@admin.register(BranchDailyProfit)
+class BranchDailyProfitAdmin(admin.ModelAdmin):
+    list_display = ("sucursal", "day", "sessions_count", "net_profit", "updated_at")
+    list_filter = (("sucursal", SucursalListFilter),)
+    list_select_related = ("sucursal__company",)
+    date_hierarchy = "day"
+
+
+@admin.register(BranchDailyBreakdown)
+class BranchDailyBreakdownAdmin(admin.ModelAdmin):
+    list_display = ("sucursal", "day", "kind", "label", "amount")
+    list_filter = ("kind", ("sucursal", SucursalListFilter))
+    list_select_related = ("sucursal__company",)
+    date_hierarchy = "day"
@@ -0,0 +1,658 @@
+"""Export helpers for the closed service history of a branch."""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, Iterator
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Max, Q, QuerySet, Sum
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+
+from .models import BranchProduct, ExportJob, ServiceSession, Sucursal
+
+XLSX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.file"
+HISTORY_EXPORT_FORMATS = ("xlsx", "csv", "arrow")
+HISTORY_EXPORT_CHUNK_SIZE = 500
+HISTORY_EXPORT_HEADERS = [
+    "FECHA",
+    "TURNO",
+    "TOTAL VENTA",
+    "CRÉDITO",
+    "CANT. VOUCHERS",
+    "MONTO VOUCHERS",
+    "CANT. TIRADAS",
+    "MONTO TIRADAS",
+    "PAGOS BOMBEROS",
+    "GASTO STOCK",
+    "PAGO COMBUSTIBLE",
+    "GANANCIA TURNO",
+    "GANANCIA REAL",
+]
+SUMMARY_EXPORT_HEADERS = [
+    "FECHA",
+    "TURNO",
+    "TOTAL VENTA",
+    "CREDITO",
+    "CANT.VOUCHER",
+    "MONTO VOUCHER",
+    "CANT.TIRADA",
+    "MONTO TIRADA",
+    "PAGOS BOMBEROS",
+    "GASTO STOCK",
+    "PAGO COMBUSTIBLE",
+    "GANANCIA TURNO",
+    "GANANCIA REAL",
+]
+CONSOLIDATED_EXPORT_HEADERS = ["SUCURSAL", "SERVICIOS", *HISTORY_EXPORT_HEADERS[2:]]
+# Columnas con montos (1-indexed) a las que se aplica separador de miles.
+HISTORY_MONEY_COLUMNS = {3, 4, 6, 8, 9, 10, 11, 12, 13}
+HISTORY_COUNT_COLUMNS = {5, 7}
+
+def filter_closed_sessions(queryset: QuerySet[ServiceSession], params) -> QuerySet:
+    """Apply the history filters (``year``, ``month``, ``shift``) from ``params``."""
+
+    year = params.get("year") or ""
+    month = params.get("month") or ""
+    shift_query = params.get("shift") or ""
+
+    if year.isdigit():
+        queryset = queryset.filter(ended_at__year=int(year))
+    if month.isdigit():
+        queryset = queryset.filter(ended_at__month=int(month))
+    if shift_query:
+        queryset = queryset.filter(shift__code__icontains=shift_query)
+    return queryset
+
+
+def with_session_totals(queryset: QuerySet[ServiceSession]) -> QuerySet:
+    """Return ``queryset`` as ``values()`` rows with its financial summary."""
+
+    return queryset.with_financials().values(
+        "pk",
+        "branch_id",
+        "started_at",
+        "ended_at",
+        "initial_budget",
+        "shift__code",
+        "credit_total",
+        "voucher_count",
+        "voucher_total",
+        "withdrawal_count",
+        "withdrawal_total",
+        "firefighter_payments_total",
+        "product_load_payment_total",
+        "fuel_load_payment_total",
+        "product_sales_value",
+        "turn_profit",
+        "net_turn_profit",
+    )
+
+
+def history_sessions_queryset(branch_id: int, params) -> QuerySet[ServiceSession]:
+    """Closed sessions of the branch filtered like the history tab."""
+
+    queryset = ServiceSession.objects.filter(
+        branch_id=branch_id, ended_at__isnull=False
+    )
+    return filter_closed_sessions(queryset, params)
+
+
+def history_export_queryset(branch: Sucursal, params) -> QuerySet:
+    """Closed sessions of ``branch`` as ``values()`` rows with their totals."""
+
+    return with_session_totals(history_sessions_queryset(branch.pk, params)).order_by(
+        "-ended_at", "-pk"
+    )
+
+
+def history_row_values(
+    row: dict[str, Any], *, include_initial_budget: bool = True
+) -> list[Any]:
+    """Convert one ``with_session_totals`` row into the export columns.
+
+    The history export adds the initial budget to the turn profit while the
+    single-service summary does not; ``include_initial_budget`` keeps both.
+    """
+
+    initial_budget = Decimal("0")
+    if include_initial_budget:
+        initial_budget = row["initial_budget"] or initial_budget
+    turn_profit = row["turn_profit"] + initial_budget
+    net_turn_profit = row["net_turn_profit"] + initial_budget
+    return [
+        row["started_at"].date() if row["started_at"] else None,
+        row["shift__code"],
+        row["product_sales_value"],
+        row["credit_total"],
+        row["voucher_count"],
+        row["voucher_total"],
+        row["withdrawal_count"],
+        row["withdrawal_total"],
+        row["firefighter_payments_total"],
+        row["product_load_payment_total"],
+        row["fuel_load_payment_total"],
+        turn_profit,
+        net_turn_profit,
+    ]
+
+
+def iter_history_rows(
+    branch: Sucursal, params, chunk_size: int = HISTORY_EXPORT_CHUNK_SIZE
+) -> Iterator[list[Any]]:
+    """Yield export rows reading the sessions in chunks from a server-side cursor."""
+
+    for row in history_export_queryset(branch, params).iterator(chunk_size=chunk_size):
+        yield history_row_values(row)
+
+
+def iter_summary_rows(branch_id: int, session_id: int) -> Iterator[list[Any]]:
+    """Yield the single summary row of a service session of the branch."""
+
+    queryset = ServiceSession.objects.filter(pk=session_id, branch_id=branch_id)
+    for row in with_session_totals(queryset):
+        yield history_row_values(row, include_initial_budget=False)
+
+
+def _prepare_sheet(worksheet, headers: list[str]) -> None:
+    """Set the column widths and append the bold header row of ``worksheet``."""
+
+    for col_idx, header in enumerate(headers, start=1):
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = max(
+            len(header) + 2, 14
+        )
+
+    header_font = Font(bold=True)
+    header_alignment = Alignment(horizontal="center")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(worksheet, value=header)
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+
+
+def _append_row(worksheet, values: list[Any]) -> None:
+    cells = []
+    for col_idx, value in enumerate(values, start=1):
+        if isinstance(value, Decimal):
+            value = float(value)
+        cell = WriteOnlyCell(worksheet, value=value)
+        if col_idx in HISTORY_MONEY_COLUMNS:
+            cell.number_format = "#,##0"
+        cells.append(cell)
+    worksheet.append(cells)
+
+
+def write_history_xlsx(
+    rows: Iterable[list[Any]],
+    target,
+    *,
+    title: str = "Historial servicios",
+    headers: list[str] = HISTORY_EXPORT_HEADERS,
+) -> None:
+    """Write ``rows`` into ``target`` using openpyxl's write-only mode.
+
+    Write-only worksheets flush every appended row to a temporary file, so the
+    memory used does not depend on the number of sessions exported.
+    """
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=title)
+    _prepare_sheet(worksheet, headers)
+    for values in rows:
+        _append_row(worksheet, values)
+    workbook.save(target)
+
+
+def company_sessions_queryset(branch_ids: Iterable[int], params) -> QuerySet:
+    queryset = ServiceSession.objects.filter(
+        branch_id__in=list(branch_ids), ended_at__isnull=False
+    )
+    return filter_closed_sessions(queryset, params)
+
+
+def company_history_queryset(branch_ids: Iterable[int], params) -> QuerySet:
+    """Closed sessions of every branch in ``branch_ids`` with their totals.
+
+    A single query covers all branches; rows come grouped by branch.
+    """
+
+    return with_session_totals(company_sessions_queryset(branch_ids, params)).order_by(
+        "branch_id", "-ended_at", "-pk"
+    )
+
+
+# Columnas del consolidado (desde "TOTAL VENTA") y el total que las alimenta.
+CONSOLIDATED_TOTALS = (
+    "product_sales_value",
+    "credit_total",
+    "voucher_count",
+    "voucher_total",
+    "withdrawal_count",
+    "withdrawal_total",
+    "firefighter_payments_total",
+    "product_load_payment_total",
+    "fuel_load_payment_total",
+    "turn_profit",
+    "net_turn_profit",
+)
+
+
+def company_history_totals(branch_ids: Iterable[int], params) -> dict[int, list[Any]]:
+    """Consolidated sheet values of each branch, grouped by the database.
+
+    Returns ``{branch_id: [sessions, *CONSOLIDATED_TOTALS]}``. Like the history
+    rows, both profits include the initial budget of the sessions.
+    """
+
+    rows = (
+        company_sessions_queryset(branch_ids, params)
+        .with_financials()
+        .order_by()
+        .values("branch_id")
+        .annotate(
+            sessions=Count("pk"),
+            initial_budget_total=Sum("initial_budget"),
+            **{f"sum_{name}": Sum(name) for name in CONSOLIDATED_TOTALS},
+        )
+    )
+    totals = {}
+    for row in rows:
+        initial_budget = row["initial_budget_total"] or Decimal("0")
+        values = [row[f"sum_{name}"] or 0 for name in CONSOLIDATED_TOTALS]
+        values[-2] += initial_budget
+        values[-1] += initial_budget
+        totals[row["branch_id"]] = [row["sessions"], *values]
+    return totals
+
+
+def _sheet_title(name: str, used: set[str]) -> str:
+    """Return a unique Excel-safe sheet title (max. 31 characters)."""
+
+    base = "".join("-" if char in '[]:*?/\\' else char for char in name).strip()
+    base = (base or "Sucursal")[:31]
+    title, suffix = base, 2
+    while title.lower() in used:
+        marker = f" ({suffix})"
+        title = f"{base[: 31 - len(marker)]}{marker}"
+        suffix += 1
+    used.add(title.lower())
+    return title
+
+
+def write_company_history_xlsx(
+    branches: list[Sucursal],
+    rows: Iterable[dict[str, Any]],
+    totals: dict[int, list[Any]],
+    target,
+) -> None:
+    """Write one sheet per branch plus a leading consolidated sheet.
+
+    ``rows`` are ``company_history_queryset`` rows and ``totals`` the
+    ``company_history_totals`` of the same branches and filters.
+    """
+
+    workbook = Workbook(write_only=True)
+    summary_sheet = workbook.create_sheet(title="Consolidado")
+    _prepare_sheet(summary_sheet, CONSOLIDATED_EXPORT_HEADERS)
+
+    used_titles = {"consolidado"}
+    branch_sheets = {}
+    for branch in branches:
+        worksheet = workbook.create_sheet(title=_sheet_title(branch.name, used_titles))
+        _prepare_sheet(worksheet, HISTORY_EXPORT_HEADERS)
+        branch_sheets[branch.pk] = worksheet
+
+    for row in rows:
+        worksheet = branch_sheets.get(row["branch_id"])
+        if worksheet is not None:
+            _append_row(worksheet, history_row_values(row))
+
+    empty = [0] + [Decimal("0")] * len(CONSOLIDATED_TOTALS)
+    grand_total = list(empty)
+    for branch in branches:
+        branch_totals = totals.get(branch.pk, empty)
+        _append_row(summary_sheet, [branch.name, *branch_totals])
+        grand_total = [total + value for total, value in zip(grand_total, branch_totals)]
+    _append_row(summary_sheet, ["TOTAL", *grand_total])
+
+    workbook.save(target)
+
+
+class _EchoBuffer:
+    """File-like object whose ``write`` returns the value, for ``csv.writer``."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_history_csv(
+    rows: Iterable[list[Any]], *, headers: list[str] = HISTORY_EXPORT_HEADERS
+) -> Iterator[str]:
+    """Yield the CSV export line by line for a ``StreamingHttpResponse``.
+
+    A UTF-8 BOM is emitted first so spreadsheet tools detect the accents.
+    """
+
+    writer = csv.writer(_EchoBuffer())
+    yield "\ufeff"
+    yield writer.writerow(headers)
+    for values in rows:
+        yield writer.writerow(
+            [value.isoformat() if isinstance(value, date) else value for value in values]
+        )
+
+
+def arrow_export_available() -> bool:
+    """Return whether ``pyarrow`` is installed and Arrow exports can be built."""
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_history_arrow(
+    rows: Iterable[list[Any]],
+    target,
+    *,
+    headers: list[str] = HISTORY_EXPORT_HEADERS,
+    batch_size: int = HISTORY_EXPORT_CHUNK_SIZE,
+) -> None:
+    """Write ``rows`` as a zstd-compressed Arrow IPC file.
+
+    Rows are buffered into record batches of ``batch_size`` so only one batch is
+    held in memory. The file can be read by pandas/polars/DuckDB and converted
+    to Parquet without loss of types.
+    """
+
+    import pyarrow as pa
+    from pyarrow import ipc
+
+    fields = []
+    for col_idx, header in enumerate(headers, start=1):
+        if col_idx == 1:
+            field_type = pa.date32()
+        elif col_idx in HISTORY_MONEY_COLUMNS:
+            field_type = pa.decimal128(14, 2)
+        elif col_idx in HISTORY_COUNT_COLUMNS:
+            field_type = pa.int64()
+        else:
+            field_type = pa.string()
+        fields.append(pa.field(header, field_type))
+    schema = pa.schema(fields)
+
+    options = ipc.IpcWriteOptions(compression="zstd")
+    with ipc.new_file(target, schema, options=options) as writer:
+        columns: list[list[Any]] = [[] for _ in fields]
+
+        def flush() -> None:
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            for column in columns:
+                column.clear()
+
+        for values in rows:
+            for column, value in zip(columns, values):
+                column.append(value)
+            if len(columns[0]) >= batch_size:
+                flush()
+        if columns[0]:
+            flush()
+
+
+# --- Background export jobs -------------------------------------------------
+
+EXPORT_JOB_PARAMS = {
+    ExportJob.KIND_HISTORY: ("year", "month", "shift"),
+    ExportJob.KIND_SUMMARY: ("session",),
+}
+EXPORT_JOB_PROGRESS_STEP = HISTORY_EXPORT_CHUNK_SIZE
+
+
+def normalize_export_params(kind: str, params) -> dict[str, str]:
+    """Keep only the filters that affect an export of ``kind``."""
+
+    return {
+        key: str(params.get(key) or "").strip()
+        for key in EXPORT_JOB_PARAMS[kind]
+        if str(params.get(key) or "").strip()
+    }
+
+
+def export_sessions_queryset(
+    kind: str, branch_id: int, params: dict[str, str]
+) -> QuerySet[ServiceSession]:
+    if kind == ExportJob.KIND_SUMMARY:
+        session_id = params.get("session") or ""
+        return ServiceSession.objects.filter(
+            pk=int(session_id) if session_id.isdigit() else None,
+            branch_id=branch_id,
+        )
+    return history_sessions_queryset(branch_id, params)
+
+
+def export_data_version(queryset: QuerySet[ServiceSession], branch_id: int) -> str:
+    """Fingerprint the sessions covered by an export.
+
+    Records bump ``ServiceSession.updated_at`` when they change. The rows also
+    show the shift code and price product sales with ``BranchProduct.value``,
+    so the latest change of the shifts and of the branch products counts too.
+    """
+
+    stats = queryset.order_by().aggregate(
+        count=Count("pk"), last=Max("updated_at"), shifts=Max("shift__updated_at")
+    )
+    products = BranchProduct.objects.filter(sucursal_id=branch_id).aggregate(
+        count=Count("pk"), last=Max("updated_at")
+    )
+    parts = [
+        stats["count"],
+        stats["last"],
+        stats["shifts"],
+        products["count"],
+        products["last"],
+    ]
+    return ":".join(
+        value.isoformat() if hasattr(value, "isoformat") else str(value)
+        for value in parts
+    )
+
+
+def export_cache_key(
+    kind: str,
+    branch_id: int,
+    params: dict[str, str],
+    export_format: str,
+    data_version: str,
+) -> str:
+    payload = json.dumps(
+        [kind, branch_id, params, export_format, data_version], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_export_job(
+    branch: Sucursal, kind: str, export_format: str, params, profile=None
+) -> ExportJob:
+    """Return a job for the export, reusing a cached or in-flight one.
+
+    A finished job with the same cache key is returned as is, so repeated
+    exports of data that did not change are served from disk at once.
+    """
+
+    params = normalize_export_params(kind, params)
+    version = export_data_version(
+        export_sessions_queryset(kind, branch.pk, params), branch.pk
+    )
+    cache_key = export_cache_key(kind, branch.pk, params, export_format, version)
+
+    candidates = ExportJob.objects.filter(
+        cache_key=cache_key,
+        status__in=[
+            ExportJob.Status.PENDING,
+            ExportJob.Status.RUNNING,
+            ExportJob.Status.DONE,
+        ],
+    ).exclude(stale_export_jobs())
+    for job in candidates:
+        if job.status != ExportJob.Status.DONE or job.has_artifact:
+            return job
+
+    return ExportJob.objects.create(
+        sucursal=branch,
+        requested_by=profile,
+        kind=kind,
+        export_format=export_format,
+        params=params,
+        cache_key=cache_key,
+    )
+
+
+def stale_export_jobs() -> Q:
+    """Running jobs started more than ``EXPORT_JOB_TIMEOUT`` seconds ago."""
+
+    cutoff = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    return Q(status=ExportJob.Status.RUNNING, started_at__lt=cutoff)
+
+
+def fail_stale_export_jobs() -> int:
+    """Mark the jobs of crashed workers as failed so they stop being polled."""
+
+    return ExportJob.objects.filter(stale_export_jobs()).update(
+        status=ExportJob.Status.FAILED,
+        error="La exportación superó el tiempo máximo de proceso.",
+        finished_at=timezone.now(),
+    )
+
+
+def claim_next_export_job() -> ExportJob | None:
+    """Mark the oldest pending job as running and return it.
+
+    The conditional update makes it safe to run several workers at once.
+    Jobs left running by a crashed worker are failed first.
+    """
+
+    fail_stale_export_jobs()
+    pending = ExportJob.objects.filter(status=ExportJob.Status.PENDING).order_by(
+        "created_at", "pk"
+    )
+    for job_id in pending.values_list("pk", flat=True)[:10]:
+        claimed = ExportJob.objects.filter(
+            pk=job_id, status=ExportJob.Status.PENDING
+        ).update(status=ExportJob.Status.RUNNING, started_at=timezone.now())
+        if claimed:
+            return ExportJob.objects.select_related("sucursal").get(pk=job_id)
+    return None
+
+
+def export_job_filename(job: ExportJob) -> str:
+    if job.kind == ExportJob.KIND_SUMMARY:
+        session = (
+            ServiceSession.objects.filter(pk=job.params.get("session"))
+            .values_list("shift__code", flat=True)
+            .first()
+        )
+        base = f"resumen_turno_{session or ''}_{job.params.get('session', '')}"
+    else:
+        base = f"historial_servicios_{job.sucursal.name}_{job.sucursal_id}"
+    return f"{base}.{job.export_format}"
+
+
+def discard_superseded_exports(job: ExportJob) -> int:
+    """Delete the files of older versions of the same export as ``job``.
+
+    A new data version gives a new ``cache_key``; the previous files can no
+    longer be requested and would otherwise stay on disk forever.
+    """
+
+    superseded = (
+        ExportJob.objects.filter(
+            sucursal_id=job.sucursal_id,
+            kind=job.kind,
+            export_format=job.export_format,
+            params=job.params,
+        )
+        .exclude(cache_key=job.cache_key)
+        .exclude(file="")
+    )
+    discarded = 0
+    for previous in superseded:
+        previous.file.delete(save=False)
+        ExportJob.objects.filter(pk=previous.pk).update(file="")
+        discarded += 1
+    return discarded
+
+
+def _track_progress(
+    job: ExportJob, rows: Iterable[list[Any]], total: int
+) -> Iterator[list[Any]]:
+    processed = 0
+    for values in rows:
+        yield values
+        processed += 1
+        if processed % EXPORT_JOB_PROGRESS_STEP == 0 and total:
+            ExportJob.objects.filter(pk=job.pk).update(
+                progress=min(99, processed * 100 // total)
+            )
+
+
+def run_export_job(job: ExportJob) -> ExportJob:
+    """Generate the artifact of ``job`` and store it in its ``file`` field."""
+
+    try:
+        params = job.params or {}
+        if job.kind == ExportJob.KIND_SUMMARY:
+            session_id = str(params.get("session") or "")
+            rows = iter_summary_rows(
+                job.sucursal_id, int(session_id) if session_id.isdigit() else 0
+            )
+            headers, title = SUMMARY_EXPORT_HEADERS, "Resumen Turno"
+            total = 1
+        else:
+            rows = iter_history_rows(job.sucursal, params)
+            headers, title = HISTORY_EXPORT_HEADERS, "Historial servicios"
+            total = history_sessions_queryset(job.sucursal_id, params).count()
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=total)
+        rows = _track_progress(job, rows, total)
+
+        with tempfile.TemporaryFile() as output:
+            if job.export_format == "csv":
+                for chunk in stream_history_csv(rows, headers=headers):
+                    output.write(chunk.encode("utf-8"))
+            elif job.export_format == "arrow":
+                write_history_arrow(rows, output, headers=headers)
+            else:
+                write_history_xlsx(rows, output, title=title, headers=headers)
+            output.seek(0)
+            job.file.save(export_job_filename(job), File(output), save=False)
+
+        job.status = ExportJob.Status.DONE
+        job.progress = 100
+        job.total_rows = total
+        job.error = ""
+    except Exception as exc:  # noqa: BLE001 - el error queda registrado en el trabajo
+        job.status = ExportJob.Status.FAILED
+        job.error = str(exc) or exc.__class__.__name__
+    job.finished_at = timezone.now()
+    job.save(
+        update_fields=["file", "status", "progress", "total_rows", "error", "finished_at"]
+    )
+    if job.status == ExportJob.Status.DONE:
+        discard_superseded_exports(job)
+    return job
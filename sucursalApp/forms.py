@@ -10,7 +10,7 @@ from django.core.exceptions import ValidationError
 from django.forms import BaseFormSet, formset_factory
 from django.forms.boundfield import BoundField
 from django.db import transaction
-from django.db.models import F, Q, Count
+from django.db.models import F, Q, Count, prefetch_related_objects
 
 from UsuarioApp.models import Profile
 
@@ -411,6 +411,9 @@ class MachineForm(forms.ModelForm):
                 queryset = queryset.filter(sucursal=self._form_island.sucursal)
             fuel_field.queryset = queryset.order_by("code")
             fuel_field.required = False
+            if self.instance and self.instance.pk:
+                # Un solo query para los numerales de todos los estanques.
+                prefetch_related_objects([self.instance], "fuel_numerals")
 
             for inventory in fuel_field.queryset:
                 existing_numerals: list[MachineFuelInventoryNumeral] = []
@@ -537,6 +540,8 @@ class MachineForm(forms.ModelForm):
         MachineFuelInventoryNumeral.objects.filter(machine=machine).exclude(
             fuel_inventory__in=selected_inventories
         ).delete()
+        # Los numerales precargados en ``__init__`` ya no están vigentes.
+        getattr(machine, "_prefetched_objects_cache", {}).pop("fuel_numerals", None)
     class Meta:
         model = Machine
         fields = [
@@ -859,7 +864,7 @@ class ServiceSessionForm(forms.ModelForm):
         shift = cleaned_data.get("shift")
 
         if shift and ServiceSession.objects.filter(
-            shift__sucursal=shift.sucursal, ended_at__isnull=True
+            branch_id=shift.sucursal_id, ended_at__isnull=True
         ).exists():
             self.add_error(
                 "shift",
@@ -1265,7 +1270,7 @@ class ServiceSessionProductSaleItemForm(forms.ModelForm):
                 "La cantidad solicitada supera el stock disponible en la sucursal.",
             )
 
-        if product.sucursal_id != self.service_session.shift.sucursal_id:
+        if product.sucursal_id != self.service_session.branch_id:
             raise forms.ValidationError(
                 "El producto seleccionado no pertenece a la sucursal del servicio.",
             )
@@ -1397,7 +1402,7 @@ class ServiceSessionCreditSaleForm(forms.ModelForm):
         fuel_inventory = self.cleaned_data.get("fuel_inventory")
         if not fuel_inventory:
             return fuel_inventory
-        if fuel_inventory.sucursal_id != self.service_session.shift.sucursal_id:
+        if fuel_inventory.sucursal_id != self.service_session.branch_id:
             raise forms.ValidationError(
                 "El estanque seleccionado no pertenece a la sucursal del servicio.",
             )
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from iotApp.models import DispenseEvent
+from sucursalApp.models import (
+    Nozzle,
+    ServiceSession,
+    ServiceSessionCreditSale,
+    ServiceSessionFirefighterPayment,
+    ServiceSessionFuelLoad,
+    ServiceSessionFuelSale,
+    ServiceSessionProductLoad,
+    ServiceSessionProductSale,
+    ServiceSessionTransbankVoucher,
+    ServiceSessionWithdrawal,
+    Shift,
+)
+
+SESSION_RECORDS = (
+    ServiceSessionFuelSale,
+    ServiceSessionWithdrawal,
+    ServiceSessionTransbankVoucher,
+    ServiceSessionFirefighterPayment,
+    ServiceSessionFuelLoad,
+    ServiceSessionProductLoad,
+    ServiceSessionCreditSale,
+    ServiceSessionProductSale,
+    DispenseEvent,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa la sucursal de los servicios, sus registros y los eventos IoT "
+        "guardados sin pasar por save() (bulk_create, update, SQL directo)."
+    )
+
+    def handle(self, *args, **options):
+        updated = ServiceSession.objects.filter(branch__isnull=True).update(
+            branch_id=Subquery(
+                Shift.objects.filter(pk=OuterRef("shift_id")).values("sucursal_id")[:1]
+            )
+        )
+        session_branch = Subquery(
+            ServiceSession.objects.filter(pk=OuterRef("service_session_id")).values(
+                "branch_id"
+            )[:1]
+        )
+        for model in SESSION_RECORDS:
+            updated += model.objects.filter(
+                branch__isnull=True, service_session__isnull=False
+            ).update(branch_id=session_branch)
+        updated += DispenseEvent.objects.filter(
+            branch__isnull=True, nozzle__isnull=False
+        ).update(
+            branch_id=Subquery(
+                Nozzle.objects.filter(pk=OuterRef("nozzle_id")).values(
+                    "machine__island__sucursal_id"
+                )[:1]
+            )
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} registros actualizados."))
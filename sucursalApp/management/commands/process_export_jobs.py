@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sucursalApp.exports import claim_next_export_job, run_export_job
+from sucursalApp.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = "Procesa las exportaciones pendientes (historial y resúmenes de servicio)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Segundos de espera cuando no hay trabajos pendientes.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_export_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            job = run_export_job(job)
+            if job.status == ExportJob.Status.DONE:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Exportación #{job.pk} lista ({job.total_rows} filas).")
+                )
+            else:
+                self.stderr.write(f"Exportación #{job.pk} falló: {job.error}")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import TruncDate
+
+from sucursalApp.models import BranchDailyProfit, ServiceSession
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes diarios de ganancia por sucursal."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--branch",
+            type=int,
+            help="Solo recalcula la sucursal indicada (id).",
+        )
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Solo crea los días que aún no tienen resumen.",
+        )
+
+    def handle(self, *args, **options):
+        sessions = ServiceSession.objects.filter(ended_at__isnull=False)
+        if options["branch"]:
+            sessions = sessions.filter(branch_id=options["branch"])
+        pairs = set(
+            sessions.annotate(day=TruncDate("ended_at"))
+            .values_list("branch_id", "day")
+            .order_by()
+            .distinct()
+        )
+        if options["missing"]:
+            pairs -= set(BranchDailyProfit.objects.values_list("sucursal_id", "day"))
+
+        for sucursal_id, day in sorted(pairs):
+            BranchDailyProfit.refresh(sucursal_id, day)
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(pairs)} resúmenes diarios recalculados.")
+        )
@@ -0,0 +1,37 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from sucursalApp.models import Shift, sync_attendant_staff
+
+
+class Command(BaseCommand):
+    help = "Sincroniza el personal de cada sucursal con los bomberos de sus turnos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--branch",
+            type=int,
+            action="append",
+            help="ID de la sucursal a sincronizar (se puede repetir). Por defecto, todas.",
+        )
+
+    def handle(self, *args, **options):
+        links = Shift.attendants.through.objects.values_list(
+            "shift__sucursal_id", "profile_id"
+        )
+        if options["branch"]:
+            links = links.filter(shift__sucursal_id__in=options["branch"])
+
+        attendants_by_branch = defaultdict(set)
+        for branch_id, profile_id in links.iterator():
+            attendants_by_branch[branch_id].add(profile_id)
+
+        for branch_id, profile_ids in attendants_by_branch.items():
+            sync_attendant_staff(branch_id, profile_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Personal sincronizado en {len(attendants_by_branch)} sucursales."
+            )
+        )
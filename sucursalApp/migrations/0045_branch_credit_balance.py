@@ -0,0 +1,114 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_branch_credit_balances(apps, schema_editor):
+    """Compute the initial pending/paid balances from the existing credit sales."""
+
+    CreditSale = apps.get_model("sucursalApp", "ServiceSessionCreditSale")
+    BranchCreditBalance = apps.get_model("sucursalApp", "BranchCreditBalance")
+
+    balances = {}
+    rows = (
+        CreditSale.objects.values("service_session__shift__sucursal_id", "status")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        sucursal_id = row["service_session__shift__sucursal_id"]
+        balance = balances.setdefault(
+            sucursal_id, BranchCreditBalance(sucursal_id=sucursal_id)
+        )
+        prefix = "paid" if row["status"] == "PAID" else "pending"
+        setattr(balance, f"{prefix}_amount", row["total"] or 0)
+        setattr(balance, f"{prefix}_count", row["count"])
+    BranchCreditBalance.objects.bulk_create(balances.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("UsuarioApp", "0006_profile_blocked"),
+        ("sucursalApp", "0044_alter_nozzle_fuel_numeral_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BranchCreditBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "pending_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Monto pendiente",
+                    ),
+                ),
+                (
+                    "pending_count",
+                    models.IntegerField(default=0, verbose_name="Créditos pendientes"),
+                ),
+                (
+                    "paid_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Monto pagado",
+                    ),
+                ),
+                (
+                    "paid_count",
+                    models.IntegerField(default=0, verbose_name="Créditos pagados"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Fecha de actualización"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Saldo de créditos",
+                "verbose_name_plural": "Saldos de créditos",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="servicesessioncreditsale",
+            index=models.Index(
+                fields=["status", "created_at"], name="credit_sale_status_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessioncreditsale",
+            index=models.Index(
+                fields=["created_at", "id"], name="credit_sale_created_id"
+            ),
+        ),
+        migrations.AddField(
+            model_name="branchcreditbalance",
+            name="sucursal",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="credit_balance",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.RunPython(
+            backfill_branch_credit_balances, migrations.RunPython.noop
+        ),
+    ]
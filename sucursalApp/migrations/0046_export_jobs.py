@@ -0,0 +1,143 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("UsuarioApp", "0006_profile_blocked"),
+        ("sucursalApp", "0045_branch_credit_balance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicesession",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Fecha de actualización"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("history", "Historial de servicios"),
+                            ("summary", "Resumen de servicio"),
+                        ],
+                        max_length=20,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                (
+                    "export_format",
+                    models.CharField(
+                        default="xlsx", max_length=10, verbose_name="Formato"
+                    ),
+                ),
+                (
+                    "params",
+                    models.JSONField(blank=True, default=dict, verbose_name="Filtros"),
+                ),
+                (
+                    "cache_key",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="Clave de caché"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pendiente"),
+                            ("RUNNING", "En proceso"),
+                            ("DONE", "Completada"),
+                            ("FAILED", "Fallida"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                        verbose_name="Estado",
+                    ),
+                ),
+                (
+                    "progress",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Progreso (%)"
+                    ),
+                ),
+                (
+                    "total_rows",
+                    models.PositiveIntegerField(default=0, verbose_name="Filas"),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True, upload_to="exports/%Y/%m/", verbose_name="Archivo"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Fecha de creación"
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Fecha de inicio"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Fecha de término"
+                    ),
+                ),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="export_jobs",
+                        to="UsuarioApp.profile",
+                        verbose_name="Solicitado por",
+                    ),
+                ),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="export_jobs",
+                        to="sucursalApp.sucursal",
+                        verbose_name="Sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Exportación",
+                "verbose_name_plural": "Exportaciones",
+                "ordering": ("-created_at", "-pk"),
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="export_job_status_created",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0046_export_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BranchDailyProfit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="Día")),
+                (
+                    "sessions_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Servicios cerrados"
+                    ),
+                ),
+                (
+                    "credit_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Créditos",
+                    ),
+                ),
+                (
+                    "voucher_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Vouchers",
+                    ),
+                ),
+                (
+                    "withdrawal_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Tiradas",
+                    ),
+                ),
+                (
+                    "product_sales_value",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Venta de productos",
+                    ),
+                ),
+                (
+                    "fuel_load_payment_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pagos de combustible",
+                    ),
+                ),
+                (
+                    "firefighter_payments_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pagos a bomberos",
+                    ),
+                ),
+                (
+                    "product_load_payment_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pagos de productos",
+                    ),
+                ),
+                (
+                    "fuel_liters",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Litros vendidos por tipo de combustible.",
+                        verbose_name="Litros por combustible",
+                    ),
+                ),
+                (
+                    "product_sales",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Valor vendido por tipo de producto.",
+                        verbose_name="Ventas por producto",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Fecha de actualización"
+                    ),
+                ),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_profits",
+                        to="sucursalApp.sucursal",
+                        verbose_name="Sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumen diario de sucursal",
+                "verbose_name_plural": "Resúmenes diarios de sucursal",
+                "ordering": ("sucursal", "day"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sucursal", "day"),
+                        name="unique_daily_profit_per_branch_day",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_breakdowns_from_json(apps, schema_editor):
+    """Move the JSON fuel/product breakdowns of each rollup into rows."""
+
+    BranchDailyProfit = apps.get_model("sucursalApp", "BranchDailyProfit")
+    BranchDailyBreakdown = apps.get_model("sucursalApp", "BranchDailyBreakdown")
+
+    rows = []
+    for rollup in BranchDailyProfit.objects.iterator():
+        for kind, values in (
+            ("fuel", rollup.fuel_liters or {}),
+            ("product", rollup.product_sales or {}),
+        ):
+            rows.extend(
+                BranchDailyBreakdown(
+                    sucursal_id=rollup.sucursal_id,
+                    day=rollup.day,
+                    kind=kind,
+                    label=label,
+                    amount=amount,
+                )
+                for label, amount in values.items()
+            )
+    BranchDailyBreakdown.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0047_branch_daily_profit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BranchDailyBreakdown",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="Día")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("fuel", "Litros por combustible"),
+                            ("product", "Venta por producto"),
+                        ],
+                        max_length=10,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                ("label", models.CharField(max_length=100, verbose_name="Detalle")),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Cantidad",
+                    ),
+                ),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_breakdowns",
+                        to="sucursalApp.sucursal",
+                        verbose_name="Sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Detalle diario de sucursal",
+                "verbose_name_plural": "Detalles diarios de sucursal",
+                "ordering": ("sucursal", "day", "kind", "label"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sucursal", "day", "kind", "label"),
+                        name="unique_daily_breakdown_per_branch_day",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            copy_breakdowns_from_json, migrations.RunPython.noop
+        ),
+        migrations.RemoveField(
+            model_name="branchdailyprofit",
+            name="fuel_liters",
+        ),
+        migrations.RemoveField(
+            model_name="branchdailyprofit",
+            name="product_sales",
+        ),
+    ]
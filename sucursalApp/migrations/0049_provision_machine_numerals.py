@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def provision_machine_numerals(apps, schema_editor):
+    """Create the slot-1 numerals that used to be created lazily on read."""
+
+    Machine = apps.get_model("sucursalApp", "Machine")
+    Numeral = apps.get_model("sucursalApp", "MachineFuelInventoryNumeral")
+
+    existing = set(Numeral.objects.values_list("machine_id", "fuel_inventory_id"))
+    pairs = set(
+        Machine.objects.exclude(fuel_inventory__isnull=True).values_list(
+            "pk", "fuel_inventory_id"
+        )
+    )
+    pairs |= set(
+        Machine.fuel_inventories.through.objects.values_list(
+            "machine_id", "fuelinventory_id"
+        )
+    )
+    Numeral.objects.bulk_create(
+        [
+            Numeral(
+                machine_id=machine_id,
+                fuel_inventory_id=inventory_id,
+                slot=1,
+                numeral=Decimal("0"),
+            )
+            for machine_id, inventory_id in sorted(pairs - existing)
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0048_branch_daily_breakdown"),
+    ]
+
+    operations = [
+        migrations.RunPython(provision_machine_numerals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,197 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("UsuarioApp", "0008_user_search_trigram_indexes"),
+        ("sucursalApp", "0049_provision_machine_numerals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicesession",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="service_sessions",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessioncreditsale",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionfirefighterpayment",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionfuelload",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionfuelsale",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionproductload",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionproductsale",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessiontransbankvoucher",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicesessionwithdrawal",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="sucursalApp.sucursal",
+                verbose_name="Sucursal",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesession",
+            index=models.Index(
+                fields=["branch", "ended_at"], name="session_branch_ended"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesession",
+            index=models.Index(
+                fields=["branch", "started_at"], name="session_branch_started"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessioncreditsale",
+            index=models.Index(
+                fields=["branch", "created_at", "id"], name="credit_sale_branch_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessioncreditsale",
+            index=models.Index(
+                fields=["branch", "status", "created_at"],
+                name="credit_sale_branch_status",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionfirefighterpayment",
+            index=models.Index(
+                fields=["branch", "registered_at"], name="ff_payment_branch_registered"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionfuelload",
+            index=models.Index(fields=["branch", "date"], name="fuel_load_branch_date"),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionfuelsale",
+            index=models.Index(
+                fields=["branch", "created_at"], name="fuel_sale_branch_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionproductload",
+            index=models.Index(
+                fields=["branch", "date"], name="product_load_branch_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionproductsale",
+            index=models.Index(
+                fields=["branch", "sold_at"], name="product_sale_branch_sold"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessiontransbankvoucher",
+            index=models.Index(
+                fields=["branch", "registered_at"], name="voucher_branch_registered"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicesessionwithdrawal",
+            index=models.Index(
+                fields=["branch", "registered_at"], name="withdrawal_branch_registered"
+            ),
+        ),
+    ]
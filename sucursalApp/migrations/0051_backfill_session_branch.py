@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+SESSION_RECORDS = (
+    "ServiceSessionFuelSale",
+    "ServiceSessionWithdrawal",
+    "ServiceSessionTransbankVoucher",
+    "ServiceSessionFirefighterPayment",
+    "ServiceSessionFuelLoad",
+    "ServiceSessionProductLoad",
+    "ServiceSessionCreditSale",
+    "ServiceSessionProductSale",
+)
+
+
+def backfill_session_branch(apps, schema_editor):
+    """Copy ``shift.sucursal`` onto the services and their records."""
+
+    Shift = apps.get_model("sucursalApp", "Shift")
+    ServiceSession = apps.get_model("sucursalApp", "ServiceSession")
+
+    ServiceSession.objects.filter(branch__isnull=True).update(
+        branch_id=Subquery(
+            Shift.objects.filter(pk=OuterRef("shift_id")).values("sucursal_id")[:1]
+        )
+    )
+    session_branch = Subquery(
+        ServiceSession.objects.filter(pk=OuterRef("service_session_id")).values(
+            "branch_id"
+        )[:1]
+    )
+    for name in SESSION_RECORDS:
+        apps.get_model("sucursalApp", name).objects.filter(branch__isnull=True).update(
+            branch_id=session_branch
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0050_session_branch"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_session_branch, migrations.RunPython.noop),
+    ]
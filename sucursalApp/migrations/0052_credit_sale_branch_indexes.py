@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0051_backfill_session_branch"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="servicesessioncreditsale",
+            name="credit_sale_status_created",
+        ),
+        migrations.RemoveIndex(
+            model_name="servicesessioncreditsale",
+            name="credit_sale_created_id",
+        ),
+        migrations.RemoveIndex(
+            model_name="servicesessioncreditsale",
+            name="credit_sale_branch_status",
+        ),
+        migrations.AddIndex(
+            model_name="servicesessioncreditsale",
+            index=models.Index(
+                fields=["branch", "status", "created_at", "id"],
+                name="credit_sale_branch_status",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:47
+
+import core.storage
+import sucursalApp.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def remove_public_export_files(apps, schema_editor):
+    """Delete the export files written under MEDIA_ROOT by earlier versions.
+
+    Their jobs lose the artifact and are generated again, in the private
+    storage, the next time the same export is requested.
+    """
+
+    ExportJob = apps.get_model("sucursalApp", "ExportJob")
+    for name in ExportJob.objects.exclude(file="").values_list("file", flat=True):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+    ExportJob.objects.exclude(file="").update(file="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0052_credit_sale_branch_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_public_export_files, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="exportjob",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                storage=core.storage.PrivateExportStorage(),
+                upload_to=sucursalApp.models.export_job_upload_to,
+                verbose_name="Archivo",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sucursalApp", "0053_private_export_files"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="branchdailybreakdown",
+            name="label",
+            field=models.CharField(max_length=150, verbose_name="Detalle"),
+        ),
+    ]
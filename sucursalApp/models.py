@@ -1,17 +1,62 @@
 from __future__ import annotations
+import os
+import uuid
 from decimal import Decimal
 from typing import Iterable, Sequence
 
 
-from django.db import models
-from django.db.models import QuerySet
-from django.db.models.signals import m2m_changed
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
+from django.utils import timezone
 
 from UsuarioApp.choices import PERMISOS
+from core.commit import add_to_commit_batch, pending_commit_keys
+from core.storage import PrivateExportStorage
 from django.db.models.signals import m2m_changed
 from django.dispatch import receiver
 
+class SucursalQuerySet(models.QuerySet):
+    def with_counts(self) -> "SucursalQuerySet":
+        """Annotate the size of every branch's topology and catalogues.
+
+        Each ``<name>_total`` is a correlated ``COUNT`` subquery, so listing
+        branches never materialises the island -> machine -> nozzle tree.
+        The ``<name>_count`` properties read these annotations when present.
+        """
+
+        return self.annotate(
+            islands_total=_session_count(Island, "sucursal"),
+            machines_total=_session_count(Machine, "island__sucursal"),
+            nozzles_total=_session_count(Nozzle, "machine__island__sucursal"),
+            shifts_total=_session_count(Shift, "sucursal"),
+            fuel_inventories_total=_session_count(FuelInventory, "sucursal"),
+            products_total=_session_count(BranchProduct, "sucursal"),
+        )
+
+
 class Sucursal(models.Model):
     """Representa una sucursal perteneciente a una empresa."""
 
@@ -32,6 +77,8 @@ class Sucursal(models.Model):
     created_at = models.DateTimeField("Fecha de creación", auto_now_add=True)
     updated_at = models.DateTimeField("Fecha de actualización", auto_now=True)
 
+    objects = SucursalQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Sucursal"
         verbose_name_plural = "Sucursales"
@@ -40,8 +87,25 @@ class Sucursal(models.Model):
     def __str__(self) -> str:
         return f"{self.name} - {self.company.business_name}"
 
+    def _annotated_count(self, name: str) -> int | None:
+        """Count annotated by :meth:`SucursalQuerySet.with_counts`, if any."""
+
+        return self.__dict__.get(f"{name}_total")
+
+    @property
+    def islands_count(self) -> int:
+        count = self._annotated_count("islands")
+        if count is not None:
+            return count
+        return SucursalStaff._count_items(
+            SucursalStaff._get_related_items(self, "branch_islands")
+        )
+
     @property
     def machines_count(self) -> int:
+        count = self._annotated_count("machines")
+        if count is not None:
+            return count
         islands = SucursalStaff._get_related_items(self, "branch_islands")
         return sum(
             SucursalStaff._count_items(
@@ -52,6 +116,9 @@ class Sucursal(models.Model):
 
     @property
     def nozzles_count(self) -> int:
+        count = self._annotated_count("nozzles")
+        if count is not None:
+            return count
         return sum(
             machine.nozzles.count()
             for island in self.branch_islands.all()
@@ -60,14 +127,23 @@ class Sucursal(models.Model):
 
     @property
     def shifts_count(self) -> int:
+        count = self._annotated_count("shifts")
+        if count is not None:
+            return count
         return self.shifts.count()
 
     @property
     def fuel_inventories_count(self) -> int:
+        count = self._annotated_count("fuel_inventories")
+        if count is not None:
+            return count
         return self.fuel_inventories.count()
 
     @property
     def products_count(self) -> int:
+        count = self._annotated_count("products")
+        if count is not None:
+            return count
         return self.products.count()
 
     def get_staff_for_role(self, role: str | Iterable[str]):
@@ -237,8 +313,22 @@ class Machine(models.Model):
 
         super().save(*args, **kwargs)
 
+    # Los accesos de lectura usan las relaciones precargadas cuando existen
+    # (``fuel_inventory`` con select_related, ``fuel_inventories`` y
+    # ``fuel_numerals`` con prefetch_related) y nunca escriben: los numerales
+    # faltantes se crean con ``provision_numerals`` / ``provision_machine_numerals``.
+
+    def _prefetched(self, related_name: str):
+        return getattr(self, "_prefetched_objects_cache", {}).get(related_name)
+
+    def _linked_inventories(self) -> list["FuelInventory"]:
+        inventories = self._prefetched("fuel_inventories")
+        if inventories is None:
+            return list(self.fuel_inventories.all())
+        return list(inventories)
+
     def get_fuel_inventories(self):
-        inventories = list(self.fuel_inventories.all())
+        inventories = self._linked_inventories()
         primary_inventory = self.fuel_inventory
         if primary_inventory and primary_inventory not in inventories:
             inventories.insert(0, primary_inventory)
@@ -247,26 +337,26 @@ class Machine(models.Model):
     def get_numerals_for_inventory(
         self, fuel_inventory: "FuelInventory" | None
     ) -> list["MachineFuelInventoryNumeral"]:
+        """Return the numerals of ``fuel_inventory`` ordered by slot, without writing."""
+
         if fuel_inventory is None or not self.pk:
             return []
 
-        numerals = list(
-            MachineFuelInventoryNumeral.objects.filter(
-                machine=self, fuel_inventory=fuel_inventory
-            ).order_by("slot", "pk")
-        )
-
-        if not numerals:
-            numerals.append(
-                MachineFuelInventoryNumeral.objects.create(
-                    machine=self,
-                    fuel_inventory=fuel_inventory,
-                    slot=1,
-                    numeral=Decimal("0"),
-                )
+        numerals = self._prefetched("fuel_numerals")
+        if numerals is None:
+            return list(
+                MachineFuelInventoryNumeral.objects.filter(
+                    machine=self, fuel_inventory=fuel_inventory
+                ).order_by("slot", "pk")
             )
-
-        return numerals
+        return sorted(
+            (
+                numeral
+                for numeral in numerals
+                if numeral.fuel_inventory_id == fuel_inventory.pk
+            ),
+            key=lambda numeral: (numeral.slot, numeral.pk),
+        )
 
     def get_numeral_for_inventory(self, fuel_inventory: "FuelInventory" | None):
         numerals = self.get_numerals_for_inventory(fuel_inventory)
@@ -274,21 +364,64 @@ class Machine(models.Model):
             return Decimal("0")
         return numerals[0].numeral
 
+    def provision_numerals(self) -> int:
+        """Create the missing slot-1 numeral of every inventory of the machine."""
+
+        return provision_machine_numerals([self])
+
     @property
     def numeral(self) -> Decimal:
         return self.get_numeral_for_inventory(self.primary_fuel_inventory)
 
     @property
     def primary_fuel_inventory(self):
-        return self.fuel_inventory or self.fuel_inventories.order_by("pk").first()
+        if self.fuel_inventory_id:
+            return self.fuel_inventory
+        inventories = self._prefetched("fuel_inventories")
+        if inventories is None:
+            return self.fuel_inventories.order_by("pk").first()
+        return min(inventories, key=lambda inventory: inventory.pk, default=None)
 
     @property
     def fuel_types(self) -> list[str]:
-        return list(
-            self.fuel_inventories.order_by("fuel_type")
-            .values_list("fuel_type", flat=True)
-            .distinct()
+        inventories = self._prefetched("fuel_inventories")
+        if inventories is None:
+            return list(
+                self.fuel_inventories.order_by("fuel_type")
+                .values_list("fuel_type", flat=True)
+                .distinct()
+            )
+        return sorted({inventory.fuel_type for inventory in inventories})
+
+
+def provision_machine_numerals(machines: Iterable[Machine]) -> int:
+    """Create the missing slot-1 numeral of every (machine, inventory) pair.
+
+    This is the explicit step that used to happen implicitly on read in
+    ``get_numerals_for_inventory``. Existing pairs are read in one query and
+    the missing ones inserted with a single ``bulk_create``. Returns how many
+    numerals were created.
+    """
+
+    machines = [machine for machine in machines if machine.pk]
+    if not machines:
+        return 0
+
+    existing = set(
+        MachineFuelInventoryNumeral.objects.filter(machine__in=machines).values_list(
+            "machine_id", "fuel_inventory_id"
+        )
+    )
+    missing = [
+        MachineFuelInventoryNumeral(
+            machine=machine, fuel_inventory=inventory, slot=1, numeral=Decimal("0")
         )
+        for machine in machines
+        for inventory in machine.get_fuel_inventories()
+        if (machine.pk, inventory.pk) not in existing
+    ]
+    MachineFuelInventoryNumeral.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(missing)
 
 
 class MachineFuelInventoryNumeral(models.Model):
@@ -515,35 +648,25 @@ def _cleanup_branch_attendants(
     Previously this helper deleted attendants that were no longer linked to any
     shift. That behaviour caused branch staff to lose their assignment when
     they were removed from a shift. Now we only downgrade head attendants that
-    are no longer managing a shift, keeping every firefighter tied to the
-    branch even if they don't have a current shift assignment.
+    are no longer managing a shift, with a single ``UPDATE``, keeping every
+    firefighter tied to the branch even if they don't have a current shift
+    assignment.
     """
 
-    staff_queryset = SucursalStaff.objects.filter(
-        sucursal=branch, role__in=("ATTENDANT", "HEAD_ATTENDANT")
-    )
+    staff_queryset = SucursalStaff.objects.filter(sucursal=branch, role="HEAD_ATTENDANT")
     if profile_ids is not None:
         profile_ids = tuple(profile_ids)
         if not profile_ids:
             return
         staff_queryset = staff_queryset.filter(profile_id__in=profile_ids)
 
-    if not staff_queryset.exists():
-        return
-
-    active_manager_ids = set(
-        Shift.objects.filter(sucursal=branch)
-        .exclude(manager_id__isnull=True)
-        .values_list("manager_id", flat=True)
-    )
-
-    for assignment in staff_queryset:
-        if (
-            assignment.role == "HEAD_ATTENDANT"
-            and assignment.profile_id not in active_manager_ids
-        ):
-            assignment.role = "ATTENDANT"
-            assignment.save(update_fields=["role"])
+    downgraded = staff_queryset.exclude(
+        profile_id__in=Shift.objects.filter(
+            sucursal=branch, manager_id__isnull=False
+        ).values("manager_id")
+    ).update(role="ATTENDANT")
+    if downgraded:
+        _invalidate_staff_caches(branch.pk, profile_ids)
 
 
 def _revoke_head_attendant_status(profile_id: int) -> None:
@@ -570,85 +693,233 @@ def _revoke_head_attendant_status(profile_id: int) -> None:
     ).update(role="ATTENDANT")
 
 
-@receiver(m2m_changed, sender=Shift.attendants.through)
-def ensure_attendants_are_branch_staff(
-    sender,
-    instance: Shift,
-    action: str,
-    pk_set,
-    **_,
+def _invalidate_staff_caches(
+    branch_id: int, profile_ids: Iterable[int] | None = None
 ) -> None:
-    """Ensure attendants belong to the branch staff when added to a shift."""
+    """Expire the caches derived from the branch's staff rows.
 
-    if action == "post_add" and pk_set:
-        from UsuarioApp.models import Profile
+    ``bulk_create`` and ``update`` skip the ``SucursalStaff`` signals that
+    normally do it. Without ``profile_ids`` every member of the branch is
+    affected.
+    """
 
-        attendants = Profile.objects.filter(pk__in=pk_set).select_related("position_FK")
+    from core.principal import (
+        invalidate_branch_principals,
+        invalidate_profile_principals,
+    )
 
-        for attendant in attendants:
-            role = "ATTENDANT"
-            if attendant.position_FK and attendant.position_FK.permission_code in (
-                "ATTENDANT",
-                "HEAD_ATTENDANT",
-            ):
-                role = attendant.position_FK.permission_code
+    from .navigation import invalidate_service_session_navigation
+
+    if profile_ids is None:
+        invalidate_branch_principals(branch_id)
+    else:
+        invalidate_profile_principals(profile_ids)
+    invalidate_service_session_navigation()
 
-            assignment, created = SucursalStaff.objects.get_or_create(
-                sucursal=instance.sucursal,
-                profile=attendant,
-                defaults={"role": role},
-            )
 
-            if not created and (
-                assignment.role is None
-                or assignment.role in ("ATTENDANT", "HEAD_ATTENDANT")
-            ) and assignment.role != role:
-                assignment.role = role
-                assignment.save(update_fields=["role"])
+def sync_attendant_staff(branch_id: int, profile_ids: Iterable[int]) -> None:
+    """Make ``profile_ids`` attendant staff of the branch, set-based and idempotent.
+
+    Each profile's target role is ``HEAD_ATTENDANT`` when that is its position
+    and ``ATTENDANT`` otherwise. Missing assignments are created with a
+    single ``bulk_create`` and attendant assignments with another role are
+    fixed with one conditional ``UPDATE``; administrator or accountant
+    assignments are left alone. Calling it again changes nothing, so it is
+    safe from signals, forms and management commands.
+    """
+
+    from UsuarioApp.models import Profile
+
+    profile_ids = set(profile_ids)
+    if not branch_id or not profile_ids:
         return
 
-    if action == "post_remove" and pk_set:
-        _cleanup_branch_attendants(instance.sucursal, pk_set)
-    elif action == "post_clear":
-        _cleanup_branch_attendants(instance.sucursal)
+    head_ids = set(
+        Profile.objects.filter(
+            pk__in=profile_ids, position_FK__permission_code="HEAD_ATTENDANT"
+        ).values_list("pk", flat=True)
+    )
+    assigned_roles = dict(
+        SucursalStaff.objects.filter(
+            sucursal_id=branch_id, profile_id__in=profile_ids
+        ).values_list("profile_id", "role")
+    )
+
+    def target_role(profile_id: int) -> str:
+        return "HEAD_ATTENDANT" if profile_id in head_ids else "ATTENDANT"
+
+    missing_ids = profile_ids - assigned_roles.keys()
+    if missing_ids:
+        SucursalStaff.objects.bulk_create(
+            [
+                SucursalStaff(
+                    sucursal_id=branch_id,
+                    profile_id=profile_id,
+                    role=target_role(profile_id),
+                )
+                for profile_id in missing_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    outdated_ids = [
+        profile_id
+        for profile_id, role in assigned_roles.items()
+        if role in (None, "ATTENDANT", "HEAD_ATTENDANT")
+        and role != target_role(profile_id)
+    ]
+    if outdated_ids:
+        SucursalStaff.objects.filter(
+            sucursal_id=branch_id, profile_id__in=outdated_ids
+        ).update(
+            role=Case(
+                When(profile_id__in=head_ids, then=Value("HEAD_ATTENDANT")),
+                default=Value("ATTENDANT"),
+            )
+        )
+
+    if missing_ids or outdated_ids:
+        _invalidate_staff_caches(branch_id, missing_ids.union(outdated_ids))
+
 
 @receiver(m2m_changed, sender=Shift.attendants.through)
-def ensure_attendants_are_branch_staff(
-    sender,
-    instance: Shift,
-    action: str,
-    pk_set,
-    **_,
+def sync_shift_attendants_staff(
+    sender, instance, action: str, pk_set, reverse: bool, **_
 ) -> None:
-    """Ensure attendants belong to the branch staff when added to a shift."""
+    """Keep the branch staff in sync with the attendants of its shifts."""
 
-    if action != "post_add" or not pk_set:
+    if action not in {"post_add", "post_remove", "post_clear"}:
         return
 
-    from UsuarioApp.models import Profile
+    if reverse:
+        # Cambio hecho desde el perfil: ``pk_set`` son turnos.
+        if pk_set:
+            branches = Sucursal.objects.filter(shifts__in=pk_set).distinct()
+        else:
+            branches = Sucursal.objects.filter(staff__profile=instance)
+        for branch in branches:
+            if action == "post_add":
+                sync_attendant_staff(branch.pk, [instance.pk])
+            else:
+                _cleanup_branch_attendants(branch, [instance.pk])
+        return
 
-    attendants = Profile.objects.filter(pk__in=pk_set).select_related("position_FK")
+    if action == "post_add":
+        sync_attendant_staff(instance.sucursal_id, pk_set or ())
+    elif action == "post_remove":
+        if pk_set:
+            _cleanup_branch_attendants(instance.sucursal, pk_set)
+    else:
+        _cleanup_branch_attendants(instance.sucursal)
 
-    for attendant in attendants:
-        role = "ATTENDANT"
-        if attendant.position_FK and attendant.position_FK.permission_code in (
-            "ATTENDANT",
-            "HEAD_ATTENDANT",
-        ):
-            role = attendant.position_FK.permission_code
 
-        assignment, created = SucursalStaff.objects.get_or_create(
-            sucursal=instance.sucursal,
-            profile=attendant,
-            defaults={"role": role},
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _session_sum(model, expression, output_field, session_field="service_session"):
+    """Correlated ``SUM`` of ``expression`` over the rows of one session."""
+
+    zero = Decimal("0") if isinstance(output_field, DecimalField) else 0
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{session_field: OuterRef("pk")})
+            .order_by()
+            .values(session_field)
+            .annotate(total=Sum(expression, output_field=output_field))
+            .values("total"),
+            output_field=output_field,
+        ),
+        Value(zero, output_field=output_field),
+    )
+
+
+def _session_count(model, session_field="service_session"):
+    """Correlated ``COUNT`` of the rows of one session (or of ``session_field``)."""
+
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{session_field: OuterRef("pk")})
+            .order_by()
+            .values(session_field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+class ServiceSessionQuerySet(models.QuerySet):
+    def with_financials(self) -> "ServiceSessionQuerySet":
+        """Annotate every money component and the derived profits of a session.
+
+        All values are computed by the database in the same query through
+        correlated subqueries, one per record table:
+
+        - ``turn_profit`` = credit + vouchers + withdrawals + product sales.
+        - ``net_turn_profit`` = ``turn_profit`` - fuel load payments -
+          firefighter payments - product load payments.
+
+        Counts (``credit_count``, ``voucher_count``...) and quantities
+        (``fuel_load_liters``, ``product_sales_items``...) are annotated too.
+        """
+
+        integer = IntegerField()
+        liters = DecimalField(max_digits=14, decimal_places=3)
+        queryset = self.annotate(
+            credit_total=_session_sum(ServiceSessionCreditSale, "amount", MONEY_FIELD),
+            credit_count=_session_count(ServiceSessionCreditSale),
+            voucher_total=_session_sum(
+                ServiceSessionTransbankVoucher, "total_amount", MONEY_FIELD
+            ),
+            voucher_count=_session_count(ServiceSessionTransbankVoucher),
+            withdrawal_total=_session_sum(
+                ServiceSessionWithdrawal, "amount", MONEY_FIELD
+            ),
+            withdrawal_count=_session_count(ServiceSessionWithdrawal),
+            firefighter_payments_total=_session_sum(
+                ServiceSessionFirefighterPayment, "amount", MONEY_FIELD
+            ),
+            fuel_load_payment_total=_session_sum(
+                ServiceSessionFuelLoad, "payment_amount", MONEY_FIELD
+            ),
+            fuel_load_count=_session_count(ServiceSessionFuelLoad),
+            fuel_load_liters=_session_sum(
+                ServiceSessionFuelLoad, "liters_added", liters
+            ),
+            product_load_payment_total=_session_sum(
+                ServiceSessionProductLoad, "payment_amount", MONEY_FIELD
+            ),
+            product_load_count=_session_count(ServiceSessionProductLoad),
+            product_load_quantity=_session_sum(
+                ServiceSessionProductLoad, "quantity_added", integer
+            ),
+            product_sales_count=_session_count(ServiceSessionProductSale),
+            product_sales_items=_session_sum(
+                ServiceSessionProductSaleItem,
+                "quantity",
+                integer,
+                "sale__service_session",
+            ),
+            product_sales_value=_session_sum(
+                ServiceSessionProductSaleItem,
+                F("quantity") * F("product__value"),
+                MONEY_FIELD,
+                "sale__service_session",
+            ),
+        )
+        return queryset.annotate(
+            turn_profit=F("credit_total")
+            + F("voucher_total")
+            + F("withdrawal_total")
+            + F("product_sales_value"),
+        ).annotate(
+            net_turn_profit=F("turn_profit")
+            - F("fuel_load_payment_total")
+            - F("firefighter_payments_total")
+            - F("product_load_payment_total"),
         )
 
-        if not created and (
-            assignment.role is None
-            or assignment.role in ("ATTENDANT", "HEAD_ATTENDANT")
-        ) and assignment.role != role:
-            assignment.role = role
-            assignment.save(update_fields=["role"])
 
 class ServiceSession(models.Model):
     """Representa el inicio de un servicio para un turno específico."""
@@ -666,6 +937,16 @@ class ServiceSession(models.Model):
         related_name="service_sessions",
         verbose_name="Turno",
     )
+    # Copia de ``shift.sucursal`` para filtrar por sucursal sin unir Turno.
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="service_sessions",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     attendants = models.ManyToManyField(
         "UsuarioApp.Profile",
         related_name="service_sessions",
@@ -741,17 +1022,83 @@ class ServiceSession(models.Model):
         decimal_places=3,
         default=0,
     )
+    updated_at = models.DateTimeField("Fecha de actualización", auto_now=True)
+
+    objects = ServiceSessionQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Inicio de servicio"
         verbose_name_plural = "Inicios de servicio"
         ordering = ("-started_at",)
+        indexes = [
+            models.Index(fields=["branch", "ended_at"], name="session_branch_ended"),
+            models.Index(fields=["branch", "started_at"], name="session_branch_started"),
+        ]
 
     def __str__(self) -> str:
         return f"Servicio {self.shift.code} - {self.started_at:%Y-%m-%d %H:%M}"
 
+    # Registros con la sucursal del servicio copiada (ver ``assign_record_branch``).
+    BRANCH_RECORDS = (
+        "fuel_sales_by_type",
+        "withdrawals",
+        "transbank_vouchers",
+        "firefighter_payments",
+        "fuel_loads",
+        "product_loads",
+        "credit_sales",
+        "product_sales",
+        "dispense_events",
+    )
+
     def save(self, *args, **kwargs):
         self.initial_budget = (self.coins_amount or 0) + (self.cash_amount or 0)
+        previous_branch_id = self.branch_id
+        update_fields = kwargs.get("update_fields")
+        if self.shift_id and (update_fields is None or "shift" in update_fields):
+            self.branch_id = self.shift.sucursal_id
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "branch"}
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding and self.branch_id != previous_branch_id:
+            self._move_records_to_branch(previous_branch_id)
+
+    def _move_records_to_branch(self, previous_branch_id: int | None) -> None:
+        """Carry the denormalized branch, credit balance and rollups along.
+
+        Runs when the shift of an existing service is switched to another
+        branch, so the records keep matching the queries filtered on
+        ``branch_id``.
+        """
+
+        for related_name in self.BRANCH_RECORDS:
+            getattr(self, related_name).update(branch_id=self.branch_id)
+
+        credits = self.credit_sales.values("status").annotate(
+            amount=Sum("amount"), count=Count("pk")
+        )
+        for bucket in credits:
+            BranchCreditBalance.apply(
+                previous_branch_id,
+                bucket["status"],
+                -bucket["amount"],
+                -bucket["count"],
+                create=False,
+            )
+            BranchCreditBalance.apply(
+                self.branch_id, bucket["status"], bucket["amount"], bucket["count"]
+            )
+
+        if self.ended_at:
+            day = timezone.localdate(self.ended_at)
+            branch_ids = {previous_branch_id, self.branch_id} - {None}
+
+            def refresh_rollups():
+                for branch_id in branch_ids:
+                    BranchDailyProfit.refresh(branch_id, day)
+
+            transaction.on_commit(refresh_rollups)
 
     def get_attendant_names(self) -> list[str]:
         if self.attendants_snapshot:
@@ -781,6 +1128,68 @@ def capture_service_attendants_snapshot(
     instance.save(update_fields=["attendants_snapshot"])
 
 
+# Servicios que se eliminan en la transacción actual: los receptores de sus
+# registros (borrados en cascada) se saltan el trabajo que cubre el servicio.
+DELETED_SESSIONS_BATCH = "sucursalApp:deleted-sessions"
+
+
+@receiver(pre_delete, sender=ServiceSession)
+def remember_deleted_session(sender, instance: ServiceSession, **kwargs) -> None:
+    add_to_commit_batch(DELETED_SESSIONS_BATCH, instance.pk, lambda items: None)
+
+
+def session_is_being_deleted(session_id) -> bool:
+    return session_id in pending_commit_keys(DELETED_SESSIONS_BATCH)
+
+
+def session_branch_id(session_id: int) -> int | None:
+    """Return the branch of a service without loading it."""
+
+    return (
+        ServiceSession.objects.filter(pk=session_id)
+        .values_list("branch_id", flat=True)
+        .first()
+    )
+
+
+def detach_attendants(profile_ids: Iterable[int]) -> set[int]:
+    """Remove profiles from every shift and every active service in bulk.
+
+    The assignment rows are deleted with one statement per relation, which
+    skips the per-row ``m2m_changed`` receivers; the staff-role cleanup and
+    the navigation cache are refreshed once per affected branch instead.
+    Returns the ids of the affected branches.
+    """
+
+    from .navigation import invalidate_service_session_navigation
+
+    profile_ids = tuple(profile_ids)
+    if not profile_ids:
+        return set()
+
+    shift_links = Shift.attendants.through.objects.filter(profile_id__in=profile_ids)
+    session_links = ServiceSession.attendants.through.objects.filter(
+        profile_id__in=profile_ids, servicesession__ended_at__isnull=True
+    )
+    shift_branch_ids = set(
+        shift_links.values_list("shift__sucursal_id", flat=True).distinct()
+    )
+    session_branch_ids = set(
+        session_links.values_list("servicesession__branch_id", flat=True)
+        .distinct()
+    )
+
+    with transaction.atomic():
+        shift_links.delete()
+        session_links.delete()
+        for branch in Sucursal.objects.filter(pk__in=shift_branch_ids):
+            _cleanup_branch_attendants(branch, profile_ids)
+
+    for branch_id in session_branch_ids:
+        invalidate_service_session_navigation(branch_id)
+    return shift_branch_ids | session_branch_ids
+
+
 class ServiceSessionFuelSale(models.Model):
     """Registra las ventas de combustible por tipo durante un servicio."""
 
@@ -790,6 +1199,15 @@ class ServiceSessionFuelSale(models.Model):
         related_name="fuel_sales_by_type",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     fuel_type = models.CharField("Tipo de combustible", max_length=100)
     liters_sold = models.DecimalField(
         "Litros vendidos",
@@ -804,6 +1222,12 @@ class ServiceSessionFuelSale(models.Model):
         verbose_name_plural = "Ventas de combustible"
         unique_together = ("service_session", "fuel_type")
         ordering = ("-created_at", "fuel_type")
+        indexes = [
+            models.Index(
+                fields=["branch", "created_at"],
+                name="fuel_sale_branch_created",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.fuel_type} - {self.liters_sold} L (Servicio {self.service_session_id})"
@@ -818,6 +1242,15 @@ class ServiceSessionWithdrawal(models.Model):
         related_name="withdrawals",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     responsible = models.ForeignKey(
         "UsuarioApp.Profile",
         on_delete=models.PROTECT,
@@ -838,6 +1271,12 @@ class ServiceSessionWithdrawal(models.Model):
         verbose_name = "Tirada de caja"
         verbose_name_plural = "Tiradas de caja"
         ordering = ("-registered_at", "-pk")
+        indexes = [
+            models.Index(
+                fields=["branch", "registered_at"],
+                name="withdrawal_branch_registered",
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -856,6 +1295,15 @@ class ServiceSessionTransbankVoucher(models.Model):
         related_name="transbank_vouchers",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     responsible = models.ForeignKey(
         "UsuarioApp.Profile",
         on_delete=models.PROTECT,
@@ -869,6 +1317,12 @@ class ServiceSessionTransbankVoucher(models.Model):
         verbose_name = "Voucher Transbank"
         verbose_name_plural = "Vouchers Transbank"
         ordering = ("-registered_at", "-pk")
+        indexes = [
+            models.Index(
+                fields=["branch", "registered_at"],
+                name="voucher_branch_registered",
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -887,6 +1341,15 @@ class ServiceSessionFirefighterPayment(models.Model):
         related_name="firefighter_payments",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     firefighter = models.ForeignKey(
         "UsuarioApp.Profile",
         on_delete=models.PROTECT,
@@ -907,6 +1370,12 @@ class ServiceSessionFirefighterPayment(models.Model):
         verbose_name = "Pago a bombero"
         verbose_name_plural = "Pagos a bomberos"
         ordering = ("-registered_at", "-pk")
+        indexes = [
+            models.Index(
+                fields=["branch", "registered_at"],
+                name="ff_payment_branch_registered",
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -925,6 +1394,15 @@ class ServiceSessionFuelLoad(models.Model):
         related_name="fuel_loads",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     inventory = models.ForeignKey(
         "FuelInventory",
         on_delete=models.CASCADE,
@@ -957,6 +1435,12 @@ class ServiceSessionFuelLoad(models.Model):
         verbose_name = "Carga de combustible"
         verbose_name_plural = "Cargas de combustible"
         ordering = ("-date", "-created_at")
+        indexes = [
+            models.Index(
+                fields=["branch", "date"],
+                name="fuel_load_branch_date",
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -972,6 +1456,15 @@ class ServiceSessionProductLoad(models.Model):
         related_name="product_loads",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     product = models.ForeignKey(
         "BranchProduct",
         on_delete=models.CASCADE,
@@ -999,6 +1492,12 @@ class ServiceSessionProductLoad(models.Model):
         verbose_name = "Ingreso de producto"
         verbose_name_plural = "Ingresos de productos"
         ordering = ("-date", "-created_at")
+        indexes = [
+            models.Index(
+                fields=["branch", "date"],
+                name="product_load_branch_date",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.product.product_type} - {self.quantity_added} u. ({self.date:%Y-%m-%d})"
@@ -1017,6 +1516,15 @@ class ServiceSessionCreditSale(models.Model):
         related_name="credit_sales",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     invoice_number = models.CharField("Número de factura", max_length=100, blank=True)
     customer_name = models.CharField("Nombre del cliente", max_length=255)
     fuel_inventory = models.ForeignKey(
@@ -1049,10 +1557,169 @@ class ServiceSessionCreditSale(models.Model):
         verbose_name = "Venta a crédito"
         verbose_name_plural = "Ventas a crédito"
         ordering = ("-created_at", "-pk")
+        indexes = [
+            models.Index(
+                fields=["branch", "created_at", "id"],
+                name="credit_sale_branch_created",
+            ),
+            models.Index(
+                fields=["branch", "status", "created_at", "id"],
+                name="credit_sale_branch_status",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Crédito #{self.pk} - {self.service_session.shift.sucursal.name}"
 
+    def get_sucursal_id(self) -> int | None:
+        if self.branch_id:
+            return self.branch_id
+        session = self._state.fields_cache.get("service_session")
+        if session is not None and session.branch_id:
+            return session.branch_id
+        return session_branch_id(self.service_session_id)
+
+    def mark_paid(self) -> bool:
+        """Mark the credit as paid and move its amount to the paid balance."""
+
+        with transaction.atomic():
+            updated = ServiceSessionCreditSale.objects.filter(
+                pk=self.pk, status=self.Status.PENDING
+            ).update(status=self.Status.PAID, updated_at=timezone.now())
+            if not updated:
+                return False
+            sucursal_id = self.get_sucursal_id()
+            BranchCreditBalance.apply(
+                sucursal_id, self.Status.PENDING, -self.amount, -1
+            )
+            BranchCreditBalance.apply(sucursal_id, self.Status.PAID, self.amount, 1)
+        self.status = self.Status.PAID
+        return True
+
+
+class BranchCreditBalance(models.Model):
+    """Saldos acumulados de ventas a crédito por sucursal."""
+
+    sucursal = models.OneToOneField(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="credit_balance",
+        verbose_name="Sucursal",
+    )
+    pending_amount = models.DecimalField(
+        "Monto pendiente", max_digits=14, decimal_places=2, default=0
+    )
+    pending_count = models.IntegerField("Créditos pendientes", default=0)
+    paid_amount = models.DecimalField(
+        "Monto pagado", max_digits=14, decimal_places=2, default=0
+    )
+    paid_count = models.IntegerField("Créditos pagados", default=0)
+    updated_at = models.DateTimeField("Fecha de actualización", auto_now=True)
+
+    class Meta:
+        verbose_name = "Saldo de créditos"
+        verbose_name_plural = "Saldos de créditos"
+
+    def __str__(self) -> str:
+        return f"Créditos {self.sucursal.name}"
+
+    @property
+    def total_amount(self) -> Decimal:
+        return (self.pending_amount or 0) + (self.paid_amount or 0)
+
+    @property
+    def total_count(self) -> int:
+        return (self.pending_count or 0) + (self.paid_count or 0)
+
+    @classmethod
+    def apply(
+        cls,
+        sucursal_id: int | None,
+        status: str,
+        amount: Decimal,
+        count: int,
+        *,
+        create: bool = True,
+    ) -> None:
+        """Add ``amount``/``count`` to the bucket of ``status`` using F() updates."""
+
+        if not sucursal_id or (not amount and not count):
+            return
+        prefix = (
+            "paid" if status == ServiceSessionCreditSale.Status.PAID else "pending"
+        )
+        if create:
+            cls.objects.get_or_create(sucursal_id=sucursal_id)
+        cls.objects.filter(sucursal_id=sucursal_id).update(
+            **{
+                f"{prefix}_amount": F(f"{prefix}_amount") + (amount or 0),
+                f"{prefix}_count": F(f"{prefix}_count") + count,
+                "updated_at": timezone.now(),
+            }
+        )
+
+
+@receiver(pre_save, sender=ServiceSessionCreditSale)
+def remember_credit_sale_balance_state(
+    sender, instance: ServiceSessionCreditSale, **kwargs
+) -> None:
+    """Keep the stored status/amount so the balance delta can be applied."""
+
+    instance._balance_previous = None
+    if instance.pk and not kwargs.get("raw"):
+        instance._balance_previous = (
+            ServiceSessionCreditSale.objects.filter(pk=instance.pk)
+            .values_list("status", "amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=ServiceSessionCreditSale)
+def update_branch_credit_balance_on_save(
+    sender, instance: ServiceSessionCreditSale, created: bool, **kwargs
+) -> None:
+    if kwargs.get("raw"):
+        return
+    sucursal_id = instance.get_sucursal_id()
+    previous = getattr(instance, "_balance_previous", None)
+    if previous is not None:
+        previous_status, previous_amount = previous
+        if previous_status == instance.status and previous_amount == instance.amount:
+            return
+        BranchCreditBalance.apply(sucursal_id, previous_status, -previous_amount, -1)
+    BranchCreditBalance.apply(sucursal_id, instance.status, instance.amount, 1)
+
+
+CREDIT_BALANCE_BATCH = "sucursalApp:credit-balance"
+
+
+def _apply_credit_balance_deltas(items) -> None:
+    for (sucursal_id, status), (amount, count) in items.items():
+        BranchCreditBalance.apply(sucursal_id, status, amount, count, create=False)
+
+
+def _sum_deltas(previous, delta):
+    return previous[0] + delta[0], previous[1] + delta[1]
+
+
+@receiver(post_delete, sender=ServiceSessionCreditSale)
+def update_branch_credit_balance_on_delete(
+    sender, instance: ServiceSessionCreditSale, **kwargs
+) -> None:
+    """Subtract the credit from its balance, once per branch and status on commit.
+
+    A cascade delete removes many credits at once; their deltas are summed
+    and applied with a single ``UPDATE`` per bucket.
+    """
+
+    add_to_commit_batch(
+        CREDIT_BALANCE_BATCH,
+        (instance.get_sucursal_id(), instance.status),
+        _apply_credit_balance_deltas,
+        value=(-instance.amount, -1),
+        merge=_sum_deltas,
+    )
+
 
 class ServiceSessionProductSale(models.Model):
     """Registra la venta de productos realizada durante un servicio."""
@@ -1063,6 +1730,15 @@ class ServiceSessionProductSale(models.Model):
         related_name="product_sales",
         verbose_name="Servicio",
     )
+    branch = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Sucursal",
+        null=True,
+        blank=True,
+        editable=False,
+    )
     responsible = models.ForeignKey(
         "UsuarioApp.Profile",
         on_delete=models.PROTECT,
@@ -1077,6 +1753,12 @@ class ServiceSessionProductSale(models.Model):
         verbose_name = "Venta de productos"
         verbose_name_plural = "Ventas de productos"
         ordering = ("-sold_at", "-created_at")
+        indexes = [
+            models.Index(
+                fields=["branch", "sold_at"],
+                name="product_sale_branch_sold",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Venta #{self.pk} - {self.service_session.shift.sucursal.name} ({self.sold_at:%Y-%m-%d %H:%M})"
@@ -1188,4 +1870,353 @@ class FuelPrice(models.Model):
         ordering = ("-created_at", "-pk")
 
     def __str__(self) -> str:
-        return f"{self.fuel_type} - {self.sucursal.name} (${self.price})"
\ No newline at end of file
+        return f"{self.fuel_type} - {self.sucursal.name} (${self.price})"
+
+
+@receiver(pre_save, sender=ServiceSessionFuelSale)
+@receiver(pre_save, sender=ServiceSessionWithdrawal)
+@receiver(pre_save, sender=ServiceSessionTransbankVoucher)
+@receiver(pre_save, sender=ServiceSessionFirefighterPayment)
+@receiver(pre_save, sender=ServiceSessionFuelLoad)
+@receiver(pre_save, sender=ServiceSessionProductLoad)
+@receiver(pre_save, sender=ServiceSessionCreditSale)
+@receiver(pre_save, sender=ServiceSessionProductSale)
+def assign_record_branch(sender, instance, **kwargs) -> None:
+    """Copy the branch of the service onto the record before it is stored."""
+
+    if kwargs.get("raw") or instance.branch_id or not instance.service_session_id:
+        return
+    session = instance._state.fields_cache.get("service_session")
+    if session is not None and session.branch_id:
+        instance.branch_id = session.branch_id
+    else:
+        instance.branch_id = session_branch_id(instance.service_session_id)
+
+
+TOUCHED_SESSIONS_BATCH = "sucursalApp:touched-sessions"
+
+
+def _touch_sessions(items) -> None:
+    session_ids = {pk for kind, pk in items if kind == "session"}
+    sale_ids = {pk for kind, pk in items if kind == "sale"}
+    sessions = Q(pk__in=session_ids)
+    if sale_ids:
+        sessions |= Q(product_sales__in=sale_ids)
+    ServiceSession.objects.filter(sessions).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ServiceSessionWithdrawal)
+@receiver(post_delete, sender=ServiceSessionWithdrawal)
+@receiver(post_save, sender=ServiceSessionTransbankVoucher)
+@receiver(post_delete, sender=ServiceSessionTransbankVoucher)
+@receiver(post_save, sender=ServiceSessionFirefighterPayment)
+@receiver(post_delete, sender=ServiceSessionFirefighterPayment)
+@receiver(post_save, sender=ServiceSessionFuelLoad)
+@receiver(post_delete, sender=ServiceSessionFuelLoad)
+@receiver(post_save, sender=ServiceSessionProductLoad)
+@receiver(post_delete, sender=ServiceSessionProductLoad)
+@receiver(post_save, sender=ServiceSessionCreditSale)
+@receiver(post_delete, sender=ServiceSessionCreditSale)
+@receiver(post_save, sender=ServiceSessionProductSale)
+@receiver(post_delete, sender=ServiceSessionProductSale)
+@receiver(post_save, sender=ServiceSessionProductSaleItem)
+@receiver(post_delete, sender=ServiceSessionProductSaleItem)
+def touch_service_session(sender, instance, **kwargs) -> None:
+    """Bump ``ServiceSession.updated_at`` when one of its records changes.
+
+    The export cache uses ``updated_at`` as the data version of a session.
+    The bumps of a transaction are coalesced into one ``UPDATE`` on commit,
+    and records deleted together with their session are skipped.
+    """
+
+    if kwargs.get("raw"):
+        return
+    if isinstance(instance, ServiceSessionProductSaleItem):
+        key = ("sale", instance.sale_id)
+    elif session_is_being_deleted(instance.service_session_id):
+        return
+    else:
+        key = ("session", instance.service_session_id)
+    add_to_commit_batch(TOUCHED_SESSIONS_BATCH, key, _touch_sessions)
+
+
+
+def export_job_upload_to(instance: "ExportJob", filename: str) -> str:
+    """Random name for an export file; the readable name is sent on download."""
+
+    extension = os.path.splitext(filename)[1]
+    return f"{timezone.now():%Y/%m}/{uuid.uuid4().hex}{extension}"
+
+
+class ExportJob(models.Model):
+    """Exportación de servicios generada en segundo plano.
+
+    Los trabajos los procesa el comando ``process_export_jobs``; el archivo
+    generado se reutiliza mientras ``cache_key`` (sucursal, filtros, formato y
+    versión de los datos) no cambie. Los archivos se guardan fuera de
+    ``MEDIA_ROOT`` y solo se descargan desde ``ExportJobDownloadView``.
+    """
+
+    KIND_HISTORY = "history"
+    KIND_SUMMARY = "summary"
+    KIND_CHOICES = (
+        (KIND_HISTORY, "Historial de servicios"),
+        (KIND_SUMMARY, "Resumen de servicio"),
+    )
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pendiente"
+        RUNNING = "RUNNING", "En proceso"
+        DONE = "DONE", "Completada"
+        FAILED = "FAILED", "Fallida"
+
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name="Sucursal",
+    )
+    requested_by = models.ForeignKey(
+        "UsuarioApp.Profile",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="export_jobs",
+        verbose_name="Solicitado por",
+    )
+    kind = models.CharField("Tipo", max_length=20, choices=KIND_CHOICES)
+    export_format = models.CharField("Formato", max_length=10, default="xlsx")
+    params = models.JSONField("Filtros", default=dict, blank=True)
+    cache_key = models.CharField("Clave de caché", max_length=64, db_index=True)
+    status = models.CharField(
+        "Estado",
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    progress = models.PositiveSmallIntegerField("Progreso (%)", default=0)
+    total_rows = models.PositiveIntegerField("Filas", default=0)
+    file = models.FileField(
+        "Archivo",
+        upload_to=export_job_upload_to,
+        storage=PrivateExportStorage(),
+        blank=True,
+    )
+    error = models.TextField("Error", blank=True)
+    created_at = models.DateTimeField("Fecha de creación", auto_now_add=True)
+    started_at = models.DateTimeField("Fecha de inicio", null=True, blank=True)
+    finished_at = models.DateTimeField("Fecha de término", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Exportación"
+        verbose_name_plural = "Exportaciones"
+        ordering = ("-created_at", "-pk")
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="export_job_status_created"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def has_artifact(self) -> bool:
+        return (
+            self.status == self.Status.DONE
+            and bool(self.file)
+            and self.file.storage.exists(self.file.name)
+        )
+
+
+class BranchDailyProfit(models.Model):
+    """Totales diarios precalculados por sucursal para el dashboard.
+
+    Una fila por (sucursal, día de cierre) con los componentes de dinero de
+    los servicios cerrados ese día. Los litros por combustible y el valor por
+    tipo de producto viven en ``BranchDailyBreakdown``. Se recalcula al cerrar
+    un servicio.
+    """
+
+    MONEY_COMPONENTS = (
+        "credit_total",
+        "voucher_total",
+        "withdrawal_total",
+        "product_sales_value",
+        "fuel_load_payment_total",
+        "firefighter_payments_total",
+        "product_load_payment_total",
+    )
+
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="daily_profits",
+        verbose_name="Sucursal",
+    )
+    day = models.DateField("Día")
+    sessions_count = models.PositiveIntegerField("Servicios cerrados", default=0)
+    credit_total = models.DecimalField(
+        "Créditos", max_digits=14, decimal_places=2, default=0
+    )
+    voucher_total = models.DecimalField(
+        "Vouchers", max_digits=14, decimal_places=2, default=0
+    )
+    withdrawal_total = models.DecimalField(
+        "Tiradas", max_digits=14, decimal_places=2, default=0
+    )
+    product_sales_value = models.DecimalField(
+        "Venta de productos", max_digits=14, decimal_places=2, default=0
+    )
+    fuel_load_payment_total = models.DecimalField(
+        "Pagos de combustible", max_digits=14, decimal_places=2, default=0
+    )
+    firefighter_payments_total = models.DecimalField(
+        "Pagos a bomberos", max_digits=14, decimal_places=2, default=0
+    )
+    product_load_payment_total = models.DecimalField(
+        "Pagos de productos", max_digits=14, decimal_places=2, default=0
+    )
+    updated_at = models.DateTimeField("Fecha de actualización", auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumen diario de sucursal"
+        verbose_name_plural = "Resúmenes diarios de sucursal"
+        ordering = ("sucursal", "day")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sucursal", "day"],
+                name="unique_daily_profit_per_branch_day",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.sucursal.name} - {self.day:%Y-%m-%d}"
+
+    @property
+    def net_profit(self) -> Decimal:
+        return (
+            self.credit_total
+            + self.voucher_total
+            + self.withdrawal_total
+            + self.product_sales_value
+            - self.fuel_load_payment_total
+            - self.firefighter_payments_total
+            - self.product_load_payment_total
+        )
+
+    @classmethod
+    def net_profit_expression(cls):
+        """SQL counterpart of :attr:`net_profit` for aggregations."""
+
+        return ExpressionWrapper(
+            F("credit_total")
+            + F("voucher_total")
+            + F("withdrawal_total")
+            + F("product_sales_value")
+            - F("fuel_load_payment_total")
+            - F("firefighter_payments_total")
+            - F("product_load_payment_total"),
+            output_field=MONEY_FIELD,
+        )
+
+    @classmethod
+    def refresh(cls, sucursal_id: int, day) -> "BranchDailyProfit | None":
+        """Recompute the row of ``sucursal_id`` for ``day`` from its sessions.
+
+        ``day`` is the local date of ``ended_at``. The row is removed when no
+        closed session remains for that day.
+        """
+
+        sessions = ServiceSession.objects.filter(
+            branch_id=sucursal_id, ended_at__date=day
+        )
+        totals = sessions.with_financials().aggregate(
+            sessions_count=Count("pk"),
+            **{f"sum_{name}": Sum(name) for name in cls.MONEY_COMPONENTS},
+        )
+        if not totals["sessions_count"]:
+            cls.objects.filter(sucursal_id=sucursal_id, day=day).delete()
+            BranchDailyBreakdown.objects.filter(sucursal_id=sucursal_id, day=day).delete()
+            return None
+
+        breakdown = [
+            BranchDailyBreakdown(
+                sucursal_id=sucursal_id,
+                day=day,
+                kind=BranchDailyBreakdown.KIND_FUEL,
+                label=row["fuel_type"] or "Combustible",
+                amount=row["total"] or 0,
+            )
+            for row in ServiceSessionFuelSale.objects.filter(
+                service_session__in=sessions
+            )
+            .values("fuel_type")
+            .annotate(total=Sum("liters_sold"))
+            .order_by()
+        ]
+        breakdown += [
+            BranchDailyBreakdown(
+                sucursal_id=sucursal_id,
+                day=day,
+                kind=BranchDailyBreakdown.KIND_PRODUCT,
+                label=row["product__product_type"] or "Producto",
+                amount=row["total"] or 0,
+            )
+            for row in ServiceSessionProductSaleItem.objects.filter(
+                sale__service_session__in=sessions
+            )
+            .values("product__product_type")
+            .annotate(
+                total=Sum(F("quantity") * F("product__value"), output_field=MONEY_FIELD)
+            )
+            .order_by()
+        ]
+
+        defaults = {
+            name: totals[f"sum_{name}"] or Decimal("0") for name in cls.MONEY_COMPONENTS
+        }
+        defaults["sessions_count"] = totals["sessions_count"]
+        rollup, _ = cls.objects.update_or_create(
+            sucursal_id=sucursal_id, day=day, defaults=defaults
+        )
+        BranchDailyBreakdown.objects.filter(sucursal_id=sucursal_id, day=day).delete()
+        BranchDailyBreakdown.objects.bulk_create(breakdown)
+        return rollup
+
+
+class BranchDailyBreakdown(models.Model):
+    """Litros por combustible y venta por producto de un ``BranchDailyProfit``."""
+
+    KIND_FUEL = "fuel"
+    KIND_PRODUCT = "product"
+    KIND_CHOICES = (
+        (KIND_FUEL, "Litros por combustible"),
+        (KIND_PRODUCT, "Venta por producto"),
+    )
+
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name="daily_breakdowns",
+        verbose_name="Sucursal",
+    )
+    day = models.DateField("Día")
+    kind = models.CharField("Tipo", max_length=10, choices=KIND_CHOICES)
+    # Igual que ``BranchProduct.product_type``, de donde sale la etiqueta.
+    label = models.CharField("Detalle", max_length=150)
+    amount = models.DecimalField("Cantidad", max_digits=14, decimal_places=3, default=0)
+
+    class Meta:
+        verbose_name = "Detalle diario de sucursal"
+        verbose_name_plural = "Detalles diarios de sucursal"
+        ordering = ("sucursal", "day", "kind", "label")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sucursal", "day", "kind", "label"],
+                name="unique_daily_breakdown_per_branch_day",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.sucursal.name} - {self.day:%Y-%m-%d} - {self.label}"
@@ -0,0 +1,35 @@
+"""Cache versions for the service-session navigation context.
+
+``core.context_processors.service_session_navigation`` caches its result per
+(user, branch) in the ``NAVIGATION_NAMESPACE`` scope of the branch. Starting
+or closing a service, or changing who is assigned to it, invalidates that
+scope, which expires the entries of every user of the branch.
+"""
+
+from core.cache import invalidate, make_key
+
+
+NAVIGATION_CACHE_TIMEOUT = 60 * 60
+NAVIGATION_NAMESPACE = "nav:service-session"
+
+
+def navigation_cache_key(user_id: int, branch_id) -> str:
+    # Los usuarios sin sucursal actual quedan en el ámbito global: dependen de
+    # los servicios de cualquier sucursal donde estén asignados o administren.
+    return make_key(NAVIGATION_NAMESPACE, user_id, branch_id=branch_id or None)
+
+
+def navigation_scopes(branch_id=None) -> list[tuple]:
+    """Scopes to expire when a service of ``branch_id`` changes."""
+
+    scopes = [(None, None)]
+    if branch_id:
+        scopes.append((None, branch_id))
+    return scopes
+
+
+def invalidate_service_session_navigation(branch_id=None) -> None:
+    """Expire the cached navigation of ``branch_id`` and of unscoped users."""
+
+    for company_id, scope_branch_id in navigation_scopes(branch_id):
+        invalidate(NAVIGATION_NAMESPACE, company_id, scope_branch_id)
@@ -0,0 +1,54 @@
+# sucursalApp/signals.py
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.cache import register_invalidation
+from .models import ServiceSession, Shift, SucursalStaff
+from .navigation import (
+    NAVIGATION_NAMESPACE,
+    invalidate_service_session_navigation,
+    navigation_scopes,
+)
+
+
+def _session_branch_id(session: ServiceSession):
+    if session.branch_id:
+        return session.branch_id
+    shift = session._state.fields_cache.get("shift")
+    if shift is not None:
+        return shift.sucursal_id
+    return (
+        Shift.objects.filter(pk=session.shift_id)
+        .values_list("sucursal_id", flat=True)
+        .first()
+    )
+
+
+# Iniciar, cerrar o eliminar un servicio cambia el enlace del menú.
+register_invalidation(
+    ServiceSession,
+    NAVIGATION_NAMESPACE,
+    lambda session: navigation_scopes(_session_branch_id(session)),
+)
+# El encargado del turno también ve su servicio activo.
+register_invalidation(
+    Shift, NAVIGATION_NAMESPACE, lambda shift: navigation_scopes(shift.sucursal_id)
+)
+# Los administradores sin sucursal actual usan su primera asignación.
+register_invalidation(SucursalStaff, NAVIGATION_NAMESPACE)
+
+
+@receiver(m2m_changed, sender=ServiceSession.attendants.through)
+def invalidate_navigation_for_attendants(sender, instance, action, **kwargs):
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+    if isinstance(instance, ServiceSession):
+        invalidate_service_session_navigation(_session_branch_id(instance))
+    else:
+        # Cambio hecho desde el lado del perfil: afecta a varias sucursales.
+        for branch_id in (
+            ServiceSession.objects.filter(pk__in=kwargs.get("pk_set") or ())
+            .values_list("branch_id", flat=True)
+            .distinct()
+        ):
+            invalidate_service_session_navigation(branch_id)
@@ -1,16 +1,67 @@
+from datetime import time, timedelta
+from decimal import Decimal
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
 
 # Create your tests here.
 from UsuarioApp.models import Position, Profile
+from core.cache import INVALIDATION_REGISTRY, cached_queryset, register_invalidation
+from core.context_processors import service_session_navigation
+from core.principal import get_principal, load_principal
+from homeApp.dashboard import (
+    build_profit_dashboard,
+    dashboard_cache_key,
+)
 from homeApp.models import Company
+from iotApp.models import DispenseEvent
 
-from .models import Island, Machine, Nozzle, Sucursal
+from .exports import HISTORY_EXPORT_HEADERS, arrow_export_available
+from .models import (
+    BranchCreditBalance,
+    BranchDailyBreakdown,
+    BranchDailyProfit,
+    BranchProduct,
+    ExportJob,
+    FuelInventory,
+    Island,
+    Machine,
+    MachineFuelInventoryNumeral,
+    Nozzle,
+    ServiceSession,
+    ServiceSessionCreditSale,
+    ServiceSessionFirefighterPayment,
+    ServiceSessionFuelLoad,
+    ServiceSessionFuelSale,
+    ServiceSessionProductLoad,
+    ServiceSessionProductSale,
+    ServiceSessionProductSaleItem,
+    ServiceSessionTransbankVoucher,
+    ServiceSessionWithdrawal,
+    Shift,
+    Sucursal,
+    SucursalStaff,
+    detach_attendants,
+    provision_machine_numerals,
+    sync_attendant_staff,
+)
 
 
 class SucursalRelatedViewsTests(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.owner_position, _ = Position.objects.get_or_create(
             user_position="Dueño", defaults={"permission_code": "OWNER"}
         )
@@ -125,9 +176,13 @@ class SucursalRelatedViewsTests(TestCase):
         )
         island = Island.objects.get(number=7, sucursal=self.branch)
 
-        response = self.client.get(update_url)
-        island_from_context = list(response.context["islands"])[0]
-        machine_form = island_from_context.machine_create_form
+        response = self.client.get(
+            reverse(
+                "sucursal_modal_form",
+                args=[self.branch.pk, "machine-create", island.pk],
+            )
+        )
+        machine_form = response.context["modal_form"]
         machine_data = {
             machine_form["island"].html_name: island.pk,
             machine_form["number"].html_name: 3,
@@ -147,10 +202,13 @@ class SucursalRelatedViewsTests(TestCase):
         )
         machine = Machine.objects.get(number=3, island=island)
 
-        response = self.client.get(update_url)
-        island_from_context = list(response.context["islands"])[0]
-        machine_from_context = list(island_from_context.machines.all())[0]
-        nozzle_form = machine_from_context.nozzle_create_form
+        response = self.client.get(
+            reverse(
+                "sucursal_modal_form",
+                args=[self.branch.pk, "nozzle-create", machine.pk],
+            )
+        )
+        nozzle_form = response.context["modal_form"]
         nozzle_data = {
             nozzle_form["machine"].html_name: machine.pk,
             nozzle_form["number"].html_name: 9,
@@ -169,6 +227,1194 @@ class SucursalRelatedViewsTests(TestCase):
             Nozzle.objects.filter(number=9, machine=machine, description="Pistola inline").exists()
         )
 
+    def test_edit_forms_are_rendered_on_demand(self):
+        island = Island.objects.create(
+            sucursal=self.branch, number=4, description="Isla lazy"
+        )
+
+        response = self.client.get(reverse("sucursal_update", args=[self.branch.pk]))
+        self.assertEqual(response.status_code, 200)
+        island_from_context = list(response.context["islands"])[0]
+        self.assertFalse(hasattr(island_from_context, "update_form"))
+        self.assertNotContains(response, 'value="island-update"')
+
+        response = self.client.get(
+            reverse(
+                "sucursal_modal_form",
+                args=[self.branch.pk, "island-edit", island.pk],
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["modal_form"].instance, island)
+        self.assertContains(response, 'value="island-update"')
+
+        response = self.client.get(
+            reverse(
+                "sucursal_modal_form",
+                args=[self.branch.pk, "unknown-form", island.pk],
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_credit_ledger_balances_and_keyset_pages(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        inventory = FuelInventory.objects.create(
+            sucursal=self.branch,
+            code="E1",
+            fuel_type="Diesel",
+            capacity=Decimal("1000"),
+            liters=Decimal("500"),
+        )
+        credits = [
+            ServiceSessionCreditSale.objects.create(
+                service_session=session,
+                customer_name=f"Cliente {index}",
+                fuel_inventory=inventory,
+                amount=Decimal("100"),
+                responsible=self.owner_profile,
+            )
+            for index in range(25)
+        ]
+
+        balance = BranchCreditBalance.objects.get(sucursal=self.branch)
+        self.assertEqual(balance.pending_count, 25)
+        self.assertEqual(balance.pending_amount, Decimal("2500"))
+
+        self.client.post(reverse("credit_sale_mark_paid", args=[credits[0].pk]))
+        self.client.post(reverse("credit_sale_mark_paid", args=[credits[0].pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("credit_sale_delete", args=[credits[1].pk]))
+        balance.refresh_from_db()
+        self.assertEqual(balance.pending_count, 23)
+        self.assertEqual(balance.pending_amount, Decimal("2300"))
+        self.assertEqual(balance.paid_count, 1)
+        self.assertEqual(balance.paid_amount, Decimal("100"))
+
+        update_url = reverse("sucursal_update", args=[self.branch.pk])
+        response = self.client.get(update_url, {"credit_status": "PENDING"})
+        ledger = response.context["credit_ledger"]
+        self.assertEqual(len(ledger["credit_sales"]), 20)
+        self.assertTrue(ledger["has_next"])
+
+        response = self.client.get(f"{update_url}?{ledger['next_querystring']}")
+        next_ledger = response.context["credit_ledger"]
+        self.assertEqual(len(next_ledger["credit_sales"]), 3)
+        self.assertFalse(next_ledger["has_next"])
+        seen = {credit.pk for credit in ledger["credit_sales"]}
+        seen.update(credit.pk for credit in next_ledger["credit_sales"])
+        self.assertEqual(len(seen), 23)
+
+        response = self.client.get(update_url, {"credit_customer": "cliente 24"})
+        self.assertEqual(
+            [credit.pk for credit in response.context["credit_ledger"]["credit_sales"]],
+            [credits[24].pk],
+        )
+
+        # Borrar el servicio elimina sus créditos en cascada: una sola
+        # actualización del saldo por estado, al confirmar la transacción.
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                session.delete()
+            balance_updates = [
+                query
+                for query in queries.captured_queries
+                if query["sql"].startswith('UPDATE "sucursalApp_branchcreditbalance"')
+            ]
+            self.assertEqual(balance_updates, [])
+        balance.refresh_from_db()
+        self.assertEqual((balance.pending_count, balance.pending_amount), (0, 0))
+        self.assertEqual((balance.paid_count, balance.paid_amount), (0, 0))
+
+    def test_history_export_streams_database_totals(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(
+            shift=shift, cash_amount=Decimal("1000"), ended_at=timezone.now()
+        )
+        ServiceSession.objects.create(shift=shift)
+        for amount in (Decimal("200"), Decimal("300")):
+            ServiceSessionWithdrawal.objects.create(
+                service_session=session, responsible=self.owner_profile, amount=amount
+            )
+        ServiceSessionTransbankVoucher.objects.create(
+            service_session=session,
+            responsible=self.owner_profile,
+            total_amount=Decimal("50"),
+        )
+
+        response = self.client.get(
+            reverse("service_history_export", args=[self.branch.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][0], "FECHA")
+        self.assertEqual(rows[1][1], "T1")
+        self.assertEqual(rows[1][4:8], (1, 50, 2, 500))
+        self.assertEqual(rows[1][11], 1550)
+
+        response = self.client.get(
+            reverse("service_history_export", args=[self.branch.pk]),
+            {"format": "csv", "shift": "T1"},
+        )
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("FECHA,TURNO"))
+        self.assertIn(",1550.00,", lines[1])
+
+    @skipUnless(arrow_export_available(), "pyarrow no está instalado")
+    def test_history_arrow_export_keeps_decimal_types(self):
+        import pyarrow as pa
+
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(
+            shift=shift, cash_amount=Decimal("1000"), ended_at=timezone.now()
+        )
+        for amount in (Decimal("200.25"), Decimal("300")):
+            ServiceSessionWithdrawal.objects.create(
+                service_session=session, responsible=self.owner_profile, amount=amount
+            )
+
+        response = self.client.get(
+            reverse("service_history_export", args=[self.branch.pk]),
+            {"format": "arrow"},
+        )
+        self.assertEqual(response.status_code, 200)
+        table = pa.ipc.open_file(
+            pa.BufferReader(b"".join(response.streaming_content))
+        ).read_all()
+        self.assertEqual(table.column_names, HISTORY_EXPORT_HEADERS)
+        self.assertEqual(table.schema.field("FECHA").type, pa.date32())
+        self.assertEqual(table.schema.field("TURNO").type, pa.string())
+        self.assertEqual(table.schema.field("CANT. TIRADAS").type, pa.int64())
+        self.assertEqual(
+            table.schema.field("MONTO TIRADAS").type, pa.decimal128(14, 2)
+        )
+        row = table.to_pylist()[0]
+        self.assertEqual(row["TURNO"], "T1")
+        self.assertEqual(row["CANT. TIRADAS"], 2)
+        self.assertEqual(row["MONTO TIRADAS"], Decimal("500.25"))
+        self.assertEqual(row["GANANCIA TURNO"], Decimal("1500.25"))
+
+    def test_company_history_export_has_sheet_per_branch(self):
+        other_branch = Sucursal.objects.create(
+            company=self.company,
+            name="Sucursal Norte",
+            address="Calle 2",
+            city="Santiago",
+            region="Metropolitana",
+            phone="987654321",
+            email="norte@example.com",
+        )
+        for branch, amount in ((self.branch, "100"), (other_branch, "250")):
+            shift = Shift.objects.create(
+                sucursal=branch,
+                code=f"T{branch.pk}",
+                start_time=time(8, 0),
+                end_time=time(16, 0),
+                manager=self.owner_profile,
+            )
+            session = ServiceSession.objects.create(shift=shift, ended_at=timezone.now())
+            ServiceSessionWithdrawal.objects.create(
+                service_session=session,
+                responsible=self.owner_profile,
+                amount=Decimal(amount),
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("company_history_export"))
+            content = b"".join(response.streaming_content)
+        session_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "sucursalApp_servicesession"' in query["sql"]
+        ]
+        # Una consulta para las filas y otra agrupada por sucursal.
+        self.assertEqual(len(session_queries), 2)
+        self.assertTrue(
+            any(
+                query["sql"].endswith('GROUP BY "sucursalApp_servicesession"."branch_id"')
+                for query in session_queries
+            )
+        )
+        workbook = load_workbook(BytesIO(content))
+        self.assertEqual(
+            workbook.sheetnames, ["Consolidado", "Sucursal Centro", "Sucursal Norte"]
+        )
+        consolidated = list(workbook["Consolidado"].iter_rows(values_only=True))
+        self.assertEqual(consolidated[1][:2], ("Sucursal Centro", 1))
+        self.assertEqual(consolidated[-1][0], "TOTAL")
+        self.assertEqual(consolidated[-1][7], 350)
+        self.assertEqual(len(list(workbook["Sucursal Norte"].iter_rows())), 2)
+
+    def test_daily_profit_rollup_feeds_dashboard(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        closed_at = timezone.now()
+        for amount in ("100", "40"):
+            session = ServiceSession.objects.create(shift=shift, ended_at=closed_at)
+            ServiceSessionWithdrawal.objects.create(
+                service_session=session,
+                responsible=self.owner_profile,
+                amount=Decimal(amount),
+            )
+            ServiceSessionFuelSale.objects.create(
+                service_session=session, fuel_type="Diesel", liters_sold=Decimal("10")
+            )
+
+        day = timezone.localdate(closed_at)
+        rollup = BranchDailyProfit.refresh(self.branch.pk, day)
+        self.assertEqual(rollup.sessions_count, 2)
+        self.assertEqual(rollup.net_profit, Decimal("140"))
+        self.assertEqual(
+            BranchDailyBreakdown.objects.get(sucursal=self.branch, label="Diesel").amount,
+            Decimal("20"),
+        )
+
+        url = reverse("profit_dashboard_data")
+        response = self.client.get(url, {"branch": self.branch.pk, "granularity": "day"})
+        branch_data = response.json()["branches"][0]
+        self.assertEqual(list(branch_data["series"]), ["day"])
+        series = branch_data["series"]["day"]
+        self.assertEqual(series["total"], [{"label": day.strftime("%d %b"), "value": 140.0}])
+        self.assertEqual(series["fuels"]["Diesel"][0]["value"], 20.0)
+        self.assertIn("private", response["Cache-Control"])
+
+        revalidated = self.client.get(
+            url,
+            {"branch": self.branch.pk, "granularity": "day"},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(
+            self.client.get(url, {"granularity": "month"}).status_code, 400
+        )
+
+        # Con la caché vacía (p. ej. tras reiniciar) el ETag sigue los datos.
+        ServiceSessionWithdrawal.objects.create(
+            service_session=session,
+            responsible=self.owner_profile,
+            amount=Decimal("5"),
+        )
+        BranchDailyProfit.refresh(self.branch.pk, day)
+        cache.clear()
+        stale = self.client.get(
+            url,
+            {"branch": self.branch.pk, "granularity": "day"},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(stale.status_code, 200)
+        self.assertNotEqual(stale["ETag"], response["ETag"])
+
+        ServiceSession.objects.filter(shift=shift).delete()
+        self.assertIsNone(BranchDailyProfit.refresh(self.branch.pk, day))
+        self.assertFalse(BranchDailyProfit.objects.exists())
+        self.assertFalse(BranchDailyBreakdown.objects.exists())
+
+    def test_record_changes_touch_their_session_once_per_transaction(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                ServiceSessionWithdrawal.objects.create(
+                    service_session=session,
+                    responsible=self.owner_profile,
+                    amount=Decimal("10"),
+                )
+            with CaptureQueriesContext(connection) as queries:
+                session.delete()
+        self.assertFalse(
+            any(
+                query["sql"].startswith('UPDATE "sucursalApp_servicesession"')
+                for query in queries.captured_queries
+            )
+        )
+
+        session = ServiceSession.objects.create(shift=shift)
+        stamp = session.updated_at
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for _ in range(3):
+                ServiceSessionWithdrawal.objects.create(
+                    service_session=session,
+                    responsible=self.owner_profile,
+                    amount=Decimal("10"),
+                )
+        self.assertEqual(len(callbacks), 1)
+        session.refresh_from_db()
+        self.assertGreater(session.updated_at, stamp)
+
+    def test_cascade_delete_refreshes_each_daily_rollup_once_after_commit(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        closed_at = timezone.now()
+        session = ServiceSession.objects.create(shift=shift, ended_at=closed_at)
+        for _ in range(5):
+            ServiceSessionWithdrawal.objects.create(
+                service_session=session,
+                responsible=self.owner_profile,
+                amount=Decimal("10"),
+            )
+        day = timezone.localdate(closed_at)
+        BranchDailyProfit.refresh(self.branch.pk, day)
+
+        with mock.patch.object(
+            BranchDailyProfit, "refresh", wraps=BranchDailyProfit.refresh
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                shift.delete()
+                refresh.assert_not_called()
+        refresh.assert_called_once_with(self.branch.pk, day)
+        self.assertFalse(BranchDailyProfit.objects.exists())
+
+        # Un servicio cerrado eliminado directamente también refresca su día.
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T2",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift, ended_at=closed_at)
+        BranchDailyProfit.refresh(self.branch.pk, day)
+        with self.captureOnCommitCallbacks(execute=True):
+            session.delete()
+        self.assertFalse(BranchDailyProfit.objects.exists())
+
+    def test_records_of_closed_sessions_refresh_their_rollup(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        closed_at = timezone.now()
+        session = ServiceSession.objects.create(shift=shift, ended_at=closed_at)
+        day = timezone.localdate(closed_at)
+        BranchDailyProfit.refresh(self.branch.pk, day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal = ServiceSessionWithdrawal.objects.create(
+                service_session=session,
+                responsible=self.owner_profile,
+                amount=Decimal("10"),
+            )
+            withdrawal.amount = Decimal("25")
+            withdrawal.save()
+        rollup = BranchDailyProfit.objects.get(sucursal=self.branch, day=day)
+        self.assertEqual(rollup.withdrawal_total, Decimal("25"))
+
+        # Las etiquetas admiten el largo completo del tipo de producto.
+        product = BranchProduct.objects.create(
+            sucursal=self.branch,
+            product_type="A" * 150,
+            quantity=10,
+            arrival_date=day,
+            batch_number="L1",
+            value=Decimal("1000"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = ServiceSessionProductSale.objects.create(
+                service_session=session, responsible=self.owner_profile
+            )
+            ServiceSessionProductSaleItem.objects.create(
+                sale=sale, product=product, quantity=2
+            )
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.product_sales_value, Decimal("2000"))
+        self.assertEqual(
+            BranchDailyBreakdown.objects.get(
+                kind=BranchDailyBreakdown.KIND_PRODUCT
+            ).label,
+            "A" * 150,
+        )
+
+        # Los registros de servicios abiertos no tocan el resumen.
+        open_session = ServiceSession.objects.create(shift=shift)
+        with self.captureOnCommitCallbacks() as callbacks:
+            ServiceSessionWithdrawal.objects.create(
+                service_session=open_session,
+                responsible=self.owner_profile,
+                amount=Decimal("10"),
+            )
+        with mock.patch.object(BranchDailyProfit, "refresh") as refresh:
+            for callback in callbacks:
+                callback()
+        refresh.assert_not_called()
+
+    def test_profit_dashboard_query_count_does_not_grow_with_branches(self):
+        today = timezone.localdate()
+        for index in range(4):
+            branch = Sucursal.objects.create(
+                company=self.company,
+                name=f"Sucursal {index}",
+                address="Calle 3",
+                city="Santiago",
+                region="Metropolitana",
+                phone="987654321",
+                email=f"sucursal{index}@example.com",
+            )
+            # Cada sucursal tiene un último día distinto: sus ventanas también.
+            last_day = today - timedelta(days=30 * index)
+            for offset in range(10):
+                BranchDailyProfit.objects.create(
+                    sucursal=branch,
+                    day=last_day - timedelta(days=offset),
+                    sessions_count=1,
+                    withdrawal_total=Decimal("10"),
+                )
+            BranchDailyBreakdown.objects.create(
+                sucursal=branch,
+                day=last_day,
+                kind=BranchDailyBreakdown.KIND_FUEL,
+                label="Diesel",
+                amount=Decimal("5"),
+            )
+
+        branches = list(self.company.branches.order_by("name"))
+        with CaptureQueriesContext(connection) as queries:
+            dashboard = build_profit_dashboard(branches)
+        self.assertEqual(len(queries.captured_queries), 6)
+        self.assertEqual(len(dashboard), 4)
+        for entry in dashboard:
+            day_series = entry["series"]["day"]
+            self.assertEqual(len(day_series["total"]), 7)
+            self.assertEqual({point["value"] for point in day_series["total"]}, {10.0})
+            self.assertEqual(len(day_series["fuels"]["Diesel"]), 1)
+            self.assertEqual(
+                sum(point["value"] for point in entry["series"]["year"]["total"]), 100.0
+            )
+
+    def test_dashboard_is_cached_and_invalidated_by_fuel_loads(self):
+        inventory = FuelInventory.objects.create(
+            sucursal=self.branch,
+            code="E1",
+            fuel_type="Diesel",
+            capacity=Decimal("1000"),
+            liters=Decimal("500"),
+        )
+        self.client.get(reverse("Home"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("Home"))
+        self.assertFalse(
+            any("sucursalApp_fuelinventory" in query["sql"] for query in queries.captured_queries)
+        )
+        self.assertEqual(
+            response.context["fuel_dashboard"][0]["inventories"][0]["liters"], Decimal("500")
+        )
+
+        stale_key = dashboard_cache_key([self.branch.pk], "fuel")
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        with self.captureOnCommitCallbacks() as callbacks:
+            ServiceSessionFuelLoad.objects.create(
+                service_session=session,
+                inventory=inventory,
+                liters_added=Decimal("100"),
+                invoice_number="F-1",
+                responsible=self.owner_profile,
+                driver_name="Chofer",
+                license_plate="AB1234",
+                date=timezone.localdate(),
+            )
+            FuelInventory.objects.filter(pk=inventory.pk).update(liters=Decimal("600"))
+        # Solo la marca de actualización del servicio; el dashboard se
+        # reconstruye en la siguiente visita o con prewarm_dashboards.
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(dashboard_cache_key([self.branch.pk], "fuel"), stale_key)
+
+        call_command("prewarm_dashboards", "--branch", str(self.branch.pk), stdout=StringIO())
+        cached = cache.get(dashboard_cache_key([self.branch.pk], "fuel"))
+        self.assertEqual(cached[0]["inventories"][0]["liters"], Decimal("600"))
+
+    def test_service_session_navigation_is_lazy_and_cached(self):
+        self.owner_profile.current_branch = self.branch
+        self.owner_profile.save()
+        request = RequestFactory().get("/")
+        request.user = User.objects.select_related("profile").get(pk=self.owner_user.pk)
+
+        with self.assertNumQueries(0):
+            context = service_session_navigation(request)
+        self.assertFalse(context["has_active_service_session"])
+        with self.assertNumQueries(0):
+            context = service_session_navigation(request)
+            self.assertFalse(context["has_active_service_session"])
+            self.assertEqual(
+                str(context["service_session_link"]), reverse("service_session_start")
+            )
+
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        context = service_session_navigation(request)
+        self.assertTrue(context["has_active_service_assigned"])
+        self.assertEqual(
+            str(context["service_session_link"]),
+            reverse("service_session_detail", args=[session.pk]),
+        )
+
+    def test_cached_queryset_is_scoped_per_branch_and_invalidated_by_signals(self):
+        other_branch = Sucursal.objects.create(company=self.company, name="Otra")
+        register_invalidation(
+            Island, "test-islands", lambda island: [(None, island.sucursal_id)]
+        )
+        self.addCleanup(INVALIDATION_REGISTRY.pop, Island)
+
+        @cached_queryset("test-islands", scope=lambda branch_id: {"branch_id": branch_id})
+        def island_numbers(branch_id):
+            return Island.objects.filter(sucursal_id=branch_id).values_list(
+                "number", flat=True
+            )
+
+        self.assertEqual(island_numbers(self.branch.pk), [])
+        self.assertEqual(island_numbers(other_branch.pk), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(island_numbers(self.branch.pk), [])
+
+        Island.objects.create(sucursal=self.branch, number=1)
+        self.assertEqual(island_numbers(self.branch.pk), [1])
+        with self.assertNumQueries(0):
+            self.assertEqual(island_numbers(other_branch.pk), [])
+
+    def test_detach_attendants_removes_assignments_in_bulk(self):
+        attendant_position = Position.objects.create(
+            user_position="Bombero", permission_code="ATTENDANT"
+        )
+        attendants = [
+            Profile.objects.create(
+                user_FK=User.objects.create_user(username=f"bombero{i}", password="x"),
+                position_FK=attendant_position,
+            )
+            for i in range(3)
+        ]
+        shifts = [
+            Shift.objects.create(
+                sucursal=self.branch,
+                code=f"T{i}",
+                start_time=time(8, 0),
+                end_time=time(16, 0),
+                manager=self.owner_profile,
+            )
+            for i in range(3)
+        ]
+        for shift in shifts:
+            shift.attendants.add(*attendants)
+        active = ServiceSession.objects.create(shift=shifts[0])
+        ended = ServiceSession.objects.create(shift=shifts[1], ended_at=timezone.now())
+        for session in (active, ended):
+            session.attendants.add(*attendants)
+
+        target = attendants[0]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(detach_attendants([target.pk]), {self.branch.pk})
+        self.assertLessEqual(len(queries.captured_queries), 10)
+
+        self.assertFalse(target.assigned_shifts.exists())
+        self.assertEqual(list(target.service_sessions.all()), [ended])
+        self.assertEqual(shifts[2].attendants.count(), 2)
+        self.assertEqual(active.attendants.count(), 2)
+        self.assertTrue(
+            SucursalStaff.objects.filter(sucursal=self.branch, profile=target).exists()
+        )
+
+    def test_attendant_staff_sync_is_set_based_and_idempotent(self):
+        attendant_position = Position.objects.create(
+            user_position="Bombero", permission_code="ATTENDANT"
+        )
+        head_position = Position.objects.create(
+            user_position="Jefe de turno", permission_code="HEAD_ATTENDANT"
+        )
+        attendants = [
+            Profile.objects.create(
+                user_FK=User.objects.create_user(username=f"bombero{i}", password="x"),
+                position_FK=head_position if i == 0 else attendant_position,
+            )
+            for i in range(5)
+        ]
+        SucursalStaff.objects.create(
+            sucursal=self.branch, profile=attendants[1], role="HEAD_ATTENDANT"
+        )
+        SucursalStaff.objects.create(
+            sucursal=self.branch, profile=attendants[2], role="ADMINISTRATOR"
+        )
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            shift.attendants.add(*attendants)
+        self.assertLessEqual(len(queries.captured_queries), 10)
+        roles = dict(
+            SucursalStaff.objects.filter(sucursal=self.branch).values_list(
+                "profile_id", "role"
+            )
+        )
+        self.assertEqual(
+            [roles[profile.pk] for profile in attendants],
+            ["HEAD_ATTENDANT", "ATTENDANT", "ADMINISTRATOR", "ATTENDANT", "ATTENDANT"],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            sync_attendant_staff(self.branch.pk, [profile.pk for profile in attendants])
+        self.assertFalse(
+            any(
+                query["sql"].startswith(("INSERT", "UPDATE"))
+                for query in queries.captured_queries
+            )
+        )
+
+    def _build_topology(self, branch, islands: int, first: int = 1) -> None:
+        for island_number in range(first, first + islands):
+            island = Island.objects.create(sucursal=branch, number=island_number)
+            for machine_number in (1, 2):
+                machine = Machine.objects.create(
+                    island=island, number=machine_number, fuel_type="93"
+                )
+                Nozzle.objects.create(machine=machine, number=1, fuel_type="93")
+
+    def test_branch_counts_are_annotated_without_loading_the_topology(self):
+        self._build_topology(self.branch, islands=2)
+        FuelInventory.objects.create(
+            sucursal=self.branch,
+            code="E1",
+            fuel_type="93",
+            capacity=Decimal("1000"),
+            liters=Decimal("500"),
+        )
+
+        branch = Sucursal.objects.with_counts().get(pk=self.branch.pk)
+        with self.assertNumQueries(0):
+            counts = (
+                branch.islands_count,
+                branch.machines_count,
+                branch.nozzles_count,
+                branch.shifts_count,
+                branch.fuel_inventories_count,
+                branch.products_count,
+            )
+        self.assertEqual(counts, (2, 4, 4, 0, 1, 0))
+        self.assertEqual(
+            (self.branch.islands_count, self.branch.nozzles_count), (2, 4)
+        )
+
+        response = self.client.get(reverse("sucursal_list"))
+        self.assertContains(response, self.branch.name)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse("sucursal_list"))
+        self._build_topology(self.branch, islands=3, first=3)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse("sucursal_list"))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_machine_numeral_accessors_are_read_only_and_prefetch_aware(self):
+        island = Island.objects.create(sucursal=self.branch, number=1)
+        inventories = [
+            FuelInventory.objects.create(
+                sucursal=self.branch,
+                code=code,
+                fuel_type=fuel_type,
+                capacity=Decimal("1000"),
+                liters=Decimal("500"),
+            )
+            for code, fuel_type in (("E1", "93"), ("E2", "Diesel"))
+        ]
+        machine = Machine.objects.create(island=island, number=1)
+        machine.fuel_inventories.set(inventories)
+
+        self.assertEqual(machine.numeral, Decimal("0"))
+        self.assertEqual(machine.get_numerals_for_inventory(inventories[0]), [])
+        self.assertFalse(MachineFuelInventoryNumeral.objects.exists())
+
+        self.assertEqual(provision_machine_numerals([machine]), 2)
+        self.assertEqual(machine.provision_numerals(), 0)
+        MachineFuelInventoryNumeral.objects.filter(fuel_inventory=inventories[0]).update(
+            numeral=Decimal("12.5")
+        )
+
+        machine = Machine.objects.prefetch_related(
+            "fuel_inventories", "fuel_numerals"
+        ).get(pk=machine.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(machine.primary_fuel_inventory, inventories[0])
+            self.assertEqual(machine.numeral, Decimal("12.5"))
+            self.assertEqual(machine.fuel_types, ["93", "Diesel"])
+            self.assertEqual(
+                [numeral.slot for numeral in machine.get_numerals_for_inventory(inventories[1])],
+                [1],
+            )
+
+    def _build_admin_rows(self, index: int) -> None:
+        branch = Sucursal.objects.create(
+            company=self.company,
+            name=f"Sucursal Admin {index}",
+            address="Calle 2",
+            city="Santiago",
+            region="Metropolitana",
+            phone="123456789",
+            email=f"admin{index}@example.com",
+        )
+        inventory = FuelInventory.objects.create(
+            sucursal=branch,
+            code="E1",
+            fuel_type="93",
+            capacity=Decimal("1000"),
+            liters=Decimal("500"),
+        )
+        island = Island.objects.create(sucursal=branch, number=1)
+        machine = Machine.objects.create(island=island, number=1, fuel_inventory=inventory)
+        machine.provision_numerals()
+        nozzle = Nozzle.objects.create(
+            machine=machine, number=1, fuel_numeral=machine.fuel_numerals.get()
+        )
+        shift = Shift.objects.create(
+            sucursal=branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        product = BranchProduct.objects.create(
+            sucursal=branch,
+            product_type="Aceite",
+            quantity=10,
+            arrival_date=timezone.localdate(),
+            batch_number="L1",
+            value=Decimal("1000"),
+        )
+        ServiceSessionFuelLoad.objects.create(
+            service_session=session,
+            inventory=inventory,
+            liters_added=Decimal("10"),
+            invoice_number=f"F{index}",
+            responsible=self.owner_profile,
+            driver_name="Chofer",
+            license_plate="AB1234",
+            date=timezone.localdate(),
+        )
+        ServiceSessionProductLoad.objects.create(
+            service_session=session,
+            product=product,
+            quantity_added=1,
+            responsible=self.owner_profile,
+            date=timezone.localdate(),
+        )
+        ServiceSessionProductSale.objects.create(
+            service_session=session, responsible=self.owner_profile
+        )
+        ServiceSessionCreditSale.objects.create(
+            service_session=session,
+            customer_name="Cliente",
+            fuel_inventory=inventory,
+            amount=Decimal("100"),
+            responsible=self.owner_profile,
+        )
+        ServiceSessionTransbankVoucher.objects.create(
+            service_session=session,
+            responsible=self.owner_profile,
+            total_amount=Decimal("100"),
+        )
+        ServiceSessionFirefighterPayment.objects.create(
+            service_session=session,
+            firefighter=self.owner_profile,
+            amount=Decimal("100"),
+        )
+        DispenseEvent.objects.create(
+            uid=f"UID{index}",
+            litros=1.5,
+            nozzle=nozzle,
+            fuel_numeral=nozzle.fuel_numeral,
+            firefighter=self.owner_profile,
+            service_session=session,
+        )
+
+    def test_admin_changelists_run_a_constant_number_of_queries(self):
+        self.owner_user.is_staff = True
+        self.owner_user.is_superuser = True
+        self.owner_user.save()
+        models = (
+            Sucursal,
+            FuelInventory,
+            BranchProduct,
+            Island,
+            Machine,
+            Nozzle,
+            Shift,
+            ServiceSession,
+            ServiceSessionFuelLoad,
+            ServiceSessionProductLoad,
+            ServiceSessionProductSale,
+            ServiceSessionCreditSale,
+            BranchCreditBalance,
+            ServiceSessionTransbankVoucher,
+            ServiceSessionFirefighterPayment,
+            DispenseEvent,
+        )
+        urls = {
+            model: reverse(
+                f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+            )
+            for model in models
+        }
+
+        def count_queries() -> dict:
+            counts = {}
+            for model, url in urls.items():
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                counts[model] = len(queries.captured_queries)
+            return counts
+
+        self._build_admin_rows(1)
+        count_queries()
+        small = count_queries()
+        self._build_admin_rows(2)
+        self._build_admin_rows(3)
+        count_queries()
+        large = count_queries()
+        for model in models:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(large[model], small[model])
+
+        machine = Machine.objects.filter(island__sucursal__name="Sucursal Admin 1").get()
+        machine.fuel_numerals.update(numeral=Decimal("42.5"))
+        response = self.client.get(urls[Machine])
+        numerals = {
+            row.pk: row.primary_numeral for row in response.context["cl"].result_list
+        }
+        self.assertEqual(numerals[machine.pk], Decimal("42.5"))
+
+    def test_sessions_records_and_dispense_events_carry_their_branch(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        inventory = FuelInventory.objects.create(
+            sucursal=self.branch,
+            code="E1",
+            fuel_type="93",
+            capacity=Decimal("1000"),
+            liters=Decimal("500"),
+        )
+        credit = ServiceSessionCreditSale.objects.create(
+            service_session=ServiceSession.objects.get(pk=session.pk),
+            customer_name="Cliente",
+            fuel_inventory=inventory,
+            amount=Decimal("100"),
+            responsible=self.owner_profile,
+        )
+        island = Island.objects.create(sucursal=self.branch, number=1)
+        machine = Machine.objects.create(island=island, number=1)
+        nozzle = Nozzle.objects.create(machine=machine, number=1)
+        event = DispenseEvent.objects.create(uid="UID", litros=1.0, nozzle=nozzle)
+        self.assertEqual(
+            (session.branch_id, credit.branch_id, event.branch_id),
+            (self.branch.pk,) * 3,
+        )
+
+        with self.assertNumQueries(1) as queries:
+            list(ServiceSession.objects.filter(branch=self.branch, ended_at__isnull=True))
+        self.assertNotIn("sucursalApp_shift", queries.captured_queries[0]["sql"])
+
+        # Filas escritas sin save() se completan con el comando.
+        ServiceSession.objects.update(branch=None)
+        ServiceSessionCreditSale.objects.update(branch=None)
+        DispenseEvent.objects.update(branch=None)
+        call_command("backfill_session_branches", stdout=StringIO())
+        session.refresh_from_db()
+        credit.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(
+            (session.branch_id, credit.branch_id, event.branch_id),
+            (self.branch.pk,) * 3,
+        )
+
+        # Cambiar el turno a otra sucursal arrastra los registros y el saldo.
+        other_branch = Sucursal.objects.create(
+            company=self.company,
+            name="Sucursal Norte",
+            address="Calle 2",
+            city="Santiago",
+            region="Metropolitana",
+            phone="987654321",
+            email="norte@example.com",
+        )
+        other_shift = Shift.objects.create(
+            sucursal=other_branch,
+            code="T2",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        event.service_session = session
+        event.save()
+        session.shift = other_shift
+        session.save()
+        credit.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(
+            (session.branch_id, credit.branch_id, event.branch_id),
+            (other_branch.pk,) * 3,
+        )
+        balances = dict(
+            BranchCreditBalance.objects.values_list("sucursal_id", "pending_amount")
+        )
+        self.assertEqual(
+            balances, {self.branch.pk: Decimal("0"), other_branch.pk: Decimal("100")}
+        )
+
+    def test_principal_is_loaded_once_and_invalidated_by_staff_changes(self):
+        # Perfil, personal y sucursales de la empresa: una consulta cada uno.
+        with self.assertNumQueries(3):
+            owner = load_principal(self.owner_user.pk)
+        self.assertTrue(owner.is_owner)
+        self.assertEqual(owner.company_id, self.company.pk)
+        self.assertEqual(owner.branch_ids, {self.branch.pk})
+
+        admin_user = User.objects.create_user(username="admin", password="password123")
+        admin_profile = Profile.objects.create(
+            user_FK=admin_user, position_FK=self.admin_position
+        )
+        session = SessionStore()
+        session.create()
+        request = RequestFactory().get("/")
+        request.user = admin_user
+        request.session = session
+
+        self.assertEqual(get_principal(request).branch_ids, frozenset())
+        with self.assertNumQueries(0):
+            self.assertFalse(get_principal(request).has_role("OWNER"))
+
+        SucursalStaff.objects.create(
+            sucursal=self.branch, profile=admin_profile, role="ADMINISTRATOR"
+        )
+        principal = get_principal(request)
+        self.assertEqual(principal.branch_ids, {self.branch.pk})
+        self.assertEqual(principal.admin_branch_ids, {self.branch.pk})
+        self.assertTrue(principal.has_role(["ADMINISTRATOR"]))
+
+    def test_principal_invalidation_only_reaches_affected_users(self):
+        def request_for(user):
+            session = SessionStore()
+            session.create()
+            request = RequestFactory().get("/")
+            request.user = user
+            request.session = session
+            return request
+
+        other_branch = Sucursal.objects.create(
+            company=self.company,
+            name="Sucursal Norte",
+            address="Calle 2",
+            city="Ciudad",
+            region="Región",
+        )
+        admin_user = User.objects.create_user(username="admin", password="password123")
+        admin_profile = Profile.objects.create(
+            user_FK=admin_user, position_FK=self.admin_position
+        )
+        SucursalStaff.objects.create(
+            sucursal=self.branch, profile=admin_profile, role="ADMINISTRATOR"
+        )
+        SucursalStaff.objects.create(
+            sucursal=other_branch, profile=admin_profile, role="ACCOUNTANT"
+        )
+        owner_request = request_for(self.owner_user)
+        admin_request = request_for(admin_user)
+        self.assertEqual(
+            get_principal(admin_request).branch_ids, {self.branch.pk, other_branch.pk}
+        )
+        self.assertEqual(get_principal(admin_request).admin_branch_ids, {self.branch.pk})
+        get_principal(owner_request)
+
+        admin_profile.save()
+        with self.assertNumQueries(0):
+            get_principal(owner_request)
+        with self.assertNumQueries(2):
+            get_principal(admin_request)
+
+        third_branch = Sucursal.objects.create(
+            company=self.company,
+            name="Sucursal Sur",
+            address="Calle 3",
+            city="Ciudad",
+            region="Región",
+        )
+        self.assertIn(third_branch.pk, get_principal(owner_request).branch_ids)
+        with self.assertNumQueries(0):
+            get_principal(admin_request)
+
+        other_branch.delete()
+        self.assertEqual(get_principal(admin_request).branch_ids, {self.branch.pk})
+
+    def test_with_financials_computes_profits_in_sql(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift)
+        ServiceSessionWithdrawal.objects.create(
+            service_session=session, responsible=self.owner_profile, amount=Decimal("300")
+        )
+        ServiceSessionTransbankVoucher.objects.create(
+            service_session=session,
+            responsible=self.owner_profile,
+            total_amount=Decimal("200"),
+        )
+        ServiceSessionFirefighterPayment.objects.create(
+            service_session=session, firefighter=self.owner_profile, amount=Decimal("50")
+        )
+
+        with self.assertNumQueries(1):
+            annotated = ServiceSession.objects.with_financials().get(pk=session.pk)
+        self.assertEqual(annotated.withdrawal_count, 1)
+        self.assertEqual(annotated.voucher_total, Decimal("200"))
+        self.assertEqual(annotated.credit_total, Decimal("0"))
+        self.assertEqual(annotated.turn_profit, Decimal("500"))
+        self.assertEqual(annotated.net_turn_profit, Decimal("450"))
+
+    def test_export_jobs_are_processed_and_cached(self):
+        shift = Shift.objects.create(
+            sucursal=self.branch,
+            code="T1",
+            start_time=time(8, 0),
+            end_time=time(16, 0),
+            manager=self.owner_profile,
+        )
+        session = ServiceSession.objects.create(shift=shift, ended_at=timezone.now())
+        create_url = reverse("export_job_create", args=[self.branch.pk])
+
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        exports_root = self.enterContext(tempfile.TemporaryDirectory())
+        with self.settings(MEDIA_ROOT=media_root, EXPORTS_ROOT=exports_root):
+            response = self.client.post(create_url, {"kind": "history", "format": "csv"})
+            self.assertEqual(response.status_code, 202)
+            job_data = response.json()
+            self.assertEqual(job_data["status"], ExportJob.Status.PENDING)
+            self.assertIsNone(job_data["download_url"])
+
+            call_command("process_export_jobs", "--once", stdout=StringIO())
+            job_data = self.client.get(job_data["status_url"]).json()
+            self.assertEqual(job_data["status"], ExportJob.Status.DONE)
+            self.assertEqual(job_data["progress"], 100)
+
+            response = self.client.get(job_data["download_url"])
+            content = b"".join(response.streaming_content).decode("utf-8-sig")
+            self.assertEqual(len(content.splitlines()), 2)
+            # El archivo queda fuera de MEDIA_ROOT, con un nombre no adivinable.
+            job = ExportJob.objects.get(pk=job_data["id"])
+            self.assertTrue(job.file.path.startswith(exports_root))
+            self.assertNotIn(self.branch.name, job.file.name)
+            self.assertEqual(os.listdir(media_root), [])
+            self.assertIn(
+                "historial_servicios_", response["Content-Disposition"]
+            )
+
+            cached = self.client.post(create_url, {"kind": "history", "format": "csv"})
+            self.assertEqual(cached.json()["id"], job_data["id"])
+            self.assertIsNotNone(cached.json()["download_url"])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                ServiceSessionWithdrawal.objects.create(
+                    service_session=session,
+                    responsible=self.owner_profile,
+                    amount=Decimal("10"),
+                )
+            refreshed = self.client.post(
+                create_url, {"kind": "history", "format": "csv"}
+            )
+            self.assertNotEqual(refreshed.json()["id"], job_data["id"])
+
+            # La nueva versión borra el archivo de la anterior.
+            old_path = job.file.path
+            call_command("process_export_jobs", "--once", stdout=StringIO())
+            job.refresh_from_db()
+            self.assertFalse(job.file)
+            self.assertFalse(os.path.exists(old_path))
+
+            # Cambiar el código del turno también invalida la exportación.
+            shift.code = "T9"
+            shift.save()
+            renamed = self.client.post(create_url, {"kind": "history", "format": "csv"})
+            self.assertNotEqual(renamed.json()["id"], refreshed.json()["id"])
+
+            # Un trabajo que quedó "en proceso" tras caerse el worker no se
+            # reutiliza y el worker lo marca como fallido.
+            ExportJob.objects.filter(pk=renamed.json()["id"]).update(
+                status=ExportJob.Status.RUNNING,
+                started_at=timezone.now() - timedelta(hours=1),
+            )
+            retried = self.client.post(create_url, {"kind": "history", "format": "csv"})
+            self.assertNotEqual(retried.json()["id"], renamed.json()["id"])
+            call_command("process_export_jobs", "--once", stdout=StringIO())
+            self.assertEqual(
+                ExportJob.objects.get(pk=renamed.json()["id"]).status,
+                ExportJob.Status.FAILED,
+            )
+            self.assertEqual(
+                ExportJob.objects.get(pk=retried.json()["id"]).status,
+                ExportJob.Status.DONE,
+            )
+
     def test_owner_can_edit_related_entities(self):
         island = Island.objects.create(
             sucursal=self.branch, number=2, description="Isla original"
@@ -9,6 +9,11 @@ urlpatterns = [
     path("nueva/", views.SucursalCreateView.as_view(), name="sucursal_create"),
     path("<int:pk>/editar/", views.SucursalUpdateView.as_view(), name="sucursal_update"),
     path("<int:pk>/eliminar/", views.SucursalDeleteView.as_view(), name="sucursal_delete"),
+    path(
+        "<int:pk>/modales/<slug:modal_kind>/<int:object_pk>/",
+        views.SucursalModalFormView.as_view(),
+        name="sucursal_modal_form",
+    ),
     path(
         "<int:pk>/personal/",
         views.BranchStaffManageView.as_view(),
@@ -24,6 +29,26 @@ urlpatterns = [
         ServiceHistoryExportView.as_view(),
         name="service_history_export",
     ),
+    path(
+        "servicios/exportar-historial-empresa/",
+        views.CompanyHistoryExportView.as_view(),
+        name="company_history_export",
+    ),
+    path(
+        "<int:branch_pk>/exportaciones/nueva/",
+        views.ExportJobCreateView.as_view(),
+        name="export_job_create",
+    ),
+    path(
+        "exportaciones/<int:pk>/",
+        views.ExportJobStatusView.as_view(),
+        name="export_job_status",
+    ),
+    path(
+        "exportaciones/<int:pk>/descargar/",
+        views.ExportJobDownloadView.as_view(),
+        name="export_job_download",
+    ),
     path(
         "<int:branch_pk>/turnos/nuevo/",
         views.ShiftCreateView.as_view(),
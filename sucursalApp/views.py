@@ -2,10 +2,7 @@ from collections import defaultdict
 from decimal import Decimal, ROUND_HALF_UP
 import calendar
 import csv
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font
+import tempfile
 
 from typing import Any, Dict, List
 from urllib.parse import urlencode
@@ -13,14 +10,34 @@ from urllib.parse import urlencode
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import DecimalField, F, Prefetch, QuerySet, Sum, Value
+from django.db.models import (
+    DecimalField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    QuerySet,
+    Sum,
+    Value,
+    prefetch_related_objects,
+)
 from django.db.models.functions import Coalesce
-from django.http import Http404, HttpResponseRedirect, HttpResponse
-from django.shortcuts import get_object_or_404, redirect
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.template.defaultfilters import slugify
 
 from django.views import View
@@ -30,8 +47,28 @@ from django.views.generic.edit import FormMixin
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormView
 from core.mixins import RoleRequiredMixin
+from core.principal import request_principal
 from homeApp.models import Company
 from UsuarioApp.models import Profile
+from .exports import (
+    ARROW_CONTENT_TYPE,
+    HISTORY_EXPORT_CHUNK_SIZE,
+    HISTORY_EXPORT_FORMATS,
+    SUMMARY_EXPORT_HEADERS,
+    XLSX_CONTENT_TYPE,
+    arrow_export_available,
+    company_history_queryset,
+    company_history_totals,
+    export_job_filename,
+    filter_closed_sessions,
+    iter_history_rows,
+    iter_summary_rows,
+    request_export_job,
+    stream_history_csv,
+    write_company_history_xlsx,
+    write_history_arrow,
+    write_history_xlsx,
+)
 from .forms import (
     BranchProductForm,
     FuelInventoryForm,
@@ -56,7 +93,10 @@ from .forms import (
 )
 from iotApp.models import DispenseEvent
 from .models import (
+    BranchCreditBalance,
+    BranchDailyProfit,
     BranchProduct,
+    ExportJob,
     FuelInventory,
     FuelPrice,
     Island,
@@ -76,6 +116,7 @@ from .models import (
     ServiceSession,
     Sucursal,
     SucursalStaff,
+    provision_machine_numerals,
 )
 
 
@@ -87,75 +128,93 @@ def redirect_to_modal(branch_id: int, modal_name: str) -> HttpResponseRedirect:
     return HttpResponseRedirect(f"{base_url}?{query}")
 
 
-def get_admin_branch_ids(profile) -> List[int]:
-    """Return the branch IDs managed by the given administrator profile."""
+CREDIT_LEDGER_PAGE_SIZE = 20
 
-    if not profile or not getattr(profile, "is_admin", None) or not profile.is_admin():
-        return []
 
-    branch_ids = set(
-        SucursalStaff.objects.filter(
-            profile=profile, role="ADMINISTRATOR"
-        ).values_list("sucursal_id", flat=True)
-    )
+def _encode_credit_cursor(credit_sale: ServiceSessionCreditSale) -> str:
+    return f"{credit_sale.created_at.isoformat()}_{credit_sale.pk}"
 
-    current_branch_id = getattr(profile, "current_branch_id", None)
-    if current_branch_id:
-        branch_ids.add(current_branch_id)
 
-    branch_ids.discard(None)
-    return list(branch_ids)
+def _decode_credit_cursor(raw_cursor: str):
+    created_raw, _, pk_raw = (raw_cursor or "").rpartition("_")
+    created_at = parse_datetime(created_raw) if created_raw else None
+    if created_at is None or not pk_raw.isdigit():
+        return None
+    return created_at, int(pk_raw)
 
 
-class OwnerCompanyMixin(LoginRequiredMixin, RoleRequiredMixin):
-    allowed_roles = ["OWNER"]
+def build_credit_ledger(
+    branch: Sucursal, params, page_size: int = CREDIT_LEDGER_PAGE_SIZE
+) -> Dict[str, Any]:
+    """Return one keyset-paginated page of the branch credit sales.
 
-    def get_company(self) -> Company | None:
-        profile = getattr(self.request.user, "profile", None)
-        if not profile:
-            return None
-        try:
-            return profile.company
-        except Company.DoesNotExist:
-            return None
-    def get_managed_branch_ids(self) -> List[int]:
-        if hasattr(self, "_managed_branch_ids"):
-            return self._managed_branch_ids  # type: ignore[attr-defined]
+    Pages are ordered by ``(-created_at, -pk)`` and the next page starts after
+    the last row shown, so the cost of a page does not grow with the history.
+    """
 
-        company = self.get_company()
-        if company is not None:
-            branch_ids = list(company.branches.values_list("pk", flat=True))
-        else:
-            profile = getattr(self.request.user, "profile", None)
-            # Collect branch ids from SucursalStaff memberships (any role)
-            branch_ids_set: set[int] = set()
-            if profile:
-                staff_branch_ids = list(
-                    SucursalStaff.objects.filter(profile=profile).values_list(
-                        "sucursal_id", flat=True
-                    )
-                )
-                for bid in staff_branch_ids:
-                    if bid:
-                        branch_ids_set.add(bid)
+    status = params.get("credit_status") or ""
+    customer = (params.get("credit_customer") or "").strip()
+    cursor = _decode_credit_cursor(params.get("credit_cursor") or "")
 
-                # Also include the profile.current_branch if set
-                current_branch_id = getattr(profile, "current_branch_id", None)
-                if current_branch_id:
-                    branch_ids_set.add(current_branch_id)
+    queryset = (
+        ServiceSessionCreditSale.objects.filter(
+            branch=branch
+        )
+        .select_related("service_session__shift", "responsible__user_FK")
+        .order_by("-created_at", "-pk")
+    )
+    if status in ServiceSessionCreditSale.Status.values:
+        queryset = queryset.filter(status=status)
+    else:
+        status = ""
+    if customer:
+        queryset = queryset.filter(customer_name__icontains=customer)
+    if cursor:
+        created_at, pk = cursor
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+
+    credit_sales = list(queryset[: page_size + 1])
+    has_next = len(credit_sales) > page_size
+    credit_sales = credit_sales[:page_size]
+
+    query_params = params.copy()
+    query_params.pop("credit_cursor", None)
+    first_querystring = query_params.urlencode()
+    next_querystring = ""
+    if has_next:
+        query_params["credit_cursor"] = _encode_credit_cursor(credit_sales[-1])
+        next_querystring = query_params.urlencode()
+
+    return {
+        "credit_sales": credit_sales,
+        "has_next": has_next,
+        "is_first_page": cursor is None,
+        "next_querystring": next_querystring,
+        "first_querystring": first_querystring,
+        "filters": {"status": status, "customer": customer},
+        "status_choices": ServiceSessionCreditSale.Status.choices,
+    }
 
-                # If the profile is an admin, include admin-managed branches as well
-                if getattr(profile, "is_admin", None) and profile.is_admin():
-                    for bid in get_admin_branch_ids(profile):
-                        if bid:
-                            branch_ids_set.add(bid)
 
-            branch_ids = list(branch_ids_set)
+class OwnerCompanyMixin(LoginRequiredMixin, RoleRequiredMixin):
+    allowed_roles = ["OWNER"]
 
-        # Ensure unique values and ignore None entries
-        branch_ids = [b for i, b in enumerate(branch_ids) if b is not None and b not in branch_ids[:i]]
-        self._managed_branch_ids = branch_ids  # type: ignore[attr-defined]
-        return branch_ids
+    @property
+    def principal(self):
+        return request_principal(self.request)
+
+    def get_company(self) -> Company | None:
+        if not hasattr(self, "_company"):
+            company_id = self.principal.company_id
+            self._company = (
+                Company.objects.filter(pk=company_id).first() if company_id else None
+            )
+        return self._company
+
+    def get_managed_branch_ids(self) -> List[int]:
+        return sorted(self.principal.branch_ids)
 
     def get_managed_branches_queryset(self) -> QuerySet[Sucursal]:
         branch_ids = self.get_managed_branch_ids()
@@ -210,39 +269,19 @@ class SucursalListView(OwnerCompanyMixin, FormMixin, ListView):
         branch_ids = self.get_managed_branch_ids()
         if not branch_ids:
             return Sucursal.objects.none()
+        # Los conteos de islas, máquinas y pistolas vienen anotados; solo se
+        # precarga el personal que muestra la tabla.
         return (
             Sucursal.objects.filter(pk__in=branch_ids)
             .select_related("company")
+            .with_counts()
             .prefetch_related(
-                Prefetch(
-                    "branch_islands",
-                    queryset=Island.objects.prefetch_related(
-                        Prefetch(
-                            "machines",
-                            queryset=Machine.objects.prefetch_related("nozzles"),
-                        )
-                    ),
-                ),
-                Prefetch(
-                    "fuel_inventories",
-                    queryset=FuelInventory.objects.order_by("code"),
-                ),
-                Prefetch(
-                    "products",
-                    queryset=BranchProduct.objects.order_by("product_type", "arrival_date"),
-                ),
                 Prefetch(
                     "staff",
                     queryset=SucursalStaff.objects.select_related(
                         "profile__user_FK", "profile__position_FK"
                     ),
                 ),
-                Prefetch(
-                    "shifts",
-                    queryset=Shift.objects.select_related(
-                        "manager__user_FK", "manager__position_FK"
-                    ),
-                ),
             )
         )
 
@@ -298,8 +337,17 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
                     queryset=Island.objects.order_by("number").prefetch_related(
                         Prefetch(
                             "machines",
-                            queryset=Machine.objects.order_by("number").prefetch_related(
-                                "nozzles"
+                            queryset=Machine.objects.order_by("number")
+                            .select_related("fuel_inventory")
+                            .annotate(
+                                has_positive_numerals=Exists(
+                                    MachineFuelInventoryNumeral.objects.filter(
+                                        machine=OuterRef("pk"), numeral__gt=0
+                                    )
+                                )
+                            )
+                            .prefetch_related(
+                                "nozzles", "fuel_inventories", "fuel_numerals"
                             ),
                         )
                     ),
@@ -354,14 +402,7 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
                 .prefetch_related("attendants__user_FK", "attendants__position_FK")
                 .order_by("start_time")
             )
-            shifts = list(shift_queryset)
-            for shift in shifts:
-                shift.update_form = ShiftForm(
-                    instance=shift,
-                    sucursal=self.object,
-                    auto_id=f"edit-shift-{shift.pk}_%s",
-                )
-            context["shifts"] = shifts
+            context["shifts"] = list(shift_queryset)
             profile = getattr(self.request.user, "profile", None)
             # Only owners and administrators can edit the branch
             can_edit_branch = bool(
@@ -389,10 +430,6 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
                     ),
                 )
             fuel_inventories = list(self.object.fuel_inventories.all())
-            for inventory in fuel_inventories:
-                inventory.update_form = FuelInventoryForm(
-                    instance=inventory, auto_id=f"edit-inventory-{inventory.pk}_%s"
-                )
             context["fuel_inventories"] = fuel_inventories
             fuel_types = sorted({inventory.fuel_type for inventory in fuel_inventories})
             fuel_price_forms: dict[str, FuelPriceForm] = {}
@@ -429,40 +466,19 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
             context["fuel_inventory_create_url"] = reverse(
                 "sucursal_fuel_inventory_create", args=[self.object.pk]
             )
-            products = list(self.object.products.all())
-            for product in products:
-                product.update_form = BranchProductForm(
-                    instance=product, auto_id=f"edit-product-{product.pk}_%s"
-                )
-            context["products"] = products
+            context["products"] = list(self.object.products.all())
             context["product_create_form"] = BranchProductForm(
                 initial={"sucursal": self.object}, auto_id="new-product_%s"
             )
             context["product_create_url"] = reverse(
                 "sucursal_product_create", args=[self.object.pk]
             )
-            branch_credit_sales = (
-                ServiceSessionCreditSale.objects.filter(
-                    service_session__shift__sucursal=self.object
-                )
-                .select_related(
-                    "service_session__shift",
-                    "responsible__user_FK",
-                    "fuel_inventory",
-                )
-                .order_by("-created_at")
-            )
-            context["branch_credit_sales"] = branch_credit_sales
-            context["branch_credit_sales_count"] = branch_credit_sales.count()
-            context["branch_credit_sales_total"] = (
-                branch_credit_sales.aggregate(
-                    total=Coalesce(
-                        Sum("amount"),
-                        Value(0),
-                        output_field=DecimalField(max_digits=12, decimal_places=2),
-                    )
-                )["total"]
-                or 0
+            credit_ledger = build_credit_ledger(self.object, self.request.GET)
+            context["credit_ledger"] = credit_ledger
+            context["branch_credit_sales"] = credit_ledger["credit_sales"]
+            context["credit_balance"] = (
+                BranchCreditBalance.objects.filter(sucursal=self.object).first()
+                or BranchCreditBalance(sucursal=self.object)
             )
             # --- filtros desde la URL (GET) para el historial ---
             year = self.request.GET.get("year") or ""
@@ -470,11 +486,15 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
             shift_query = self.request.GET.get("shift") or ""
 
             # --- queryset base de sesiones cerradas de esta sucursal ---
-            closed_service_sessions_qs = (
-                ServiceSession.objects.filter(
-                    shift__sucursal=self.object,
-                    ended_at__isnull=False,
-                )
+            closed_service_sessions_qs = ServiceSession.objects.filter(
+                branch=self.object,
+                ended_at__isnull=False,
+            )
+
+            # --- totales calculados en SQL; el detalle solo para la página ---
+            filtered_sessions = (
+                filter_closed_sessions(closed_service_sessions_qs, self.request.GET)
+                .with_financials()
                 .select_related("shift__manager__user_FK")
                 .prefetch_related(
                     "attendants__user_FK",
@@ -521,154 +541,60 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
                         ),
                     ),
                 )
-                .order_by("-ended_at")
+                .order_by("-ended_at", "-pk")
             )
 
-            # --- aplicar filtros sobre el queryset base ---
-            filtered_sessions = closed_service_sessions_qs
-
-            if year.isdigit():
-                filtered_sessions = filtered_sessions.filter(
-                    ended_at__year=int(year)
-                )
-
-            if month.isdigit():
-                filtered_sessions = filtered_sessions.filter(
-                    ended_at__month=int(month)
-                )
-
-            if shift_query:
-                filtered_sessions = filtered_sessions.filter(
-                    shift__code__icontains=shift_query
-                )
+            paginator = Paginator(filtered_sessions, 5)
+            page_number = self.request.GET.get("history_page") or 1
+            service_history_page = paginator.get_page(page_number)
 
-            # --- construir registros de historial con el queryset filtrado ---
+            # --- construir registros de historial de la página actual ---
             history_records = []
-            decimal_zero = Decimal("0")
             flow_mismatch_labels = dict(ServiceSession.FLOW_MISMATCH_CHOICES)
 
-            for session in filtered_sessions:
-                credit_sales = list(session.credit_sales.all())
-                fuel_loads = list(session.fuel_loads.all())
-                product_loads = list(session.product_loads.all())
-                product_sales = list(session.product_sales.all())
-                withdrawals = list(session.withdrawals.all())
-                vouchers = list(session.transbank_vouchers.all())
-                firefighter_payments = list(session.firefighter_payments.all())
-
-                product_sale_items_total = sum(
-                    (
-                        item.quantity
-                        for sale in product_sales
-                        for item in sale.items.all()
-                    ),
-                    0,
-                )
-                product_sale_value_total = sum(
-                    (
-                        item.quantity * item.product.value
-                        for sale in product_sales
-                        for item in sale.items.all()
-                    ),
-                    decimal_zero,
-                )
-                credit_total = sum(
-                    ((credit.amount or decimal_zero) for credit in credit_sales),
-                    decimal_zero,
-                )
-                fuel_load_payment_total = sum(
-                    (
-                        (load.payment_amount or decimal_zero)
-                        for load in fuel_loads
-                    ),
-                    decimal_zero,
-                )
-                product_load_payment_total = sum(
-                    (
-                        (load.payment_amount or decimal_zero)
-                        for load in product_loads
-                    ),
-                    decimal_zero,
-                )
-                withdrawal_total = sum(
-                    ((withdrawal.amount or decimal_zero) for withdrawal in withdrawals),
-                    decimal_zero,
-                )
-                voucher_total = sum(
-                    ((voucher.total_amount or decimal_zero) for voucher in vouchers),
-                    decimal_zero,
-                )
-                firefighter_payments_total = sum(
-                    (
-                        (payment.amount or decimal_zero)
-                        for payment in firefighter_payments
-                    ),
-                    decimal_zero,
-                )
-
-                turn_profit = (
-                    credit_total
-                    + voucher_total
-                    + withdrawal_total
-                    + product_sale_value_total
-                )
-                net_turn_profit = (
-                    turn_profit
-                    - fuel_load_payment_total
-                    - firefighter_payments_total
-                    - product_load_payment_total
-                )
+            for session in service_history_page.object_list:
                 history_records.append(
                     {
                         "session": session,
                         "shift_schedule": f"{session.shift.start_time:%H:%M} - {session.shift.end_time:%H:%M}",
                         "attendants": session.get_attendant_names(),
-                        "credit_sales": credit_sales,
-                        "credit_count": len(credit_sales),
-                        "credit_total": credit_total,
-                        "withdrawals": withdrawals,
-                        "fuel_load_count": len(fuel_loads),
-                        "fuel_loads": fuel_loads,
-                        "fuel_load_liters": sum(
-                            ((load.liters_added or decimal_zero) for load in fuel_loads),
-                            decimal_zero,
-                        ),
-                        "fuel_load_payment_total": fuel_load_payment_total,
-                        "product_loads": product_loads,
-                        "product_load_count": len(product_loads),
-                        "product_load_quantity": sum(
-                            (load.quantity_added or 0) for load in product_loads
-                        ),
-                        "product_load_payment_total": product_load_payment_total,
-                        "product_sales": product_sales,
-                        "product_sales_count": len(product_sales),
-                        "product_sales_items": product_sale_items_total,
-                        "product_sales_value": product_sale_value_total,
-                        "vouchers": vouchers,
-                        "withdrawal_total": withdrawal_total,
-                        "voucher_total": voucher_total,
-                        "firefighter_payments": firefighter_payments,
-                        "firefighter_payments_total": firefighter_payments_total,
+                        "credit_sales": list(session.credit_sales.all()),
+                        "credit_count": session.credit_count,
+                        "credit_total": session.credit_total,
+                        "withdrawals": list(session.withdrawals.all()),
+                        "fuel_load_count": session.fuel_load_count,
+                        "fuel_loads": list(session.fuel_loads.all()),
+                        "fuel_load_liters": session.fuel_load_liters,
+                        "fuel_load_payment_total": session.fuel_load_payment_total,
+                        "product_loads": list(session.product_loads.all()),
+                        "product_load_count": session.product_load_count,
+                        "product_load_quantity": session.product_load_quantity,
+                        "product_load_payment_total": session.product_load_payment_total,
+                        "product_sales": list(session.product_sales.all()),
+                        "product_sales_count": session.product_sales_count,
+                        "product_sales_items": session.product_sales_items,
+                        "product_sales_value": session.product_sales_value,
+                        "vouchers": list(session.transbank_vouchers.all()),
+                        "withdrawal_total": session.withdrawal_total,
+                        "voucher_total": session.voucher_total,
+                        "firefighter_payments": list(session.firefighter_payments.all()),
+                        "firefighter_payments_total": session.firefighter_payments_total,
                         "flow_mismatch_amount": session.flow_mismatch_amount,
                         "flow_mismatch_label": flow_mismatch_labels.get(
                             session.flow_mismatch_type,
                             flow_mismatch_labels[ServiceSession.FLOW_MISMATCH_NONE],
                         ),
                         "fuel_sales": session.fuel_sales,
-                        "turn_profit": turn_profit,
-                        "net_turn_profit": net_turn_profit,
+                        "turn_profit": session.turn_profit,
+                        "net_turn_profit": session.net_turn_profit,
                     }
                 )
 
-            paginator = Paginator(history_records, 5)
-            page_number = self.request.GET.get("history_page") or 1
-            service_history_page = paginator.get_page(page_number)
-
             query_params = self.request.GET.copy()
             query_params.pop("history_page", None)
 
             context["service_history_page"] = service_history_page
-            context["service_history"] = service_history_page.object_list
+            context["service_history"] = history_records
             context["service_history_total"] = paginator.count
             context["history_querystring"] = query_params.urlencode()
 
@@ -688,36 +614,14 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
                 "month": month,
                 "shift": shift_query,
             }
+            context["history_arrow_export"] = arrow_export_available()
 
+            # Edit/create forms for islands, machines and nozzles are rendered
+            # on demand by ``SucursalModalFormView`` when their modal is opened.
             for island in islands:
-                island.update_form = IslandForm(
-                    instance=island, auto_id=f"edit-island-{island.pk}_%s"
-                )
-                island.machine_create_form = MachineForm(
-                    initial={"island": island}, auto_id=f"new-machine-{island.pk}_%s"
-                )
                 machines = list(island.machines.all())
                 for machine in machines:
-                    machine.update_form = MachineForm(
-                        instance=machine, auto_id=f"edit-machine-{machine.pk}_%s"
-                    )
-                    if MachineFuelInventoryNumeral.objects.filter(
-                        machine=machine, numeral__gt=0
-                    ).exists():
-                        machine.nozzle_create_form = NozzleForm(
-                            auto_id=f"new-nozzle-{machine.pk}_%s",
-                            initial={"machine": machine},
-                            machine=machine,
-                        )
-                    else:
-                        machine.nozzle_create_form = None
-                    nozzles = list(machine.nozzles.all())
-                    for nozzle in nozzles:
-                        nozzle.update_form = NozzleForm(
-                            machine=machine,
-                            instance=nozzle, auto_id=f"edit-nozzle-{nozzle.pk}_%s"
-                        )
-                    machine.nozzles_list = nozzles
+                    machine.nozzles_list = list(machine.nozzles.all())
                     inventories = machine.get_fuel_inventories()
                     current_numerals = []
                     for inventory in inventories:
@@ -733,8 +637,8 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
             context.setdefault("fuel_price_entries", [])
             context.setdefault("fuel_price_forms", {})
             context.setdefault("branch_credit_sales", [])
-            context.setdefault("branch_credit_sales_count", 0)
-            context.setdefault("branch_credit_sales_total", 0)
+            context.setdefault("credit_ledger", None)
+            context.setdefault("credit_balance", None)
             context.setdefault("service_history", [])
             context.setdefault("service_history_page", None)
             context.setdefault("service_history_total", 0)
@@ -999,6 +903,105 @@ class SucursalUpdateView(OwnerCompanyMixin, UpdateView):
         return response
 
 
+class SucursalModalFormView(OwnerCompanyMixin, View):
+    """Render a single edit/create form of the branch page when its modal opens."""
+
+    allowed_roles = ["OWNER", "ADMINISTRATOR"]
+    modal_templates = {
+        "shift-edit": "pages/sucursales/modals/shift_edit_form.html",
+        "fuel-inventory-edit": "pages/sucursales/modals/fuel_inventory_edit_form.html",
+        "product-edit": "pages/sucursales/modals/product_edit_form.html",
+        "island-edit": "pages/sucursales/modals/island_edit_form.html",
+        "machine-create": "pages/sucursales/modals/machine_create_form.html",
+        "machine-edit": "pages/sucursales/modals/machine_edit_form.html",
+        "nozzle-create": "pages/sucursales/modals/nozzle_create_form.html",
+        "nozzle-edit": "pages/sucursales/modals/nozzle_edit_form.html",
+    }
+
+    def get(self, request, pk, modal_kind, object_pk, *args, **kwargs):
+        template_name = self.modal_templates.get(modal_kind)
+        if template_name is None:
+            raise Http404("Formulario no disponible.")
+        branch = get_object_or_404(self.get_managed_branches_queryset(), pk=pk)
+        builder = getattr(self, f"_build_{modal_kind.replace('-', '_')}")
+        return render(request, template_name, builder(branch, object_pk))
+
+    def _build_shift_edit(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        shift = get_object_or_404(branch.shifts.all(), pk=object_pk)
+        form = ShiftForm(
+            instance=shift, sucursal=branch, auto_id=f"edit-shift-{shift.pk}_%s"
+        )
+        return {"shift": shift, "modal_form": form}
+
+    def _build_fuel_inventory_edit(
+        self, branch: Sucursal, object_pk: int
+    ) -> Dict[str, Any]:
+        inventory = get_object_or_404(branch.fuel_inventories.all(), pk=object_pk)
+        form = FuelInventoryForm(
+            instance=inventory, auto_id=f"edit-inventory-{inventory.pk}_%s"
+        )
+        return {"inventory": inventory, "modal_form": form}
+
+    def _build_product_edit(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        product = get_object_or_404(branch.products.all(), pk=object_pk)
+        form = BranchProductForm(
+            instance=product, auto_id=f"edit-product-{product.pk}_%s"
+        )
+        return {"product": product, "modal_form": form}
+
+    def _build_island_edit(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        island = get_object_or_404(branch.branch_islands.all(), pk=object_pk)
+        form = IslandForm(instance=island, auto_id=f"edit-island-{island.pk}_%s")
+        return {"island": island, "modal_form": form}
+
+    def _build_machine_create(
+        self, branch: Sucursal, object_pk: int
+    ) -> Dict[str, Any]:
+        island = get_object_or_404(branch.branch_islands.all(), pk=object_pk)
+        form = MachineForm(
+            initial={"island": island}, auto_id=f"new-machine-{island.pk}_%s"
+        )
+        return {"island": island, "modal_form": form}
+
+    def _build_machine_edit(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        machine = get_object_or_404(
+            Machine.objects.filter(island__sucursal=branch), pk=object_pk
+        )
+        form = MachineForm(
+            instance=machine, auto_id=f"edit-machine-{machine.pk}_%s"
+        )
+        return {"machine": machine, "modal_form": form}
+
+    def _build_nozzle_create(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        machine = get_object_or_404(
+            Machine.objects.filter(
+                island__sucursal=branch,
+                fuel_numerals__numeral__gt=0,
+            ).distinct(),
+            pk=object_pk,
+        )
+        form = NozzleForm(
+            auto_id=f"new-nozzle-{machine.pk}_%s",
+            initial={"machine": machine},
+            machine=machine,
+        )
+        return {"machine": machine, "modal_form": form}
+
+    def _build_nozzle_edit(self, branch: Sucursal, object_pk: int) -> Dict[str, Any]:
+        nozzle = get_object_or_404(
+            Nozzle.objects.filter(machine__island__sucursal=branch).select_related(
+                "machine"
+            ),
+            pk=object_pk,
+        )
+        form = NozzleForm(
+            machine=nozzle.machine,
+            instance=nozzle,
+            auto_id=f"edit-nozzle-{nozzle.pk}_%s",
+        )
+        return {"nozzle": nozzle, "modal_form": form}
+
+
 class ServiceSessionSummaryExportView(OwnerCompanyMixin, View):
     """
     Exporta el resumen de un servicio (turno) a un XLSX abrible en Excel.
@@ -1008,8 +1011,6 @@ class ServiceSessionSummaryExportView(OwnerCompanyMixin, View):
     allowed_roles = ["OWNER", "ADMINISTRATOR", "ACCOUNTANT", "HEAD_ATTENDANT"]
 
     def get(self, request, branch_pk, pk, *args, **kwargs):
-        profile = request.user.profile
-
         # Validar que la sucursal está dentro del alcance del usuario
         managed_branch_ids = set(self.get_managed_branch_ids())
         if managed_branch_ids and branch_pk not in managed_branch_ids:
@@ -1017,372 +1018,210 @@ class ServiceSessionSummaryExportView(OwnerCompanyMixin, View):
 
         # Obtenemos la sesión del servicio SOLO de esa sucursal
         session = get_object_or_404(
-            ServiceSession.objects.select_related(
-                "shift__sucursal",
-                "shift__manager__user_FK",
-            ).prefetch_related(
-                "attendants__user_FK",
-                "credit_sales",
-                "fuel_loads",
-                "product_loads",
-                "product_sales__items__product",
-                "withdrawals",
-                "transbank_vouchers",
-                "firefighter_payments",
-            ),
+            ServiceSession.objects.select_related("shift"),
             pk=pk,
-            shift__sucursal_id=branch_pk,
+            branch_id=branch_pk,
         )
 
-        decimal_zero = Decimal("0")
-
-        credit_sales = list(session.credit_sales.all())
-        fuel_loads = list(session.fuel_loads.all())
-        product_loads = list(session.product_loads.all())
-        product_sales = list(session.product_sales.all())
-        withdrawals = list(session.withdrawals.all())
-        vouchers = list(session.transbank_vouchers.all())
-        firefighter_payments = list(session.firefighter_payments.all())
-
-        # === Cálculos igual que en el historial ===
-        product_sale_items_total = sum(
-            (item.quantity for sale in product_sales for item in sale.items.all()),
-            0,
-        )
-        product_sale_value_total = sum(
-            (
-                item.quantity * item.product.value
-                for sale in product_sales
-                for item in sale.items.all()
-            ),
-            decimal_zero,
+        output = tempfile.TemporaryFile()
+        write_history_xlsx(
+            iter_summary_rows(branch_pk, session.pk),
+            output,
+            title="Resumen Turno",
+            headers=SUMMARY_EXPORT_HEADERS,
         )
+        output.seek(0)
 
-        credit_total = sum(
-            ((credit.amount or decimal_zero) for credit in credit_sales),
-            decimal_zero,
+        filename = f"resumen_turno_{session.shift.code}_{session.pk}.xlsx"
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=filename,
+            content_type=XLSX_CONTENT_TYPE,
         )
 
-        fuel_load_payment_total = sum(
-            ((load.payment_amount or decimal_zero) for load in fuel_loads),
-            decimal_zero,
-        )
+class ServiceHistoryExportView(OwnerCompanyMixin, View):
+    """
+    Exporta todos los servicios cerrados de una sucursal, aplicando los
+    mismos filtros del Historial (año, mes, turno).
 
-        product_load_payment_total = sum(
-            ((load.payment_amount or decimal_zero) for load in product_loads),
-            decimal_zero,
-        )
+    El parámetro ``format`` elige el formato: ``xlsx`` (por defecto), ``csv``
+    o ``arrow`` (Arrow IPC comprimido). Los totales se calculan en la base de
+    datos y las filas se escriben sin cargar el historial completo en memoria.
+    """
 
-        withdrawal_total = sum(
-            ((withdrawal.amount or decimal_zero) for withdrawal in withdrawals),
-            decimal_zero,
-        )
+    allowed_roles = ["OWNER", "ADMINISTRATOR", "ACCOUNTANT", "HEAD_ATTENDANT"]
 
-        voucher_total = sum(
-            ((voucher.total_amount or decimal_zero) for voucher in vouchers),
-            decimal_zero,
+    def get(self, request, branch_pk, *args, **kwargs):
+        branch_ids = self.get_managed_branch_ids()
+        branch = get_object_or_404(
+            Sucursal.objects.filter(pk__in=branch_ids), pk=branch_pk
         )
 
-        firefighter_payments_total = sum(
-            ((payment.amount or decimal_zero) for payment in firefighter_payments),
-            decimal_zero,
-        )
+        export_format = (request.GET.get("format") or "xlsx").lower()
+        if export_format not in HISTORY_EXPORT_FORMATS:
+            raise Http404("Formato de exportación no soportado.")
+        if export_format == "arrow" and not arrow_export_available():
+            raise Http404("La exportación Arrow no está disponible.")
 
-        turn_profit = (
-            credit_total
-            + voucher_total
-            + withdrawal_total
-            + product_sale_value_total
-        )
+        rows = iter_history_rows(branch, request.GET)
+        filename = f"historial_servicios_{branch.name}_{branch_pk}.{export_format}"
 
-        net_turn_profit = (
-            turn_profit
-            - fuel_load_payment_total
-            - firefighter_payments_total
-            - product_load_payment_total
-        )
+        if export_format == "csv":
+            response = StreamingHttpResponse(
+                stream_history_csv(rows), content_type="text/csv; charset=utf-8"
+            )
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return response
 
-        # ================== GENERAR XLSX ==================
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Resumen Turno"
+        output = tempfile.TemporaryFile()
+        if export_format == "arrow":
+            write_history_arrow(rows, output)
+            content_type = ARROW_CONTENT_TYPE
+        else:
+            write_history_xlsx(rows, output)
+            content_type = XLSX_CONTENT_TYPE
+        output.seek(0)
 
-        headers = [
-            "FECHA",
-            "TURNO",
-            "TOTAL VENTA",
-            "CREDITO",
-            "CANT.VOUCHER",
-            "MONTO VOUCHER",
-            "CANT.TIRADA",
-            "MONTO TIRADA",
-            "PAGOS BOMBEROS",
-            "GASTO STOCK",
-            "PAGO COMBUSTIBLE",
-            "GANANCIA TURNO",
-            "GANANCIA REAL",
-        ]
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
 
-        ws.append(headers)
-
-        data_row = [
-            session.started_at.date() if session.started_at else "",
-            session.shift.code if session.shift else "",
-            float(product_sale_value_total),      # TOTAL VENTA
-            float(credit_total),                  # CREDITO
-            len(vouchers),                        # CANT.VOUCHER
-            float(voucher_total),                 # MONTO VOUCHER
-            len(withdrawals),                     # CANT.TIRADA
-            float(withdrawal_total),              # MONTO TIRADA
-            float(firefighter_payments_total),    # PAGOS BOMBEROS
-            float(product_load_payment_total),    # GASTO STOCK
-            float(fuel_load_payment_total),       # PAGO COMBUSTIBLE
-            float(turn_profit),                   # GANANCIA TURNO
-            float(net_turn_profit),               # GANANCIA REAL
-        ]
 
-        ws.append(data_row)
+class CompanyHistoryExportView(OwnerCompanyMixin, View):
+    """
+    Exporta en un solo libro el historial de todas las sucursales del
+    usuario: una hoja por sucursal y una hoja "Consolidado" con los totales.
+
+    Usa los mismos filtros del Historial (año, mes, turno): una consulta
+    para las filas de todas las sucursales y otra, agrupada por sucursal en
+    la base de datos, para el consolidado.
+    """
 
-        # Estilos básicos: negrita en header y auto-ancho
-        header_font = Font(bold=True)
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col_idx)
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
+    allowed_roles = ["OWNER", "ADMINISTRATOR", "ACCOUNTANT"]
 
-            column_letter = get_column_letter(col_idx)
-            ws.column_dimensions[column_letter].width = max(len(header) + 2, 14)
+    def get(self, request, *args, **kwargs):
+        branches = list(
+            self.get_managed_branches_queryset()
+            .select_related("company")
+            .order_by("name", "pk")
+        )
+        if not branches:
+            raise Http404("No hay sucursales para exportar.")
 
-        # Formato numérico con separador de miles
-        money_cols = range(3, 14)  # columnas C a M
-        for col_idx in money_cols:
-            cell = ws.cell(row=2, column=col_idx)
-            cell.number_format = "#,##0"
+        branch_ids = [branch.pk for branch in branches]
+        rows = company_history_queryset(branch_ids, request.GET).iterator(
+            chunk_size=HISTORY_EXPORT_CHUNK_SIZE
+        )
+        totals = company_history_totals(branch_ids, request.GET)
 
-        # Exportar a memoria y responder
-        output = BytesIO()
-        wb.save(output)
+        output = tempfile.TemporaryFile()
+        write_company_history_xlsx(branches, rows, totals, output)
         output.seek(0)
 
-        filename = f"resumen_turno_{session.shift.code}_{session.pk}.xlsx"
-        response = HttpResponse(
-            output.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        company = self.get_company() or branches[0].company
+        company_name = getattr(company, "business_name", "") or "empresa"
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"historial_servicios_{slugify(company_name)}.xlsx",
+            content_type=XLSX_CONTENT_TYPE,
         )
-        response["Content-Disposition"] = f'attachment; filename=\"{filename}\"'
-        return response
 
-class ServiceHistoryExportView(OwnerCompanyMixin, View):
-    """
-    Exporta un XLSX con todos los servicios cerrados de una sucursal,
-    aplicando los mismos filtros del Historial (año, mes, turno).
-    """
 
-    allowed_roles = ["OWNER", "ADMINISTRATOR", "ACCOUNTANT", "HEAD_ATTENDANT"]
+class ExportJobAccessMixin(OwnerCompanyMixin):
+    """Limit export jobs to the branches managed by the current user."""
 
-    def get(self, request, branch_pk, *args, **kwargs):
-        from sucursalApp.models import Sucursal, ServiceSession
-        from sucursalApp.models import (
-            ServiceSessionCreditSale,
-            ServiceSessionFuelLoad,
-            ServiceSessionProductLoad,
-            ServiceSessionProductSale,
-            ServiceSessionWithdrawal,
-            ServiceSessionTransbankVoucher,
-            ServiceSessionFirefighterPayment,
-        )
-        from django.db.models import Prefetch
+    allowed_roles = ["OWNER", "ADMINISTRATOR", "ACCOUNTANT", "HEAD_ATTENDANT"]
 
-        branch_ids = self.get_managed_branch_ids()
-        branch = get_object_or_404(
-            Sucursal.objects.filter(pk__in=branch_ids), pk=branch_pk
+    def get_job(self, pk: int) -> ExportJob:
+        return get_object_or_404(
+            ExportJob.objects.select_related("sucursal").filter(
+                sucursal_id__in=self.get_managed_branch_ids()
+            ),
+            pk=pk,
         )
 
-        # --- filtros desde la URL, mismos nombres que en el Historial ---
-        year = request.GET.get("year") or ""
-        month = request.GET.get("month") or ""
-        shift_query = request.GET.get("shift") or ""
+    def job_payload(self, job: ExportJob) -> dict[str, Any]:
+        payload = {
+            "id": job.pk,
+            "status": job.status,
+            "status_label": job.get_status_display(),
+            "progress": job.progress,
+            "total_rows": job.total_rows,
+            "error": job.error,
+            "status_url": reverse("export_job_status", args=[job.pk]),
+            "download_url": None,
+        }
+        if job.status == ExportJob.Status.DONE:
+            payload["download_url"] = reverse("export_job_download", args=[job.pk])
+        return payload
 
-        # --- queryset base: servicios cerrados de la sucursal ---
-        sessions_qs = (
-            ServiceSession.objects.filter(
-                shift__sucursal=branch,
-                ended_at__isnull=False,
-            )
-            .select_related("shift__sucursal", "shift__manager__user_FK")
-            .prefetch_related(
-                "attendants__user_FK",
-                Prefetch(
-                    "credit_sales",
-                    queryset=ServiceSessionCreditSale.objects.select_related(
-                        "responsible__user_FK", "fuel_inventory"
-                    ),
-                ),
-                Prefetch(
-                    "fuel_loads",
-                    queryset=ServiceSessionFuelLoad.objects.select_related(
-                        "responsible__user_FK", "inventory"
-                    ),
-                ),
-                Prefetch(
-                    "product_loads",
-                    queryset=ServiceSessionProductLoad.objects.select_related(
-                        "responsible__user_FK", "product"
-                    ),
-                ),
-                Prefetch(
-                    "product_sales",
-                    queryset=ServiceSessionProductSale.objects.select_related(
-                        "responsible__user_FK"
-                    ).prefetch_related("items__product"),
-                ),
-                Prefetch(
-                    "withdrawals",
-                    queryset=ServiceSessionWithdrawal.objects.select_related(
-                        "responsible__user_FK"
-                    ),
-                ),
-                Prefetch(
-                    "transbank_vouchers",
-                    queryset=ServiceSessionTransbankVoucher.objects.select_related(
-                        "responsible__user_FK"
-                    ),
-                ),
-                Prefetch(
-                    "firefighter_payments",
-                    queryset=ServiceSessionFirefighterPayment.objects.select_related(
-                        "firefighter__user_FK"
-                    ),
-                ),
-            )
-            .order_by("-ended_at")
-        )
-
-        # --- aplicar filtros (mismos que en get_context_data del Historial) ---
-        if year.isdigit():
-            sessions_qs = sessions_qs.filter(ended_at__year=int(year))
-
-        if month.isdigit():
-            sessions_qs = sessions_qs.filter(ended_at__month=int(month))
-
-        if shift_query:
-            sessions_qs = sessions_qs.filter(shift__code__icontains=shift_query)
-
-        # --- crear workbook ---
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Historial servicios"
-
-        headers = [
-            "FECHA",
-            "TURNO",
-            "TOTAL VENTA",
-            "CRÉDITO",
-            "CANT. VOUCHERS",
-            "MONTO VOUCHERS",
-            "CANT. TIRADAS",
-            "MONTO TIRADAS",
-            "PAGOS BOMBEROS",
-            "GASTO STOCK",
-            "PAGO COMBUSTIBLE",
-            "GANANCIA TURNO",
-            "GANANCIA REAL",
-        ]
 
-        ws.append(headers)
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col_idx)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-            ws.column_dimensions[get_column_letter(col_idx)].width = max(len(header) + 2, 14)
+class ExportJobCreateView(ExportJobAccessMixin, View):
+    """
+    Encola una exportación (historial o resumen de servicio) para que la
+    genere el comando ``process_export_jobs`` fuera del request.
 
-        decimal_zero = Decimal("0")
+    Si ya existe un archivo para los mismos filtros y datos, se devuelve de
+    inmediato con su URL de descarga.
+    """
 
-        # --- recorrer sesiones y calcular totales (igual que en Historial) ---
-        row = 2
-        for session in sessions_qs:
-            credit_sales = list(session.credit_sales.all())
-            fuel_loads = list(session.fuel_loads.all())
-            product_loads = list(session.product_loads.all())
-            product_sales = list(session.product_sales.all())
-            withdrawals = list(session.withdrawals.all())
-            vouchers = list(session.transbank_vouchers.all())
-            firefighter_payments = list(session.firefighter_payments.all())
-
-            product_sale_value_total = sum(
-                (
-                    item.quantity * item.product.value
-                    for sale in product_sales
-                    for item in sale.items.all()
-                ),
-                decimal_zero,
-            )
-            credit_total = sum(
-                ((c.amount or decimal_zero) for c in credit_sales),
-                decimal_zero,
-            )
-            fuel_load_payment_total = sum(
-                ((l.payment_amount or decimal_zero) for l in fuel_loads),
-                decimal_zero,
-            )
-            product_load_payment_total = sum(
-                ((l.payment_amount or decimal_zero) for l in product_loads),
-                decimal_zero,
-            )
-            withdrawal_total = sum(
-                ((w.amount or decimal_zero) for w in withdrawals),
-                decimal_zero,
-            )
-            voucher_total = sum(
-                ((v.total_amount or decimal_zero) for v in vouchers),
-                decimal_zero,
-            )
-            firefighter_payments_total = sum(
-                ((p.amount or decimal_zero) for p in firefighter_payments),
-                decimal_zero,
-            )
+    http_method_names = ["post"]
 
-            turn_profit = (
-                (session.initial_budget or decimal_zero)
-                + credit_total
-                + voucher_total
-                + withdrawal_total
-                + product_sale_value_total
-            )
-            net_turn_profit = (
-                turn_profit
-                - fuel_load_payment_total
-                - firefighter_payments_total
-                - product_load_payment_total
+    def post(self, request, branch_pk, *args, **kwargs):
+        branch = get_object_or_404(
+            Sucursal.objects.filter(pk__in=self.get_managed_branch_ids()),
+            pk=branch_pk,
+        )
+        kind = request.POST.get("kind") or ExportJob.KIND_HISTORY
+        export_format = (request.POST.get("format") or "xlsx").lower()
+        if kind not in dict(ExportJob.KIND_CHOICES):
+            return JsonResponse({"error": "Tipo de exportación no válido."}, status=400)
+        if export_format not in HISTORY_EXPORT_FORMATS or (
+            export_format == "arrow" and not arrow_export_available()
+        ):
+            return JsonResponse(
+                {"error": "Formato de exportación no soportado."}, status=400
             )
 
-            ws.cell(row=row, column=1, value=session.started_at.date())
-            ws.cell(row=row, column=2, value=session.shift.code)
-            ws.cell(row=row, column=3, value=float(product_sale_value_total))
-            ws.cell(row=row, column=4, value=float(credit_total))
-            ws.cell(row=row, column=5, value=len(vouchers))
-            ws.cell(row=row, column=6, value=float(voucher_total))
-            ws.cell(row=row, column=7, value=len(withdrawals))
-            ws.cell(row=row, column=8, value=float(withdrawal_total))
-            ws.cell(row=row, column=9, value=float(firefighter_payments_total))
-            ws.cell(row=row, column=10, value=float(product_load_payment_total))
-            ws.cell(row=row, column=11, value=float(fuel_load_payment_total))
-            ws.cell(row=row, column=12, value=float(turn_profit))
-            ws.cell(row=row, column=13, value=float(net_turn_profit))
-
-            row += 1
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        job = request_export_job(
+            branch,
+            kind,
+            export_format,
+            request.POST,
+            profile=getattr(request.user, "profile", None),
+        )
+        return JsonResponse(self.job_payload(job), status=202)
+
+
+class ExportJobStatusView(ExportJobAccessMixin, View):
+    """Devuelve el estado y progreso de una exportación para el polling."""
 
-        filename = f"historial_servicios_{branch.name}_{branch_pk}.xlsx"
-        response = HttpResponse(
-            output.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    def get(self, request, pk, *args, **kwargs):
+        return JsonResponse(self.job_payload(self.get_job(pk)))
+
+
+class ExportJobDownloadView(ExportJobAccessMixin, View):
+    """Descarga el archivo de una exportación terminada."""
+
+    def get(self, request, pk, *args, **kwargs):
+        job = self.get_job(pk)
+        if not job.has_artifact:
+            raise Http404("La exportación aún no está disponible.")
+        content_type = {
+            "csv": "text/csv; charset=utf-8",
+            "arrow": ARROW_CONTENT_TYPE,
+        }.get(job.export_format, XLSX_CONTENT_TYPE)
+        return FileResponse(
+            job.file.open("rb"),
+            as_attachment=True,
+            filename=export_job_filename(job),
+            content_type=content_type,
         )
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
 
 
 class BranchStaffManageView(OwnerCompanyMixin, SingleObjectMixin, FormView):
@@ -1724,7 +1563,7 @@ class CreditSaleAccessMixin(OwnerCompanyMixin):
         if not branch_ids:
             return ServiceSessionCreditSale.objects.none()
         return ServiceSessionCreditSale.objects.filter(
-            service_session__shift__sucursal_id__in=branch_ids
+            branch_id__in=branch_ids
         ).select_related("service_session__shift__sucursal")
 
     def get_object(self) -> ServiceSessionCreditSale:
@@ -1734,7 +1573,7 @@ class CreditSaleAccessMixin(OwnerCompanyMixin):
         instance = obj or getattr(self, "object", None)
         if instance is None:
             instance = self.get_object()
-        return reverse("sucursal_update", args=[instance.service_session.shift.sucursal_id])
+        return reverse("sucursal_update", args=[instance.get_sucursal_id()])
 
 class IslandAccessMixin(OwnerCompanyMixin):
     model = Island
@@ -1781,10 +1620,7 @@ class MachineAccessMixin(OwnerCompanyMixin):
 class CreditSaleMarkPaidView(CreditSaleAccessMixin, View):
     def post(self, request, *args, **kwargs) -> HttpResponseRedirect:
         credit_sale = self.get_object()
-        if credit_sale.status != ServiceSessionCreditSale.Status.PAID:
-            ServiceSessionCreditSale.objects.filter(pk=credit_sale.pk).update(
-                status=ServiceSessionCreditSale.Status.PAID
-            )
+        if credit_sale.mark_paid():
             messages.success(request, "El crédito fue marcado como pagado.")
         else:
             messages.info(request, "El crédito ya estaba pagado.")
@@ -2070,21 +1906,17 @@ class ServiceSessionCreateView(OwnerCompanyMixin, CreateView):
     def dispatch(self, request, *args, **kwargs):
         """Redirect to the running service if the current branch already has one."""
 
-        profile = getattr(request.user, "profile", None)
-        branch_id = getattr(profile, "current_branch_id", None)
-
+        branch_id = self.principal.current_branch_id
 
         # If the admin user does not have a current branch selected,
         # fall back to the first branch they administrate.
-        if branch_id is None and profile:
-            admin_branch_ids = get_admin_branch_ids(profile)
-            if admin_branch_ids:
-                branch_id = admin_branch_ids[0]
+        if branch_id is None and self.principal.admin_branch_ids:
+            branch_id = min(self.principal.admin_branch_ids)
 
         if branch_id:
             active_session = (
                 ServiceSession.objects.filter(
-                    shift__sucursal_id=branch_id, ended_at__isnull=True
+                    branch_id=branch_id, ended_at__isnull=True
                 )
                 .order_by("-started_at")
                 .first()
@@ -2320,7 +2152,7 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
             ):
                 branch_id = (
                     ServiceSession.objects.filter(pk=service_pk)
-                    .values_list("shift__sucursal_id", flat=True)
+                    .values_list("branch_id", flat=True)
                     .first()
                 )
                 if branch_id:
@@ -2340,14 +2172,14 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
                 if service_pk and not branch_ids:
                     current_branch_id = getattr(viewer_profile, "current_branch_id", None)
                     if current_branch_id and ServiceSession.objects.filter(
-                        pk=service_pk, shift__sucursal_id=current_branch_id
+                        pk=service_pk, branch_id=current_branch_id
                     ).exists():
                         branch_ids = [current_branch_id]
         except Exception:
             pass
 
         if branch_ids:
-            queryset = queryset.filter(shift__sucursal_id__in=branch_ids)
+            queryset = queryset.filter(branch_id__in=branch_ids)
         else:
             queryset = queryset.none()
 
@@ -2357,11 +2189,15 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
         machines = list(
             Machine.objects.filter(island__sucursal=branch)
             .select_related("island", "fuel_inventory")
-            .prefetch_related(
-                "fuel_inventories",
-                "fuel_numerals__fuel_inventory",
-                "fuel_numerals__nozzles",
-            )
+            .prefetch_related("fuel_inventories")
+        )
+        # Paso explícito: los numerales faltantes se crean antes de leerlos.
+        provision_machine_numerals(machines)
+        prefetch_related_objects(
+            machines,
+            "fuel_numerals__fuel_inventory",
+            "fuel_numerals__nozzles",
+            "nozzles__fuel_numeral",
         )
 
         machine_inventory_pairs = []
@@ -2618,29 +2454,29 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
 
         decimal_zero = Decimal("0")
         initial_budget = self.object.initial_budget or decimal_zero
-        credit_sales_total = sum(
-            (credit.amount or decimal_zero) for credit in credit_sales
-        )
-        transbank_vouchers_total = sum(
-            (voucher.total_amount or decimal_zero) for voucher in transbank_vouchers
-        )
-        withdrawals_total = sum(
-            (withdrawal.amount or decimal_zero) for withdrawal in withdrawals
-        )
-        product_sales_total = sum(
-            (getattr(sale, "total_value", decimal_zero) or decimal_zero)
-            for sale in product_sales
-        )
-        fuel_payments_total = sum(
-            (fuel_load.payment_amount or decimal_zero) for fuel_load in fuel_loads
-        )
-        firefighter_payments_total = sum(
-            (payment.amount or decimal_zero) for payment in firefighter_payments
-        )
-        product_loads_total = sum(
-            (product_load.payment_amount or decimal_zero)
-            for product_load in product_loads
-        )
+        financials = (
+            ServiceSession.objects.filter(pk=self.object.pk)
+            .with_financials()
+            .values(
+                "credit_total",
+                "voucher_total",
+                "withdrawal_total",
+                "product_sales_value",
+                "fuel_load_payment_total",
+                "firefighter_payments_total",
+                "product_load_payment_total",
+                "turn_profit",
+                "net_turn_profit",
+            )
+            .get()
+        )
+        credit_sales_total = financials["credit_total"]
+        transbank_vouchers_total = financials["voucher_total"]
+        withdrawals_total = financials["withdrawal_total"]
+        product_sales_total = financials["product_sales_value"]
+        fuel_payments_total = financials["fuel_load_payment_total"]
+        firefighter_payments_total = financials["firefighter_payments_total"]
+        product_loads_total = financials["product_load_payment_total"]
 
         close_session_flow_gap = kwargs.get(
             "close_session_flow_gap", self.object.flow_mismatch_amount
@@ -2650,24 +2486,10 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
         )
         flow_mismatch_labels = dict(ServiceSession.FLOW_MISMATCH_CHOICES)
 
-        turn_profit = (
-            credit_sales_total
-            + transbank_vouchers_total
-            + withdrawals_total
-            + product_sales_total
-        )
-        turn_profit_excluding_product_sales = (
-            credit_sales_total
-            + transbank_vouchers_total
-            + withdrawals_total
-        )
-        net_turn_profit = (
-            turn_profit
-            - fuel_payments_total
-            - firefighter_payments_total
-            - product_loads_total
-            - credit_sales_total
-        )
+        turn_profit = financials["turn_profit"]
+        turn_profit_excluding_product_sales = turn_profit - product_sales_total
+        # En el detalle del servicio el crédito aún no es dinero recibido.
+        net_turn_profit = financials["net_turn_profit"] - credit_sales_total
 
         firefighter_payment_form = kwargs.get("firefighter_payment_form")
         if firefighter_payment_form is None:
@@ -3026,6 +2848,9 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
                     return self.render_to_response(context)
 
                 closure_time = timezone.now()
+                # La sucursal del turno nunca es nula: filtrar por una sucursal
+                # vacía cerraría todos los servicios sin sucursal asignada.
+                sucursal_id = self.object.shift.sucursal_id
                 with transaction.atomic():
                     for form in close_session_formset:
                         machine_id = form.cleaned_data.get("machine_id")
@@ -3065,6 +2890,7 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
                         [
                             ServiceSessionFuelSale(
                                 service_session=self.object,
+                                branch_id=sucursal_id,
                                 fuel_type=fuel_type,
                                 liters_sold=liters_sold,
                             )
@@ -3072,12 +2898,16 @@ class ServiceSessionDetailView(OwnerCompanyMixin, DetailView):
                         ]
                     )
                     ServiceSession.objects.filter(
-                        shift__sucursal=self.object.shift.sucursal,
+                        branch_id=sucursal_id,
                         ended_at__isnull=True,
                     ).exclude(pk=self.object.pk).update(ended_at=closure_time)
                     self.object.ended_at = closure_time
                     self.object.fuel_sales = fuel_sales_total
                     self.object.save(update_fields=["ended_at", "fuel_sales"])
+                    BranchDailyProfit.refresh(
+                        sucursal_id,
+                        timezone.localdate(closure_time),
+                    )
                 messages.success(
                     request,
                     "Caja cerrada y servicio finalizado correctamente.",
@@ -1,6 +1,9 @@
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from PIL import Image, ImageFile, UnidentifiedImageError
+from PIL import Image, ImageFile, ImageOps, UnidentifiedImageError
+from io import BytesIO
+import hashlib
 import os
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -47,7 +50,7 @@ def crop_image(img_path, img_size):
 
 
 def handle_old_image(modelo, pk, image):
-    default_image = "profile.webp"
+    default_image = DEFAULT_PROFILE_IMAGE
     old_profile = modelo.objects.get(pk=pk)
     default_image_path = os.path.join(settings.MEDIA_ROOT, default_image)
 
@@ -58,5 +61,52 @@ def handle_old_image(modelo, pk, image):
         default_storage.delete(old_profile.image.path)
 
 
+DEFAULT_PROFILE_IMAGE = "profile.webp"
+
+# Tamaños (px) de las miniaturas WebP que se generan para cada avatar.
+AVATAR_VARIANT_SIZES = (48, 96, 300)
+
+
+def image_content_hash(image_file):
+    """Return the SHA-256 of an uploaded file, leaving it ready to be saved."""
+    digest = hashlib.sha256()
+    image_file.seek(0)
+    for chunk in image_file.chunks():
+        digest.update(chunk)
+    image_file.seek(0)
+    return digest.hexdigest()
+
+
+def generate_image_variants(name, sizes=AVATAR_VARIANT_SIZES):
+    """Create square WebP thumbnails of the stored image ``name``.
+
+    Returns a mapping ``{"<size>": "<storage path>"}``; it is empty when the
+    file is not a valid image.
+    """
+    stem = os.path.splitext(name)[0]
+    variants = {}
+    try:
+        with default_storage.open(name, "rb") as source, Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            for size in sizes:
+                thumbnail = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+                buffer = BytesIO()
+                thumbnail.save(buffer, format="WEBP", quality=82, method=4)
+                variants[str(size)] = default_storage.save(
+                    f"{stem}_{size}.webp", ContentFile(buffer.getvalue())
+                )
+    except (FileNotFoundError, UnidentifiedImageError):
+        print("Error al generar las miniaturas de la imagen")
+    return variants
+
+
+def delete_image_files(names):
+    """Delete stored images, never the shared default avatar."""
+    for name in names:
+        if name and name != DEFAULT_PROFILE_IMAGE:
+            default_storage.delete(name)
+
+
 def upload_to_s3(img, s3_path):
     print(f"Esta en el otro archivo {img} {s3_path}")